@@ -0,0 +1,148 @@
+"""
+Admin command-line interface for the Stock Portfolio Tracker application.
+
+    python -m app.cli migrate [--revision head]
+    python -m app.cli backfill [--symbols AAPL,MSFT] [--concurrency 4] [--full]
+    python -m app.cli sweep [--force]
+    python -m app.cli recompute-days
+    python -m app.cli vacuum
+    python -m app.cli warm-cache [--refresh-listing]
+    python -m app.cli backtest --rules sma_200:15 --start 2015-01-01
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import time
+from typing import List, Optional
+
+from sqlmodel import Session
+
+from app.models.models import get_engine
+from app.models.schema import check_schema, current_revision, upgrade_database
+from app.services import backtest_service, maintenance_service
+from app.services.price_archive import ARCHIVE_PATH
+from app.utils.logging_config import setup_logging, shutdown_logging
+
+logger = logging.getLogger(__name__)
+
+
+def print_progress(done: int, total: int, label: str) -> None:
+    """Single-line progress output on stderr"""
+    width = 30
+    filled = int(width * done / total) if total else width
+    sys.stderr.write(f"\r[{'#' * filled}{'.' * (width - filled)}] {done}/{total} {label[:30]:<30}")
+    if done >= total:
+        sys.stderr.write("\n")
+    sys.stderr.flush()
+
+
+def cmd_migrate(args: argparse.Namespace) -> int:
+    upgrade_database(args.revision)
+    print(f"Database schema at revision {current_revision()}")
+    return 0
+
+
+def cmd_backfill(args: argparse.Namespace) -> int:
+    symbols = [s.strip().upper() for s in args.symbols.split(",") if s.strip()] or None
+    counts = asyncio.run(maintenance_service.backfill_prices(
+        symbols=symbols,
+        concurrency=args.concurrency,
+        full_history=args.full,
+        progress=print_progress,
+    ))
+    print(f"Backfilled {counts['updated']} of {counts['symbols']} symbols ({counts['failed']} failed)")
+    return 0 if not counts["failed"] else 1
+
+
+def cmd_sweep(args: argparse.Namespace) -> int:
+    from app.scheduler.jobs import check_stock_alerts
+
+    asyncio.run(check_stock_alerts(progress=print_progress, force=args.force))
+    return 0
+
+
+def cmd_recompute_days(args: argparse.Namespace) -> int:
+    with Session(get_engine()) as session:
+        updated = maintenance_service.recompute_days_since_break(session)
+    print(f"Recomputed days since MA break for {updated} stocks")
+    return 0
+
+
+def cmd_vacuum(args: argparse.Namespace) -> int:
+    maintenance_service.vacuum_database()
+    print("Database vacuumed and analyzed")
+    return 0
+
+
+def cmd_warm_cache(args: argparse.Namespace) -> int:
+    stats = asyncio.run(maintenance_service.warm_caches(
+        refresh_listing=args.refresh_listing,
+        archive_path=args.archive,
+    ))
+    if stats["listing_bytes"]:
+        print(f"Downloaded symbol listing ({stats['listing_bytes']} bytes)")
+    print(
+        f"Cached {stats['quotes']} stored quotes; read {stats['bars']} daily bars, "
+        f"{stats['indicators']} indicators and {stats['archived_symbols']} archived symbols"
+    )
+    return 0
+
+
+def cmd_backtest(args: argparse.Namespace) -> int:
+    result = backtest_service.run_from_args(args)
+    print(backtest_service.format_report(result))
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Stock Portfolio Tracker admin tasks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate = subparsers.add_parser("migrate", help="Apply database migrations")
+    migrate.add_argument("--revision", default="head", help="Target revision (default: head)")
+    migrate.set_defaults(func=cmd_migrate)
+
+    backfill = subparsers.add_parser("backfill", help="Fetch daily history and indicators for all held symbols")
+    backfill.add_argument("--symbols", default="", help="Comma-separated symbols (default: all held symbols)")
+    backfill.add_argument("--concurrency", type=int, default=4, help="Upstream requests in flight")
+    backfill.add_argument("--full", action="store_true", help="Re-fetch the full history")
+    backfill.set_defaults(func=cmd_backfill)
+
+    sweep = subparsers.add_parser("sweep", help="Run the scheduled stock alert check once")
+    sweep.add_argument("--force", action="store_true", help="Include portfolios claimed by a recent sweep")
+    sweep.set_defaults(func=cmd_sweep)
+
+    recompute = subparsers.add_parser("recompute-days", help="Recompute days since MA break for every stock")
+    recompute.set_defaults(func=cmd_recompute_days)
+
+    vacuum = subparsers.add_parser("vacuum", help="VACUUM and ANALYZE the database")
+    vacuum.set_defaults(func=cmd_vacuum)
+
+    warm = subparsers.add_parser("warm-cache", help="Fetch the symbol listing, load stored quotes into the quote cache and page price data into the OS cache")
+    warm.add_argument("--refresh-listing", action="store_true", help="Download the symbol listing even if present")
+    warm.add_argument("--archive", default=ARCHIVE_PATH, help="Price archive directory (default: PRICE_ARCHIVE_PATH)")
+    warm.set_defaults(func=cmd_warm_cache)
+
+    backtest = subparsers.add_parser("backtest", help="Backtest alert rules on stored daily bars")
+    backtest_service.build_parser(backtest)
+    backtest.set_defaults(func=cmd_backtest)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    setup_logging()
+    if args.command != "migrate":
+        check_schema()
+    started = time.perf_counter()
+    try:
+        return args.func(args)
+    finally:
+        logger.info("%s finished in %.1fs", args.command, time.perf_counter() - started)
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,52 +3,116 @@ from fastapi import FastAPI, Request, Depends, HTTPException
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
-from sqlmodel import Session, select
-from apscheduler.schedulers.background import BackgroundScheduler
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlmodel import Session, select, text
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
 from contextlib import asynccontextmanager
-from datetime import datetime
+from datetime import date, datetime, timedelta
 import logging
 
-from app.models.models import create_db_and_tables, get_engine, User, Portfolio, Stock
-from app.services.stock_service import StockService
-from app.routes import auth, portfolio
+from app.models.models import get_async_engine, get_engine, User, Portfolio, Stock
+from app.models.schema import check_schema
+from app.services.stock_service import StockService, open_circuits
+from app.routes import auth, portfolio, symbols, events, screener
+from app.services.symbol_service import symbol_index
+from app.services.price_archive import ARCHIVE_PATH
+from app.services.digest_service import DIGEST_HOUR
+from app.services.market_calendar import MARKET_TIMEZONE, POST_CLOSE_DELAY_MINUTES, SESSION_CLOSE, USE_MARKET_CALENDAR
+from app.services.cache_snapshot import SNAPSHOT_INTERVAL, load_snapshot, save_snapshot
+from app.utils.admission import AdmissionMiddleware, admission
+from app.utils.metrics import REGISTRY, MetricsMiddleware, instrument_engine
+from app.utils.logging_config import setup_logging, shutdown_logging
 
 # Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # App startup and shutdown events
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Setup: Create DB tables and start scheduler
-    create_db_and_tables()
-    scheduler = BackgroundScheduler()
+    # Setup: Check the schema version (migrations run before startup) and start scheduler
+    check_schema()
+    symbol_index.load()
+    # Restore quotes and indicators from before the restart
+    load_snapshot()
+    # Runs on the app's event loop so async jobs are awaited
+    scheduler = AsyncIOScheduler()
     
-    # Import the check_stock_alerts function here to avoid circular imports
+    # Import the job functions here to avoid circular imports
     try:
-        from app.scheduler.jobs import check_stock_alerts
+        from app.scheduler.jobs import post_close_sweep, scheduled_sweep
         
-        # Add job to check stocks every hour
+        # Add job to check stocks every hour (while the market is open)
         scheduler.add_job(
-            check_stock_alerts,
+            scheduled_sweep,
             trigger=IntervalTrigger(hours=1),
             id="stock_checker",
             replace_existing=True,
         )
         
+        if USE_MARKET_CALENDAR:
+            # One more check per trading day once the close has settled
+            settle = datetime.combine(date.today(), SESSION_CLOSE) + timedelta(minutes=POST_CLOSE_DELAY_MINUTES)
+            scheduler.add_job(
+                post_close_sweep,
+                trigger=CronTrigger(
+                    day_of_week="mon-fri", hour=settle.hour, minute=settle.minute, timezone=MARKET_TIMEZONE
+                ),
+                id="post_close_checker",
+                replace_existing=True,
+            )
+        
         logger.info("Scheduled stock checker job")
+        
+        from app.scheduler.jobs import deliver_daily_digests
+        
+        # Portfolios in daily digest mode get one message a day
+        scheduler.add_job(
+            deliver_daily_digests,
+            trigger=CronTrigger(hour=DIGEST_HOUR),
+            id="daily_digest",
+            replace_existing=True,
+        )
+        
+        if ARCHIVE_PATH:
+            from app.scheduler.jobs import sync_price_archive
+            
+            # Keep the shared price archive in step with the stored bars
+            scheduler.add_job(
+                sync_price_archive,
+                trigger=IntervalTrigger(hours=1),
+                id="price_archive_sync",
+                replace_existing=True,
+            )
+            logger.info("Scheduled price archive sync job")
     except ImportError as e:
-        logger.error(f"Could not import check_stock_alerts: {str(e)}")
+        logger.error("Could not import the scheduler jobs: %s", e)
         logger.warning("Stock checking scheduler not started")
     
+    # Snapshot caches periodically in case the process is killed without a clean shutdown
+    if SNAPSHOT_INTERVAL > 0:
+        scheduler.add_job(
+            save_snapshot,
+            trigger=IntervalTrigger(minutes=SNAPSHOT_INTERVAL),
+            id="cache_snapshot",
+            replace_existing=True,
+        )
+    
     scheduler.start()
     yield
-    # Shutdown: Stop scheduler
-    scheduler.shutdown()
+    # Shutdown: Stop scheduler, snapshot caches and flush logs
+    try:
+        scheduler.shutdown()
+        await get_async_engine().dispose()
+        try:
+            save_snapshot()
+        except Exception:
+            # A bad cache entry shouldn't stop the rest of the shutdown
+            logger.exception("Could not save cache snapshot")
+    finally:
+        shutdown_logging()
 
 # Create FastAPI app
 app = FastAPI(
@@ -69,14 +133,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Cap, queue and coalesce the routes that fan out to the market data API
+app.add_middleware(AdmissionMiddleware)
+
+# Record per-route request latency (including requests admission control rejects)
+app.add_middleware(MetricsMiddleware)
+
+# Record database statement timings
+instrument_engine(get_engine())
+instrument_engine(get_async_engine().sync_engine)
+
 # Include routers
 app.include_router(auth.router)
 app.include_router(portfolio.router)
-
-# Dependency for DB sessions
-def get_session():
-    with Session(get_engine()) as session:
-        yield session
+app.include_router(symbols.router)
+app.include_router(events.router)
+app.include_router(screener.router)
 
 # Root route
 @app.get("/")
@@ -88,6 +160,35 @@ async def root(request: Request):
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
+# Readiness: the database answers and expensive requests aren't being shed
+@app.get("/ready")
+async def readiness_check():
+    try:
+        with Session(get_engine()) as session:
+            session.execute(text("SELECT 1"))
+        database = "ok"
+    except Exception as e:
+        logger.error("Readiness check could not reach the database: %s", e)
+        database = "unavailable"
+    
+    backlog = admission.backlog()
+    ready = database == "ok" and not admission.saturated
+    return JSONResponse(
+        {
+            "status": "ready" if ready else "not_ready",
+            "database": database,
+            "admission": backlog,
+            "open_circuits": open_circuits(),
+            "timestamp": datetime.now().isoformat(),
+        },
+        status_code=200 if ready else 503,
+    )
+
+# Prometheus metrics
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -1,9 +1,11 @@
 """
 Database models for the Stock Portfolio Tracker application.
 
-This package includes SQLModel definitions for User, Portfolio, and Stock models.
+This package includes SQLModel definitions for User, Portfolio, and Stock models,
+plus the shared Symbol, PriceBar and Indicator market data tables, the PendingAlert
+digest outbox and the StockEvent change log.
 """
 
-from app.models.models import User, Portfolio, Stock, create_db_and_tables, get_engine
+from app.models.models import User, Portfolio, Stock, Symbol, PriceBar, Indicator, PendingAlert, StockEvent, create_db_and_tables, get_engine
 
-__all__ = ["User", "Portfolio", "Stock", "create_db_and_tables", "get_engine"]
\ No newline at end of file
+__all__ = ["User", "Portfolio", "Stock", "Symbol", "PriceBar", "Indicator", "PendingAlert", "StockEvent", "create_db_and_tables", "get_engine"]
\ No newline at end of file
@@ -0,0 +1,89 @@
+"""
+Dialect-aware bulk writes.
+
+Upserts use the native INSERT ... ON CONFLICT of SQLite and PostgreSQL,
+executed as executemany so the statement is compiled once. On
+PostgreSQL, large batches are streamed with COPY into a temporary table
+and merged with a single INSERT ... SELECT, which is several times
+faster than row-by-row parameter binding.
+"""
+import logging
+from typing import Any, Dict, Sequence, Type
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, SQLModel
+
+logger = logging.getLogger(__name__)
+
+# Rows at which PostgreSQL upserts switch to COPY
+COPY_THRESHOLD = 500
+
+
+def upsert(
+    session: Session,
+    model: Type[SQLModel],
+    rows: Sequence[Dict[str, Any]],
+    index_elements: Sequence[str],
+    update_columns: Sequence[str],
+) -> None:
+    """
+    Insert rows, updating `update_columns` where `index_elements` conflict
+
+    Runs in the session's transaction; the caller commits.
+
+    Args:
+        model: Table model to write
+        rows: Column dictionaries, all with the same keys
+        index_elements: Columns of the primary key or unique index to match on
+        update_columns: Columns overwritten on conflict
+    """
+    if not rows:
+        return
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        if len(rows) >= COPY_THRESHOLD:
+            copy_upsert(session, model, rows, index_elements, update_columns)
+            return
+        statement = postgresql.insert(model)
+    elif dialect == "sqlite":
+        statement = sqlite.insert(model)
+    else:
+        raise NotImplementedError(f"Upserts are not supported on {dialect}")
+
+    session.execute(statement.on_conflict_do_update(
+        index_elements=list(index_elements),
+        set_={column: statement.excluded[column] for column in update_columns},
+    ), rows)
+
+
+def copy_upsert(
+    session: Session,
+    model: Type[SQLModel],
+    rows: Sequence[Dict[str, Any]],
+    index_elements: Sequence[str],
+    update_columns: Sequence[str],
+) -> None:
+    """PostgreSQL upsert through COPY into a temporary staging table"""
+    table = model.__table__
+    columns = list(rows[0].keys())
+    column_list = ", ".join(f'"{column}"' for column in columns)
+    staging = f"staging_{table.name}"
+    assignments = ", ".join(f'"{column}" = EXCLUDED."{column}"' for column in update_columns)
+    conflict = ", ".join(f'"{column}"' for column in index_elements)
+
+    # The raw psycopg connection shares the session's transaction
+    connection = session.connection().connection.driver_connection
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TEMP TABLE IF NOT EXISTS {staging} (LIKE "{table.name}" INCLUDING DEFAULTS)'
+        )
+        with cursor.copy(f"COPY {staging} ({column_list}) FROM STDIN") as copy:
+            for row in rows:
+                copy.write_row([row[column] for column in columns])
+        cursor.execute(
+            f'INSERT INTO "{table.name}" ({column_list}) SELECT {column_list} FROM {staging} '
+            f"ON CONFLICT ({conflict}) DO UPDATE SET {assignments}"
+        )
+        # Temp tables live as long as the pooled connection
+        cursor.execute(f"TRUNCATE {staging}")
+    logger.debug("Copied %s rows into %s", len(rows), table.name)
@@ -1,11 +1,21 @@
-from datetime import datetime
-from typing import List, Optional
-from sqlmodel import Field, Relationship, SQLModel, create_engine
+from datetime import date, datetime
+from typing import Iterator, List, Optional
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlmodel import Field, Relationship, Session, SQLModel, create_engine
 import os
-from datetime import datetime
 
-# Create SQLite database URL
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./stock_tracker.db")
+
+def normalize_database_url(url: str) -> str:
+    """Use the psycopg 3 driver for Postgres URLs; it serves both the sync and async engines"""
+    for prefix in ("postgres://", "postgresql://"):
+        if url.startswith(prefix):
+            return "postgresql+psycopg://" + url[len(prefix):]
+    return url
+
+
+# SQLite by default; set a postgresql:// URL when several workers write sweep results
+DATABASE_URL = normalize_database_url(os.getenv("DATABASE_URL", "sqlite:///./stock_tracker.db"))
 
 class User(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -21,8 +31,14 @@ class Portfolio(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     name: str
     polling_rate: int = Field(default=24)  # Hours between checks
-    user_id: Optional[int] = Field(default=None, foreign_key="user.id")
+    # Alert rules as "indicator:threshold" pairs, e.g. "sma_200:15,ema_50:5"
+    indicators: str = Field(default="sma_200:15")
+    # When alerts go out: "immediate", "sweep" (one digest per sweep) or "daily"
+    alert_mode: str = Field(default="immediate")
+    user_id: Optional[int] = Field(default=None, foreign_key="user.id", index=True)
     created_at: datetime = Field(default_factory=datetime.now)
+    # Set when a sweep worker claims the portfolio so concurrent workers skip it
+    sweep_claimed_at: Optional[datetime] = None
     
     # Relationships
     user: Optional[User] = Relationship(back_populates="portfolios")
@@ -30,15 +46,12 @@ class Portfolio(SQLModel, table=True):
 
 
 class Stock(SQLModel, table=True):
+    """A holding; market data lives on the shared Symbol row"""
     id: Optional[int] = Field(default=None, primary_key=True)
-    symbol: str
-    portfolio_id: Optional[int] = Field(default=None, foreign_key="portfolio.id")
-    last_price: Optional[float] = None
-    ma_200: Optional[float] = None
-    distance_to_ma: Optional[float] = None
-    last_checked: Optional[datetime] = None
+    symbol: str = Field(index=True)
+    portfolio_id: Optional[int] = Field(default=None, foreign_key="portfolio.id", index=True)
+    # Alert state, which depends on the portfolio's rules
     notification_sent: bool = Field(default=False)
-    # New fields
     last_ma_break_date: Optional[datetime] = None  # When the stock last broke the MA
     days_since_ma_break: Optional[int] = None  # Calculated field
     
@@ -46,13 +59,125 @@ class Stock(SQLModel, table=True):
     portfolio: Optional[Portfolio] = Relationship(back_populates="stocks")
 
 
-# Create the engine
-engine = create_engine(DATABASE_URL, echo=True)
+class Symbol(SQLModel, table=True):
+    """Latest market data for a ticker, written once per update and shared by every holding"""
+    symbol: str = Field(primary_key=True)
+    last_price: Optional[float] = None
+    ma_200: Optional[float] = None
+    distance_to_ma: Optional[float] = Field(default=None, index=True)  # Screener range queries
+    volatility: Optional[float] = None  # Std dev of recent daily close-to-close changes, in %
+    days_below_ma: Optional[int] = None  # Sessions in a row closed below the 200-day SMA; 0 above it
+    last_checked: Optional[datetime] = None
+    as_of: Optional[date] = None  # Date of the latest daily close
+
+
+class PriceBar(SQLModel, table=True):
+    """Daily close for a symbol, shared by every holding of that symbol"""
+    symbol: str = Field(primary_key=True)
+    day: date = Field(primary_key=True)
+    close: float
+    volume: Optional[int] = None
+
+
+class Indicator(SQLModel, table=True):
+    """Latest value of one indicator (e.g. sma_50, ema_200) for a symbol"""
+    symbol: str = Field(primary_key=True)
+    name: str = Field(primary_key=True)
+    value: float
+    as_of: date
+    updated_at: datetime = Field(default_factory=datetime.now)
+
+
+class PendingAlert(SQLModel, table=True):
+    """Outbox of alerts waiting to be sent in a user's digest"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    created_at: datetime = Field(default_factory=datetime.now)
+    user_id: int = Field(index=True)
+    portfolio_id: int
+    stock_id: Optional[int] = None
+    symbol: str
+    mode: str  # "sweep" or "daily"
+    payload: str = Field(default="{}")  # JSON alert details
+    # Set while a worker is sending the digest this alert belongs to
+    claimed_at: Optional[datetime] = None
+
+
+class StockEvent(SQLModel, table=True):
+    """Append-only change log; `id` is the cursor consumers resume from"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    created_at: datetime = Field(default_factory=datetime.now)
+    # price_observed, ma_state_changed, alert_sent or alert_failed
+    kind: str
+    portfolio_id: int = Field(index=True)
+    stock_id: Optional[int] = None
+    symbol: str
+    payload: str = Field(default="{}")  # JSON details
+
+
+SQL_ECHO = os.getenv("SQL_ECHO", "false").lower() == "true"
+
+
+def engine_options(url: str) -> dict:
+    """Connection pool settings; SQLite keeps SQLAlchemy's defaults"""
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "20")),
+        "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", "30")),
+        # Drop connections the server or a proxy closed while they sat idle
+        "pool_pre_ping": True,
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    }
+
+
+def async_database_url(url: str) -> str:
+    """Same database through an async driver (aiosqlite, or psycopg in async mode)"""
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    return url
+
+
+# Create the engine; statement logging is opt-in via SQL_ECHO
+engine = create_engine(DATABASE_URL, echo=SQL_ECHO, **engine_options(DATABASE_URL))
+_async_engine: Optional[AsyncEngine] = None
 
 
 def create_db_and_tables():
+    """
+    Create missing tables directly, for throwaway databases (benchmarks, tests)
+
+    Real databases are managed by the Alembic migrations in `migrations/`.
+    """
     SQLModel.metadata.create_all(engine)
 
 
 def get_engine():
-    return engine
\ No newline at end of file
+    return engine
+
+
+def get_session() -> Iterator[Session]:
+    """
+    Request-scoped unit of work: one session, and one connection, per request
+
+    FastAPI resolves a dependency once per request, so authentication and the
+    handler share this session. Handlers commit their own changes; anything
+    left uncommitted is rolled back when the request ends. Loaded objects stay
+    readable after a commit without being reloaded.
+    """
+    with Session(get_engine(), expire_on_commit=False) as session:
+        yield session
+
+
+def get_async_engine() -> AsyncEngine:
+    """Engine for async request handlers, created on first use"""
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = create_async_engine(
+            async_database_url(DATABASE_URL), echo=SQL_ECHO, **engine_options(DATABASE_URL)
+        )
+    return _async_engine
+
+
+def is_postgres(bind: Optional[Engine] = None) -> bool:
+    return (bind or engine).dialect.name == "postgresql"
\ No newline at end of file
@@ -0,0 +1,68 @@
+"""
+Schema version checks and upgrades.
+
+The schema is owned by the Alembic migrations in `migrations/`. Startup
+only reads the current revision and warns when it is behind, so no DDL
+runs while the app is serving; upgrades run beforehand with
+`alembic upgrade head` or `python -m app.cli migrate`.
+"""
+import logging
+import os
+from typing import Optional
+
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy.engine import Engine
+
+from app.models.models import get_engine
+
+logger = logging.getLogger(__name__)
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "alembic.ini")
+
+
+def alembic_config() -> Config:
+    config = Config(ALEMBIC_INI)
+    # Keep script_location working when the process isn't started from the project root
+    config.set_main_option("script_location", os.path.join(os.path.dirname(ALEMBIC_INI), "migrations"))
+    return config
+
+
+def head_revision() -> Optional[str]:
+    """Latest revision in the migrations package"""
+    return ScriptDirectory.from_config(alembic_config()).get_current_head()
+
+
+def current_revision(engine: Optional[Engine] = None) -> Optional[str]:
+    """Revision the database is at, or None if it was never migrated"""
+    with (engine or get_engine()).connect() as connection:
+        return MigrationContext.configure(connection).get_current_revision()
+
+
+def check_schema(engine: Optional[Engine] = None) -> bool:
+    """
+    Compare the database revision with the migrations head
+
+    Returns:
+        bool: True if the database is up to date
+    """
+    current, head = current_revision(engine), head_revision()
+    if current == head:
+        return True
+    logger.warning(
+        "Database schema is at revision %s but the code expects %s; run `python -m app.cli migrate`",
+        current or "<none>", head,
+    )
+    return False
+
+
+def upgrade_database(revision: str = "head", engine: Optional[Engine] = None) -> None:
+    """Apply migrations up to `revision` using the application's engine"""
+    config = alembic_config()
+    # Use the app's logging setup rather than alembic.ini's
+    config.attributes["configure_logger"] = False
+    with (engine or get_engine()).connect() as connection:
+        config.attributes["connection"] = connection
+        command.upgrade(config, revision)
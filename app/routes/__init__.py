@@ -5,8 +5,10 @@ API routes for the Stock Portfolio Tracker application.
 This package includes:
 - auth: Authentication and user management routes
 - portfolio: Portfolio and stock management routes
+- symbols: Symbol lookup and typeahead routes
+- events: Stock event log (change feed) routes
 """
 
-from app.routes import auth, portfolio
+from app.routes import auth, portfolio, symbols, events
 
-__all__ = ["auth", "portfolio"]
\ No newline at end of file
+__all__ = ["auth", "portfolio", "symbols", "events"]
\ No newline at end of file
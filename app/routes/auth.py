@@ -6,7 +6,7 @@ from sqlmodel import Session, select
 from typing import Optional
 import logging
 
-from app.models.models import User, get_engine
+from app.models.models import User, get_session
 from app.services.auth_service import create_access_token, validate_pin
 
 # Set up logging
@@ -15,10 +15,6 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/auth", tags=["auth"])
 templates = Jinja2Templates(directory="app/templates")
 
-def get_session():
-    with Session(get_engine()) as session:
-        yield session
-
 @router.get("/register")
 async def register_page(request: Request):
     return templates.TemplateResponse("register.html", {"request": request})
@@ -30,11 +26,11 @@ async def register_user(
     pin: str = Form(...),
     session: Session = Depends(get_session)
 ):
-    logger.info(f"Registration attempt with email: {email}, PIN: {pin}")
+    logger.info("Registration attempt with email: %s, PIN: %s", email, pin)
     
     # Validate PIN format (4 letters + 2 digits)
     if not re.match(r'^[A-Za-z]{4}\d{2}$', pin):
-        logger.warning(f"Invalid PIN format: {pin}")
+        logger.warning("Invalid PIN format: %s", pin)
         return templates.TemplateResponse(
             "register.html", 
             {"request": request, "error": "PIN must be 4 letters followed by 2 digits"}
@@ -43,7 +39,7 @@ async def register_user(
     # Check if PIN already exists
     existing_user = session.exec(select(User).where(User.pin == pin)).first()
     if existing_user:
-        logger.warning(f"PIN already in use: {pin}")
+        logger.warning("PIN already in use: %s", pin)
         return templates.TemplateResponse(
             "register.html", 
             {"request": request, "error": "PIN already in use"}
@@ -54,7 +50,7 @@ async def register_user(
     session.add(new_user)
     session.commit()
     session.refresh(new_user)
-    logger.info(f"User created with id: {new_user.id}, email: {email}")
+    logger.info("User created with id: %s, email: %s", new_user.id, email)
     
     # Create access token (cookie)
     token = create_access_token({"sub": pin})
@@ -63,7 +59,7 @@ async def register_user(
     response = RedirectResponse(url="/portfolio", status_code=status.HTTP_303_SEE_OTHER)
     response.set_cookie(key="access_token", value=token, httponly=True)
     
-    logger.info(f"Redirecting to /portfolio with token set")
+    logger.info("Redirecting to /portfolio with token set")
     return response
 
 @router.get("/login")
@@ -76,11 +72,11 @@ async def login_user(
     pin: str = Form(...),
     session: Session = Depends(get_session)
 ):
-    logger.info(f"Login attempt with PIN: {pin}")
+    logger.info("Login attempt with PIN: %s", pin)
     
     # Validate PIN format
     if not re.match(r'^[A-Za-z]{4}\d{2}$', pin):
-        logger.warning(f"Invalid PIN format: {pin}")
+        logger.warning("Invalid PIN format: %s", pin)
         return templates.TemplateResponse(
             "login.html", 
             {"request": request, "error": "Invalid PIN format"}
@@ -89,7 +85,7 @@ async def login_user(
     # Find user with this PIN
     user = session.exec(select(User).where(User.pin == pin)).first()
     if not user:
-        logger.warning(f"No user found with PIN: {pin}")
+        logger.warning("No user found with PIN: %s", pin)
         return templates.TemplateResponse(
             "login.html", 
             {"request": request, "error": "Invalid PIN"}
@@ -102,7 +98,7 @@ async def login_user(
     response = RedirectResponse(url="/portfolio", status_code=status.HTTP_303_SEE_OTHER)
     response.set_cookie(key="access_token", value=token, httponly=True)
     
-    logger.info(f"User logged in successfully with id: {user.id}")
+    logger.info("User logged in successfully with id: %s", user.id)
     return response
 
 @router.get("/logout")
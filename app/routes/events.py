@@ -0,0 +1,52 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+import logging
+
+from app.models.models import User, Portfolio, get_async_engine
+from app.services.auth_service import credentials_exception, get_token_subject
+from app.services.event_service import EVENT_KINDS, read_events
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["events"])
+
+# Consumers poll this route, so it reads through the async engine without blocking the event loop
+async def get_async_session():
+    async with AsyncSession(get_async_engine()) as session:
+        yield session
+
+@router.get("/events")
+async def list_events(
+    after: int = 0,
+    limit: int = 100,
+    kind: str = "",
+    pin: str = Depends(get_token_subject),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Tail the stock event log for the current user's portfolios
+
+    Pass the returned `next_cursor` as `after` to fetch only newer events.
+    """
+    kinds = [k.strip() for k in kind.split(",") if k.strip()]
+    unknown = set(kinds) - set(EVENT_KINDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown event kind: {', '.join(sorted(unknown))}")
+
+    # Authenticate and find the user's portfolios in one query on this request's only connection
+    rows = (await session.exec(
+        select(User.id, Portfolio.id)
+        .join(Portfolio, Portfolio.user_id == User.id, isouter=True)
+        .where(User.pin == pin)
+    )).all()
+    if not rows:
+        raise credentials_exception()
+    portfolio_ids = [portfolio_id for _, portfolio_id in rows if portfolio_id is not None]
+    events = await read_events(session, after=after, limit=limit, portfolio_ids=portfolio_ids, kinds=kinds)
+
+    return {
+        "events": events,
+        "next_cursor": events[-1]["id"] if events else after
+    }
@@ -1,51 +1,111 @@
-from fastapi import APIRouter, Request, Depends, Form, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Request, Depends, Form, HTTPException, status, UploadFile, File
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, StreamingResponse
+from sqlalchemy import delete
 from sqlmodel import Session, select
 from typing import List, Optional
 import logging
 
-from app.models.models import User, Portfolio, Stock, get_engine
-from app.services.auth_service import get_current_user
+from app.models.models import PendingAlert, Portfolio, Stock, Symbol, get_session
+from app.services.auth_service import get_token_subject, get_user_portfolio, load_user_portfolio
 from app.services.stock_service import StockService
+from app.services.indicator_service import (
+    IndicatorService,
+    distance_pct,
+    evaluate_rules,
+    format_rules,
+    indicator_label,
+    load_indicator_values,
+    parse_rules,
+)
+from app.services import bulk_service
+from app.services.digest_service import ALERT_MODES
+from app.services.symbol_service import symbol_index
 
 router = APIRouter(tags=["portfolio"])
 templates = Jinja2Templates(directory="app/templates")
 stock_service = StockService()
+indicator_service = IndicatorService(stock_service)
 logger = logging.getLogger(__name__)
 
-def get_session():
-    with Session(get_engine()) as session:
-        yield session
+async def update_stock_quote(symbol: str):
+    """Fetch market data for a newly added symbol (run as a background task)"""
+    try:
+        # Stores the quote on the shared Symbol row
+        stock_data = await indicator_service.get_indicator_data(symbol)
+    except Exception as e:
+        logger.error("Error fetching data for new stock %s: %s", symbol, e)
+        return
+
+    if stock_data.get("price") is None:
+        logger.warning("No market data yet for %s, will retry on the next check", symbol)
 
 @router.get("/portfolio")
 async def portfolio_page(
     request: Request,
     error: str = None,
     success: str = None,
-    user: User = Depends(get_current_user),
+    imported: int = 0,
+    skipped: int = 0,
+    invalid: int = 0,
+    pin: str = Depends(get_token_subject),
     session: Session = Depends(get_session)
 ):
-    # Get existing portfolio for the user
-    portfolio = session.exec(
-        select(Portfolio).where(Portfolio.user_id == user.id)
-    ).first()
+    # Get the user and their existing portfolio
+    user, portfolio = load_user_portfolio(session, pin)
     
     # If no portfolio exists, show portfolio creation form
     has_portfolio = portfolio is not None
     
     portfolio_with_stocks = None
     if has_portfolio:
-        # Get all stocks in portfolio
-        stocks = session.exec(
-            select(Stock).where(Stock.portfolio_id == portfolio.id)
+        # Holdings joined with the shared market data of their symbols
+        holdings = session.exec(
+            select(Stock, Symbol)
+            .join(Symbol, Symbol.symbol == Stock.symbol, isouter=True)
+            .where(Stock.portfolio_id == portfolio.id)
         ).all()
         
+        # Latest values of the configured indicators, one query for all holdings
+        rules = parse_rules(portfolio.indicators)
+        values = load_indicator_values(session, [stock.symbol for stock, _ in holdings], [name for name, _ in rules])
+        
+        stocks = []
+        indicators = {}
+        alerting = set()
+        for stock, quote in holdings:
+            last_price = quote.last_price if quote else None
+            stocks.append({
+                "id": stock.id,
+                "symbol": stock.symbol,
+                "last_price": last_price,
+                "ma_200": quote.ma_200 if quote else None,
+                "distance_to_ma": quote.distance_to_ma if quote else None,
+                "last_checked": quote.last_checked if quote else None,
+                "days_since_ma_break": stock.days_since_ma_break,
+            })
+            stock_values = {name: values.get(stock.symbol, {}).get(name) for name, _ in rules}
+            indicators[stock.symbol] = [
+                {
+                    "label": indicator_label(name),
+                    "value": stock_values[name],
+                    "distance": distance_pct(last_price, stock_values[name]),
+                }
+                for name, _ in rules
+            ]
+            if evaluate_rules(last_price, stock_values, rules):
+                alerting.add(stock.symbol)
+        
         portfolio_with_stocks = {
             "id": portfolio.id,
             "name": portfolio.name,
             "polling_rate": portfolio.polling_rate,
-            "stocks": stocks
+            "indicators": portfolio.indicators,
+            "alert_mode": portfolio.alert_mode,
+            "rules": [(indicator_label(name), threshold) for name, threshold in rules],
+            "stocks": stocks,
+            "stock_indicators": indicators,
+            "alerting": alerting
         }
     
     # Handle notification errors/success
@@ -56,11 +116,27 @@ async def portfolio_page(
         error_message = "Failed to send test notification. Please check your NotificationAPI setup."
     elif error == "email_failed":
         error_message = "Failed to send test email. Please check your email service setup."
+    elif error == "import_failed":
+        error_message = "Failed to import stocks. Please upload a CSV or Parquet file with a symbol column."
+    elif error == "invalid_alert_mode":
+        error_message = "Invalid alert delivery. Choose immediate, sweep digest or daily digest."
+    elif error == "invalid_indicators":
+        error_message = (
+            "Invalid indicators. Use comma-separated indicator:threshold pairs such as "
+            "sma_200:15,ema_50:5 (SMA or EMA over 20, 50, 100 or 200 days)."
+        )
     
     if success == "notification_sent":
         success_message = "Test notification was sent successfully. Please check your email."
     elif success == "check_completed":
         success_message = "Stock alerts check completed successfully."
+    elif success == "settings_updated":
+        success_message = "Portfolio settings updated."
+    elif success == "import_completed":
+        success_message = (
+            f"Imported {imported} stocks ({skipped} already in portfolio, {invalid} invalid symbols). "
+            "Prices will be updated on the next check."
+        )
     
     return templates.TemplateResponse(
         "portfolio.html", 
@@ -79,16 +155,16 @@ async def create_portfolio(
     request: Request,
     name: str = Form(...),
     polling_rate: int = Form(24),  # Default to 24 hours
-    user: User = Depends(get_current_user),
+    indicators: str = Form("sma_200:15"),
+    alert_mode: str = Form("immediate"),
+    pin: str = Depends(get_token_subject),
     session: Session = Depends(get_session)
 ):
     # Check if user already has a portfolio
-    existing_portfolio = session.exec(
-        select(Portfolio).where(Portfolio.user_id == user.id)
-    ).first()
+    user, existing_portfolio = load_user_portfolio(session, pin)
     
     if existing_portfolio:
-        logger.warning(f"User {user.id} attempted to create a second portfolio")
+        logger.warning("User %s attempted to create a second portfolio", user.id)
         return templates.TemplateResponse(
             "portfolio.html", 
             {
@@ -98,52 +174,69 @@ async def create_portfolio(
             }
         )
     
+    try:
+        indicators = format_rules(parse_rules(indicators))
+    except ValueError:
+        return RedirectResponse(url="/portfolio?error=invalid_indicators", status_code=status.HTTP_303_SEE_OTHER)
+    
+    if alert_mode not in ALERT_MODES:
+        return RedirectResponse(url="/portfolio?error=invalid_alert_mode", status_code=status.HTTP_303_SEE_OTHER)
+    
     # Create new portfolio
-    new_portfolio = Portfolio(name=name, polling_rate=polling_rate, user_id=user.id)
+    new_portfolio = Portfolio(
+        name=name, polling_rate=polling_rate, indicators=indicators, alert_mode=alert_mode, user_id=user.id
+    )
     session.add(new_portfolio)
     session.commit()
-    logger.info(f"Created new portfolio '{name}' for user {user.id}")
+    logger.info("Created new portfolio '%s' for user %s", name, user.id)
     
     return RedirectResponse(url="/portfolio", status_code=status.HTTP_303_SEE_OTHER)
 
+@router.post("/portfolio/{portfolio_id}/settings")
+async def update_settings(
+    portfolio_id: int,
+    polling_rate: int = Form(...),
+    indicators: str = Form(...),
+    alert_mode: str = Form("immediate"),
+    portfolio: Portfolio = Depends(get_user_portfolio),
+    session: Session = Depends(get_session)
+):
+    """Update the polling rate, indicator alert rules and alert delivery of a portfolio"""
+    try:
+        portfolio.indicators = format_rules(parse_rules(indicators))
+    except ValueError:
+        return RedirectResponse(url="/portfolio?error=invalid_indicators", status_code=status.HTTP_303_SEE_OTHER)
+    
+    if alert_mode not in ALERT_MODES:
+        return RedirectResponse(url="/portfolio?error=invalid_alert_mode", status_code=status.HTTP_303_SEE_OTHER)
+    
+    portfolio.polling_rate = polling_rate
+    portfolio.alert_mode = alert_mode
+    session.add(portfolio)
+    session.commit()
+    logger.info("Updated settings for portfolio %s: %s, %s alerts", portfolio_id, portfolio.indicators, portfolio.alert_mode)
+    
+    return RedirectResponse(url="/portfolio?success=settings_updated", status_code=status.HTTP_303_SEE_OTHER)
+
 @router.post("/portfolio/{portfolio_id}/add-stock")
 async def add_stock(
     request: Request,
     portfolio_id: int,
+    background_tasks: BackgroundTasks,
     symbol: str = Form(...),
-    user: User = Depends(get_current_user),
+    portfolio: Portfolio = Depends(get_user_portfolio),
     session: Session = Depends(get_session)
 ):
-    # Verify portfolio exists and belongs to user
-    portfolio = session.exec(
-        select(Portfolio).where(
-            Portfolio.id == portfolio_id,
-            Portfolio.user_id == user.id
-        )
-    ).first()
-    
-    if not portfolio:
-        raise HTTPException(status_code=404, detail="Portfolio not found")
+    symbol = symbol.strip().upper()
     
-    # Verify stock symbol exists by calling the API
-    try:
-        stock_data = await stock_service.get_stock_data(symbol)
-        if not stock_data:
-            return templates.TemplateResponse(
-                "portfolio.html", 
-                {
-                    "request": request, 
-                    "user": user, 
-                    "error": f"Stock symbol '{symbol}' not found"
-                }
-            )
-    except Exception as e:
+    # Verify stock symbol exists in the local symbol universe
+    if not symbol_index.is_valid(symbol):
         return templates.TemplateResponse(
             "portfolio.html", 
             {
                 "request": request, 
-                "user": user, 
-                "error": f"Error checking stock: {str(e)}"
+                "user": portfolio.user, 
+                "error": f"Stock symbol '{symbol}' not found"
             }
         )
     
@@ -151,7 +244,7 @@ async def add_stock(
     existing = session.exec(
         select(Stock).where(
             Stock.portfolio_id == portfolio_id,
-            Stock.symbol == symbol.upper()
+            Stock.symbol == symbol
         )
     ).first()
     
@@ -160,23 +253,22 @@ async def add_stock(
             "portfolio.html", 
             {
                 "request": request, 
-                "user": user, 
+                "user": portfolio.user, 
                 "error": f"Stock {symbol} already in portfolio"
             }
         )
     
-    # Add stock to portfolio
+    # Add stock to portfolio; market data is fetched in the background
     new_stock = Stock(
-        symbol=symbol.upper(),
+        symbol=symbol,
         portfolio_id=portfolio_id,
-        last_price=stock_data.get("price", 0),
-        ma_200=stock_data.get("ma_200", 0),
-        distance_to_ma=stock_data.get("distance_to_ma", 0),
     )
     
     session.add(new_stock)
     session.commit()
-    logger.info(f"Added stock {symbol.upper()} to portfolio {portfolio_id}")
+    logger.info("Added stock %s to portfolio %s", symbol, portfolio_id)
+    
+    background_tasks.add_task(update_stock_quote, symbol)
     
     return RedirectResponse(url="/portfolio", status_code=status.HTTP_303_SEE_OTHER)
 
@@ -184,141 +276,154 @@ async def add_stock(
 async def remove_stock(
     portfolio_id: int,
     stock_id: int,
-    user: User = Depends(get_current_user),
+    portfolio: Portfolio = Depends(get_user_portfolio),
     session: Session = Depends(get_session)
 ):
-    # Verify portfolio exists and belongs to user
-    portfolio = session.exec(
-        select(Portfolio).where(
-            Portfolio.id == portfolio_id,
-            Portfolio.user_id == user.id
+    # Delete the stock if it's in this portfolio, with any alert queued for it
+    session.execute(
+        delete(PendingAlert).where(
+            PendingAlert.stock_id == stock_id,
+            PendingAlert.portfolio_id == portfolio_id
         )
-    ).first()
-    
-    if not portfolio:
-        raise HTTPException(status_code=404, detail="Portfolio not found")
-    
-    # Find and delete the stock
-    stock = session.exec(
-        select(Stock).where(
+    )
+    removed = session.execute(
+        delete(Stock)
+        .where(
             Stock.id == stock_id,
             Stock.portfolio_id == portfolio_id
         )
-    ).first()
+        .returning(Stock.symbol)
+    ).scalars().first()
+    session.commit()
     
-    if stock:
-        symbol = stock.symbol
-        session.delete(stock)
-        session.commit()
-        logger.info(f"Removed stock {symbol} from portfolio {portfolio_id}")
+    if removed:
+        logger.info("Removed stock %s from portfolio %s", removed, portfolio_id)
     
     return RedirectResponse(url="/portfolio", status_code=status.HTTP_303_SEE_OTHER)
 
+@router.post("/portfolio/{portfolio_id}/import")
+async def import_stocks(
+    portfolio_id: int,
+    file: UploadFile = File(...),
+    portfolio: Portfolio = Depends(get_user_portfolio),
+    session: Session = Depends(get_session)
+):
+    """Bulk import stock symbols from a CSV or Parquet upload"""
+    try:
+        if (file.filename or "").lower().endswith(".parquet"):
+            symbols = bulk_service.iter_symbols_from_parquet(file.file)
+        else:
+            symbols = bulk_service.iter_symbols_from_csv(file.file)
+
+        result = bulk_service.import_symbols(session, portfolio_id, symbols)
+    except Exception as e:
+        session.rollback()
+        logger.error("Error importing stocks into portfolio %s: %s", portfolio_id, e)
+        return RedirectResponse(
+            url="/portfolio?error=import_failed",
+            status_code=status.HTTP_303_SEE_OTHER
+        )
+    finally:
+        await file.close()
+
+    return RedirectResponse(
+        url=(
+            f"/portfolio?success=import_completed&imported={result['imported']}"
+            f"&skipped={result['skipped']}&invalid={result['invalid_count']}"
+        ),
+        status_code=status.HTTP_303_SEE_OTHER
+    )
+
+@router.get("/portfolio/{portfolio_id}/export")
+async def export_stocks(
+    portfolio_id: int,
+    format: str = "csv",
+    portfolio: Portfolio = Depends(get_user_portfolio)
+):
+    """Stream the portfolio holdings as CSV or Parquet"""
+    if format == "csv":
+        return StreamingResponse(
+            bulk_service.iter_portfolio_csv(portfolio_id),
+            media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="portfolio-{portfolio_id}.csv"'}
+        )
+
+    if format == "parquet":
+        if not bulk_service.PARQUET_AVAILABLE:
+            raise HTTPException(status_code=501, detail="Parquet export is not available")
+        return StreamingResponse(
+            bulk_service.iter_portfolio_parquet(portfolio_id),
+            media_type="application/vnd.apache.parquet",
+            headers={"Content-Disposition": f'attachment; filename="portfolio-{portfolio_id}.parquet"'}
+        )
+
+    raise HTTPException(status_code=400, detail="Unsupported export format")
+
 @router.post("/portfolio/{portfolio_id}/delete")
 async def delete_portfolio(
     portfolio_id: int,
-    user: User = Depends(get_current_user),
+    portfolio: Portfolio = Depends(get_user_portfolio),
     session: Session = Depends(get_session)
 ):
-    # Verify portfolio exists and belongs to user
-    portfolio = session.exec(
-        select(Portfolio).where(
-            Portfolio.id == portfolio_id,
-            Portfolio.user_id == user.id
-        )
-    ).first()
-    
-    if not portfolio:
-        raise HTTPException(status_code=404, detail="Portfolio not found")
-    
-    # Delete all stocks in portfolio
-    stocks = session.exec(
-        select(Stock).where(Stock.portfolio_id == portfolio_id)
-    ).all()
-    
-    for stock in stocks:
-        session.delete(stock)
-    
-    # Delete portfolio
-    portfolio_name = portfolio.name
-    session.delete(portfolio)
+    # Delete the portfolio, its holdings and queued digest alerts in one transaction.
+    # Its events stay in the append-only log; /events only serves current portfolios.
+    session.execute(delete(PendingAlert).where(PendingAlert.portfolio_id == portfolio_id))
+    session.execute(delete(Stock).where(Stock.portfolio_id == portfolio_id))
+    session.execute(delete(Portfolio).where(Portfolio.id == portfolio_id))
     session.commit()
-    logger.info(f"Deleted portfolio {portfolio_name} for user {user.id}")
+    logger.info("Deleted portfolio %s for user %s", portfolio.name, portfolio.user_id)
     
     return RedirectResponse(url="/portfolio", status_code=status.HTTP_303_SEE_OTHER)
 
 @router.get("/portfolio/{portfolio_id}/refresh")
 async def refresh_portfolio(
     portfolio_id: int,
-    user: User = Depends(get_current_user),
+    portfolio: Portfolio = Depends(get_user_portfolio),
     session: Session = Depends(get_session)
 ):
-    # Verify portfolio exists and belongs to user
-    portfolio = session.exec(
-        select(Portfolio).where(
-            Portfolio.id == portfolio_id,
-            Portfolio.user_id == user.id
-        )
-    ).first()
-    
-    if not portfolio:
-        raise HTTPException(status_code=404, detail="Portfolio not found")
-    
-    # Get all stocks in portfolio
-    stocks = session.exec(
-        select(Stock).where(Stock.portfolio_id == portfolio_id)
+    # Get all symbols in portfolio
+    symbols = session.exec(
+        select(Stock.symbol).where(Stock.portfolio_id == portfolio_id).distinct()
     ).all()
+    # Return the connection to the pool while waiting on the market data API
+    session.close()
     
-    # Update each stock
-    for stock in stocks:
+    # Update each symbol's shared market data
+    for symbol in symbols:
         try:
-            stock_data = await stock_service.get_stock_data(stock.symbol)
-            if stock_data:
-                stock.last_price = stock_data.get("price", stock.last_price)
-                stock.ma_200 = stock_data.get("ma_200", stock.ma_200)
-                stock.distance_to_ma = stock_data.get("distance_to_ma", stock.distance_to_ma)
-                stock.last_checked = stock_data.get("timestamp", None)
-                session.add(stock)
+            await indicator_service.get_indicator_data(symbol)
         except Exception as e:
-            logger.error(f"Error updating stock {stock.symbol}: {str(e)}")
+            logger.error("Error updating stock %s: %s", symbol, e)
             continue
     
-    session.commit()
-    logger.info(f"Refreshed portfolio {portfolio_id}")
+    logger.info("Refreshed portfolio %s", portfolio_id)
     
     return RedirectResponse(url="/portfolio", status_code=status.HTTP_303_SEE_OTHER)
 
 @router.get("/portfolio/{portfolio_id}/test-notification")
 async def test_notification(
     portfolio_id: int,
-    user: User = Depends(get_current_user),
+    portfolio: Portfolio = Depends(get_user_portfolio),
     session: Session = Depends(get_session)
 ):
     """Send a test notification to the user"""
-    # Verify portfolio exists and belongs to user
-    portfolio = session.exec(
-        select(Portfolio).where(
-            Portfolio.id == portfolio_id,
-            Portfolio.user_id == user.id
-        )
-    ).first()
-    
-    if not portfolio:
-        raise HTTPException(status_code=404, detail="Portfolio not found")
+    email = portfolio.user.email
+    # Return the connection to the pool while the notification is sent
+    session.close()
     
     # Use the NotificationService
     from app.services.notification_service import NotificationService
     notification_service = NotificationService()
-    success = await notification_service.send_test_notification(user.email)
+    success = await notification_service.send_test_notification(email)
     
     if success:
-        logger.info(f"Test notification sent to {user.email}")
+        logger.info("Test notification sent to %s", email)
         return RedirectResponse(
             url="/portfolio?success=notification_sent", 
             status_code=status.HTTP_303_SEE_OTHER,
         )
     else:
-        logger.error(f"Failed to send test notification to {user.email}")
+        logger.error("Failed to send test notification to %s", email)
         return RedirectResponse(
             url="/portfolio?error=notification_failed", 
             status_code=status.HTTP_303_SEE_OTHER
@@ -327,20 +432,12 @@ async def test_notification(
 @router.get("/portfolio/{portfolio_id}/check-alerts")
 async def manual_check_alerts(
     portfolio_id: int,
-    user: User = Depends(get_current_user),
+    portfolio: Portfolio = Depends(get_user_portfolio),
     session: Session = Depends(get_session)
 ):
     """Manually trigger the stock alerts check for this portfolio"""
-    # Verify portfolio exists and belongs to user
-    portfolio = session.exec(
-        select(Portfolio).where(
-            Portfolio.id == portfolio_id,
-            Portfolio.user_id == user.id
-        )
-    ).first()
-    
-    if not portfolio:
-        raise HTTPException(status_code=404, detail="Portfolio not found")
+    # The check opens its own session; don't hold this connection meanwhile
+    session.close()
     
     # Import the check function
     from app.scheduler.jobs import manual_check_portfolio_stocks
@@ -349,13 +446,13 @@ async def manual_check_alerts(
     success = await manual_check_portfolio_stocks(portfolio_id)
     
     if success:
-        logger.info(f"Manual stock check completed for portfolio {portfolio_id}")
+        logger.info("Manual stock check completed for portfolio %s", portfolio_id)
         return RedirectResponse(
             url="/portfolio?success=check_completed", 
             status_code=status.HTTP_303_SEE_OTHER
         )
     else:
-        logger.error(f"Error running manual stock check for portfolio {portfolio_id}")
+        logger.error("Error running manual stock check for portfolio %s", portfolio_id)
         return RedirectResponse(
             url="/portfolio?error=check_failed", 
             status_code=status.HTTP_303_SEE_OTHER
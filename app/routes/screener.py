@@ -0,0 +1,105 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.templating import Jinja2Templates
+from sqlmodel import Session, select
+from typing import Optional
+import logging
+
+from app.models.models import User, Portfolio, Stock, get_session
+from app.services.auth_service import get_current_user
+from app.services.screener_service import SORT_COLUMNS, screen
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/screener", tags=["screener"])
+templates = Jinja2Templates(directory="app/templates")
+
+def optional_number(value: Optional[str], kind: type, name: str):
+    """Parse a form field, treating a blank input as no filter"""
+    if value is None or not value.strip():
+        return None
+    try:
+        return kind(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name} '{value}'")
+
+def run_screen(session: Session, **criteria):
+    try:
+        return screen(session, **criteria)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/results")
+async def screener_results(
+    min_distance: Optional[float] = None,
+    max_distance: Optional[float] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_days: Optional[int] = None,
+    max_days: Optional[int] = None,
+    sort: str = "distance",
+    desc: bool = False,
+    limit: int = 100,
+    offset: int = 0,
+    user: User = Depends(get_current_user),
+    session: Session = Depends(get_session)
+):
+    """
+    Screen every tracked symbol by distance to its 200-day SMA, price and days below it
+
+    Distances are in percent, e.g. min_distance=-15&max_distance=0 for
+    symbols up to 15% below the average.
+    """
+    return run_screen(
+        session,
+        min_distance=min_distance, max_distance=max_distance,
+        min_price=min_price, max_price=max_price,
+        min_days=min_days, max_days=max_days,
+        sort=sort, descending=desc, limit=limit, offset=offset,
+    )
+
+@router.get("")
+async def screener_page(
+    request: Request,
+    min_distance: Optional[str] = "-15",
+    max_distance: Optional[str] = "0",
+    min_price: Optional[str] = None,
+    max_price: Optional[str] = None,
+    min_days: Optional[str] = None,
+    max_days: Optional[str] = None,
+    sort: str = "distance",
+    desc: bool = False,
+    user: User = Depends(get_current_user),
+    session: Session = Depends(get_session)
+):
+    # The form submits empty inputs as blank strings; a cleared field means no filter
+    criteria = {
+        "min_distance": optional_number(min_distance, float, "min_distance"),
+        "max_distance": optional_number(max_distance, float, "max_distance"),
+        "min_price": optional_number(min_price, float, "min_price"),
+        "max_price": optional_number(max_price, float, "max_price"),
+        "min_days": optional_number(min_days, int, "min_days"),
+        "max_days": optional_number(max_days, int, "max_days"),
+    }
+    result = run_screen(session, **criteria, sort=sort, descending=desc)
+
+    # Highlight symbols the user already holds
+    held = set(session.exec(
+        select(Stock.symbol)
+        .join(Portfolio, Portfolio.id == Stock.portfolio_id)
+        .where(Portfolio.user_id == user.id)
+    ).all())
+
+    return templates.TemplateResponse(
+        "screener.html",
+        {
+            "request": request,
+            "criteria": criteria,
+            "sort": sort,
+            "desc": desc,
+            "sort_options": list(SORT_COLUMNS),
+            "total": result["total"],
+            "results": result["results"],
+            "held": held,
+        }
+    )
@@ -0,0 +1,65 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse
+from html import escape
+import logging
+
+from app.models.models import User
+from app.services import chart_service
+from app.services.auth_service import get_current_user
+from app.services.symbol_service import symbol_index
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/symbols", tags=["symbols"])
+
+@router.get("/search")
+async def search_symbols(request: Request, q: str = "", symbol: str = "", limit: int = 10):
+    """Typeahead search over the local symbol universe"""
+    # htmx sends the input value under its field name
+    query = q or symbol
+    limit = max(1, min(limit, 50))
+    results = symbol_index.search(query, limit=limit)
+
+    if request.headers.get("HX-Request"):
+        # Render <option> elements for the add-stock datalist
+        options = "".join(
+            f'<option value="{escape(item["symbol"])}">{escape(item["name"])}</option>'
+            for item in results
+        )
+        return HTMLResponse(options)
+
+    return {"query": query, "results": results}
+
+@router.get("/{symbol}/chart")
+async def get_chart(
+    symbol: str,
+    range_: str = Query("1y", alias="range"),
+    points: int = chart_service.DEFAULT_POINTS,
+    indicators: str = "sma_200",
+    user: User = Depends(get_current_user)
+):
+    """
+    Price and moving-average series for charting, downsampled server-side
+
+    Columnar: `t` holds Unix timestamps and `close` plus each indicator hold
+    the values at those days (null before an average has enough history).
+    """
+    names = [name.strip().lower() for name in indicators.split(",") if name.strip()]
+    try:
+        series = await chart_service.get_series(symbol, range_=range_, points=points, indicators=names)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not series["bars"]:
+        raise HTTPException(status_code=404, detail=f"No stored history for {symbol.upper()} in this range")
+    return series
+
+@router.get("/{symbol}")
+async def get_symbol(symbol: str):
+    """Return listing details for a single symbol"""
+    info = symbol_index.get(symbol)
+    return {
+        "symbol": symbol.upper(),
+        "valid": symbol_index.is_valid(symbol),
+        "listing": info
+    }
@@ -1,127 +1,289 @@
 import logging
-from datetime import datetime
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+from sqlalchemy import func, or_, update
 from sqlmodel import Session, select
 
 from app.models.models import Portfolio, Stock, User, get_engine
+from app.scheduler.working_set import iter_holding_chunks, load_portfolios, write_holdings
 from app.services.stock_service import StockService
+from app.services.indicator_service import (
+    IndicatorService,
+    distance_pct,
+    evaluate_rules,
+    indicator_label,
+    load_indicator_values,
+    parse_rules,
+)
 from app.services.notification_service import NotificationService
+from app.services.digest_service import DAILY_DIGEST, DIGEST_MODES, SWEEP_DIGEST, deliver_digests, queue_alert
+from app.services.event_service import (
+    ALERT_FAILED,
+    ALERT_QUEUED,
+    ALERT_SENT,
+    IN_BAND,
+    MA_STATE_CHANGED,
+    OUT_OF_BAND,
+    PRICE_OBSERVED,
+    EventBuffer,
+)
+from app.services.market_calendar import MARKET_TIMEZONE, USE_MARKET_CALENDAR, market_calendar
+from app.services.polling_service import poll_interval_hours
+from app.services.price_archive import ARCHIVE_PATH, ArchiveLockedError, PriceArchiveWriter, sync_from_database
+from app.utils.metrics import POLL_INTERVAL, SWEEP_DURATION, SWEEP_SYMBOLS
+from app.utils.logging_config import SampledLogger
 
-# Configure logging
+# Configure logging; per-symbol messages are rate limited
 logger = logging.getLogger(__name__)
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
+symbol_logger = SampledLogger(logger)
 
 # Initialize services
 stock_service = StockService()
+indicator_service = IndicatorService(stock_service)
 notification_service = NotificationService()
 logger.info("Using NotificationAPI for alerts")
 
-async def check_stock_alerts():
+# Portfolios claimed per round trip, and how long a claim keeps other sweep workers away
+CLAIM_BATCH_SIZE = int(os.getenv("SWEEP_CLAIM_BATCH_SIZE", "50"))
+CLAIM_LEASE = timedelta(minutes=int(os.getenv("SWEEP_CLAIM_LEASE_MINUTES", "30")))
+
+def is_unclaimed(claimed_before: datetime):
+    """Filter for portfolios no sweep worker has claimed since `claimed_before`"""
+    return or_(Portfolio.sweep_claimed_at.is_(None), Portfolio.sweep_claimed_at < claimed_before)
+
+def claim_portfolios(session: Session, claimed_before: datetime, limit: int = CLAIM_BATCH_SIZE) -> List[int]:
     """
-    Background job to check if stocks are near their 200-day moving average
-    and send notifications to users if needed.
+    Atomically claim a batch of unclaimed portfolios for this worker
+    
+    On PostgreSQL, rows being claimed by a concurrent worker are skipped
+    (FOR UPDATE SKIP LOCKED) instead of waited on. On SQLite the single
+    UPDATE statement is serialized by the database write lock.
+    
+    Returns:
+        List of claimed portfolio ids
+    """
+    due = (
+        select(Portfolio.id)
+        .where(is_unclaimed(claimed_before))
+        .order_by(Portfolio.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    claimed = session.execute(
+        update(Portfolio)
+        .where(Portfolio.id.in_(due.scalar_subquery()))
+        .values(sweep_claimed_at=datetime.now())
+        .returning(Portfolio.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    session.commit()
+    return list(claimed)
+
+async def check_stock_alerts(progress: Optional[Callable[[int, int, str], None]] = None, force: bool = False):
+    """
+    Background job to check if stocks are near the moving averages configured
+    for their portfolio and send notifications to users if needed.
+    
+    Portfolios are claimed in batches, so several app workers can run the
+    job at once without checking a portfolio twice.
+    
+    Args:
+        progress: Optional callback(done, total, portfolio name) called after each portfolio
+        force: Also check portfolios another sweep claimed within the lease
     """
     logger.info("Running scheduled stock check")
+    sweep_start = time.perf_counter()
+    symbols_updated = 0
+    
+    # Portfolios claimed by another worker within the lease are skipped
+    claimed_before = datetime.now() - (timedelta(0) if force else CLAIM_LEASE)
     
     with Session(get_engine()) as session:
-        # Get all portfolios
-        portfolios = session.exec(select(Portfolio)).all()
+        total = session.exec(select(func.count(Portfolio.id)).where(is_unclaimed(claimed_before))).one()
+        done = 0
         
-        for portfolio in portfolios:
-            logger.info(f"Checking portfolio: {portfolio.name} (ID: {portfolio.id})")
-            
-            # Get all stocks in the portfolio
-            stocks = session.exec(select(Stock).where(Stock.portfolio_id == portfolio.id)).all()
-            
-            # Get user info for notifications
-            user = session.exec(select(User).where(User.id == portfolio.user_id)).first()
-            if not user:
-                logger.warning(f"User not found for portfolio {portfolio.id}, skipping")
-                continue
+        # Claim portfolios in batches so several workers can share a sweep
+        while portfolio_ids := claim_portfolios(session, claimed_before):
+            portfolios = load_portfolios(session, portfolio_ids)
             
-            for stock in stocks:
-                try:
-                    # Check if it's time to update this stock based on polling rate
-                    should_update = True
-                    if stock.last_checked:
-                        hours_since_check = (datetime.now() - stock.last_checked).total_seconds() / 3600
-                        should_update = hours_since_check >= portfolio.polling_rate
+            for portfolio in portfolios:
+                logger.debug("Checking portfolio: %s (ID: %s)", portfolio.name, portfolio.id)
+                rules = parse_rules(portfolio.indicators)
+                events = EventBuffer()
+                
+                # Holdings with the shared market data of their symbols, a chunk at a time
+                for holdings in iter_holding_chunks(session, portfolio.id):
+                    # Stored indicators for symbols refreshed recently, possibly for another portfolio
+                    stored_indicators = load_indicator_values(
+                        session, list({stock.symbol for stock in holdings}), [name for name, _ in rules]
+                    )
                     
-                    if should_update:
-                        logger.info(f"Updating stock {stock.symbol}")
-                        
-                        # Get updated stock data
-                        stock_data = await stock_service.get_stock_data(stock.symbol)
-                        
-                        # Update stock in database
-                        stock.last_price = stock_data.get("price", stock.last_price)
-                        stock.ma_200 = stock_data.get("ma_200", stock.ma_200)
-                        stock.distance_to_ma = stock_data.get("distance_to_ma", stock.distance_to_ma)
-                        stock.last_checked = datetime.now()
-                        
-                        # Check if stock is at or below MA by up to 15%
-                        is_at_or_below_ma = False
-                        if stock.distance_to_ma is not None and stock.ma_200 is not None:
-                            is_at_or_below_ma = (stock.distance_to_ma <= 0 and 
-                                                stock.distance_to_ma >= -15.0)
-                        
-                        # Calculate days since last MA break if we have a break date
-                        if stock.last_ma_break_date:
-                            days_since_break = (datetime.now() - stock.last_ma_break_date).days
-                            stock.days_since_ma_break = days_since_break
-                        
-                        # If stock just broke MA, record the date
-                        if is_at_or_below_ma:
-                            # Only update the break date if this is a new break or first time checking
-                            if not stock.last_ma_break_date or not stock.notification_sent:
-                                stock.last_ma_break_date = datetime.now()
-                                stock.days_since_ma_break = 0
-                                logger.info(f"Stock {stock.symbol} broke 200-day MA")
+                    for stock in holdings:
+                        try:
+                            # Refresh the symbol if its shared data is older than this holding's
+                            # adaptive interval: sooner near an alert band, up to the polling rate
+                            should_update = True
+                            if stock.last_checked:
+                                hours_since_check = (datetime.now() - stock.last_checked).total_seconds() / 3600
+                                interval = poll_interval_hours(
+                                    stock.last_price,
+                                    stored_indicators.get(stock.symbol, {}),
+                                    rules,
+                                    stock.volatility,
+                                    portfolio.polling_rate,
+                                )
+                                should_update = hours_since_check >= interval
+                                POLL_INTERVAL.observe(interval)
                             
-                            # Only send notification if it hasn't already been sent for this break
-                            if not stock.notification_sent:
-                                logger.info(f"Stock {stock.symbol} is at/below 200-day MA, sending notification")
+                            if should_update:
+                                symbol_logger.debug("Updating stock %s", stock.symbol)
                                 
-                                # Send notification 
-                                success = await notification_service.send_ma_alert(
-                                    user.email, 
-                                    {
-                                        "symbol": stock.symbol,
-                                        "price": stock.last_price,
-                                        "ma_200": stock.ma_200,
-                                        "distance_to_ma": stock.distance_to_ma,
-                                        "days_since_break": stock.days_since_ma_break or 0
-                                    }
+                                # Get the latest close and every indicator from one daily series;
+                                # this also updates the shared Symbol row
+                                stock_data = await indicator_service.get_indicator_data(stock.symbol)
+                                
+                                # Keep the stored values (and retry next sweep) when the
+                                # upstream is unavailable and nothing is cached
+                                if stock_data.get("price") is None:
+                                    symbol_logger.info("No data for %s, keeping previous values", stock.symbol)
+                                    continue
+                                # A fallback from stored history says nothing new about the
+                                # market; leave alert state alone until fresh data arrives
+                                if stock_data.get("stale"):
+                                    symbol_logger.info("Only stale data for %s, skipping alert check", stock.symbol)
+                                    continue
+                                symbols_updated += 1
+                                
+                                price, indicators = stock_data["price"], stock_data["indicators"]
+                                events.add(
+                                    PRICE_OBSERVED, stock,
+                                    price=price, ma_200=stock_data["ma_200"], distance_to_ma=stock_data["distance_to_ma"],
                                 )
+                            else:
+                                price, indicators = stock.last_price, stored_indicators.get(stock.symbol, {})
+                            
+                            if price is not None:
+                                # Check if stock is at or below any configured indicator by up to its threshold
+                                triggered = evaluate_rules(price, indicators, rules)
+                                is_at_or_below_ma = bool(triggered)
                                 
-                                if success:
-                                    stock.notification_sent = True
-                                    logger.info(f"Notification sent for {stock.symbol}")
-                                else:
-                                    logger.warning(f"Failed to send notification for {stock.symbol}")
-                        
-                        # Reset notification flag if stock is no longer at/below MA
-                        elif not is_at_or_below_ma and stock.notification_sent:
-                            stock.notification_sent = False
-                            logger.info(f"Stock {stock.symbol} moved above 200-day MA, reset notification flag")
+                                # Calculate days since last MA break if we have a break date
+                                if stock.last_ma_break_date:
+                                    days_since_break = (datetime.now() - stock.last_ma_break_date).days
+                                    if days_since_break != stock.days_since_ma_break:
+                                        stock.days_since_ma_break = days_since_break
+                                        stock.changed = True
+                                
+                                # If stock just broke MA, record the date
+                                if is_at_or_below_ma:
+                                    # Only update the break date if this is a new break or first time checking
+                                    if not stock.last_ma_break_date or not stock.notification_sent:
+                                        stock.last_ma_break_date = datetime.now()
+                                        stock.days_since_ma_break = 0
+                                        stock.changed = True
+                                        symbol_logger.info("Stock %s broke %s", stock.symbol, triggered[0]["label"])
+                                        events.add(
+                                            MA_STATE_CHANGED, stock,
+                                            state=IN_BAND, indicators=[rule["indicator"] for rule in triggered],
+                                        )
+                                    
+                                    # Only send notification if it hasn't already been sent for this break
+                                    if not stock.notification_sent:
+                                        alert = {
+                                            "symbol": stock.symbol,
+                                            "price": price,
+                                            "ma_200": triggered[0]["value"],
+                                            "distance_to_ma": triggered[0]["distance"],
+                                            "indicator": triggered[0]["indicator"],
+                                            "indicator_label": triggered[0]["label"],
+                                            "days_since_break": stock.days_since_ma_break or 0
+                                        }
+                                        
+                                        # Digest portfolios queue the alert; the flag stops it being queued again
+                                        if portfolio.alert_mode in DIGEST_MODES:
+                                            queue_alert(session, stock, portfolio.user_id, portfolio.alert_mode, alert)
+                                            stock.notification_sent = True
+                                            stock.changed = True
+                                            events.add(
+                                                ALERT_QUEUED, stock,
+                                                indicator=triggered[0]["indicator"], distance=triggered[0]["distance"],
+                                                digest=portfolio.alert_mode,
+                                            )
+                                        else:
+                                            symbol_logger.info("Stock %s is at/below %s, sending notification", stock.symbol, triggered[0]["label"])
+                                            
+                                            # Send notification 
+                                            success = await notification_service.send_ma_alert(portfolio.email, alert)
+                                            
+                                            if success:
+                                                stock.notification_sent = True
+                                                stock.changed = True
+                                                symbol_logger.info("Notification sent for %s", stock.symbol)
+                                            else:
+                                                logger.warning("Failed to send notification for %s", stock.symbol)
+                                            events.add(
+                                                ALERT_SENT if success else ALERT_FAILED, stock,
+                                                indicator=triggered[0]["indicator"], distance=triggered[0]["distance"],
+                                            )
+                                
+                                # Reset notification flag if stock is no longer at/below MA
+                                elif not is_at_or_below_ma and stock.notification_sent:
+                                    stock.notification_sent = False
+                                    stock.changed = True
+                                    symbol_logger.info("Stock %s moved out of its alert bands, reset notification flag", stock.symbol)
+                                    events.add(MA_STATE_CHANGED, stock, state=OUT_OF_BAND)
                         
-                        session.add(stock)
+                        except Exception as e:
+                            logger.error("Error checking stock %s: %s", stock.symbol, e)
+                    
+                    # Write this chunk's changes and events, then let it go
+                    write_holdings(session, holdings)
+                    events.flush(session)
+                    session.commit()
                 
-                except Exception as e:
-                    logger.error(f"Error checking stock {stock.symbol}: {str(e)}")
-            
-            # Commit all changes for this portfolio
-            session.commit()
+                done += 1
+                if progress:
+                    progress(done, total, portfolio.name)
+        
+    # One message per user for everything queued during the sweep
+    await deliver_digests(notification_service, SWEEP_DIGEST)
     
-    logger.info("Stock check completed")
+    SWEEP_DURATION.observe(time.perf_counter() - sweep_start, job="scheduled")
+    SWEEP_SYMBOLS.observe(symbols_updated, job="scheduled")
+    logger.info("Stock check completed", extra={"symbols_updated": symbols_updated})
+
+async def scheduled_sweep():
+    """
+    Hourly job: run the sweep while a session is in progress
+    
+    Closes and indicators can't change while the market is closed, so those
+    runs are skipped; `post_close_sweep` picks up each session's final close.
+    """
+    if USE_MARKET_CALENDAR and not market_calendar.is_open():
+        logger.info("Market closed, skipping stock check until %s", market_calendar.next_open().isoformat())
+        return
+    await check_stock_alerts()
+
+async def post_close_sweep():
+    """
+    Run the sweep once the day's close has settled, on trading days only
+    """
+    today = datetime.now(MARKET_TIMEZONE).date()
+    if USE_MARKET_CALENDAR and not market_calendar.is_trading_day(today):
+        logger.info("No session on %s, skipping post-close stock check", today)
+        return
+    # Claims left by the last hourly sweeps are still within the lease; the
+    # final close must be evaluated for every portfolio regardless
+    await check_stock_alerts(force=True)
 
 async def manual_check_portfolio_stocks(portfolio_id: int) -> bool:
     """
     Manually check stocks in a specific portfolio for alerts
     """
-    logger.info(f"Manually checking stocks in portfolio {portfolio_id}")
+    logger.info("Manually checking stocks in portfolio %s", portfolio_id)
+    sweep_start = time.perf_counter()
     
     try:
         with Session(get_engine()) as session:
@@ -129,79 +291,132 @@ async def manual_check_portfolio_stocks(portfolio_id: int) -> bool:
             portfolio = session.exec(select(Portfolio).where(Portfolio.id == portfolio_id)).first()
             
             if not portfolio:
-                logger.error(f"Portfolio {portfolio_id} not found")
+                logger.error("Portfolio %s not found", portfolio_id)
                 return False
             
             # Get user info for notifications
             user = session.exec(select(User).where(User.id == portfolio.user_id)).first()
             if not user:
-                logger.warning(f"User not found for portfolio {portfolio_id}, skipping")
+                logger.warning("User not found for portfolio %s, skipping", portfolio_id)
                 return False
             
             # Get all stocks in the portfolio
             stocks = session.exec(select(Stock).where(Stock.portfolio_id == portfolio_id)).all()
+            rules = parse_rules(portfolio.indicators)
+            events = EventBuffer()
             
             for stock in stocks:
                 try:
-                    logger.info(f"Updating stock {stock.symbol}")
-                    
-                    # Get updated stock data
-                    stock_data = await stock_service.get_stock_data(stock.symbol)
+                    symbol_logger.debug("Updating stock %s", stock.symbol)
                     
-                    # IMPORTANT: Only update values if they are not None or zero
-                    if stock_data.get("price") and stock_data.get("price") > 0:
-                        stock.last_price = stock_data.get("price")
+                    # Get the latest close and every indicator from one daily series
+                    stock_data = await indicator_service.get_indicator_data(stock.symbol)
+                    if stock_data.get("stale"):
+                        symbol_logger.info("Only stale data for %s, skipping alert check", stock.symbol)
+                        continue
+                    indicators = stock_data["indicators"]
+                    price = stock_data.get("price")
                     
-                    if stock_data.get("ma_200") and stock_data.get("ma_200") > 0:
-                        stock.ma_200 = stock_data.get("ma_200")
+                    if price is not None:
+                        events.add(
+                            PRICE_OBSERVED, stock,
+                            price=price, ma_200=stock_data.get("ma_200"), distance_to_ma=stock_data.get("distance_to_ma"),
+                        )
                     
-                    if stock_data.get("distance_to_ma") is not None:
-                        stock.distance_to_ma = stock_data.get("distance_to_ma")
-                        
-                    stock.last_checked = datetime.now()
-                    
-                    # Check if stock is near 200-day MA
-                    if stock.last_price and stock.ma_200:
-                        is_near_ma = stock_service.is_near_ma(stock.last_price, stock.ma_200, threshold=15.0)
+                    # Check if stock is near any configured indicator
+                    if price:
+                        near = [
+                            (name, indicators[name])
+                            for name, threshold in rules
+                            if indicators.get(name)
+                            and stock_service.is_near_ma(price, indicators[name], threshold=threshold)
+                        ]
+                        is_near_ma = bool(near)
                         
                         # Send notification if stock is near MA and no notification has been sent
                         if is_near_ma and not stock.notification_sent:
-                            logger.info(f"Stock {stock.symbol} is near 200-day MA, sending notification")
+                            name, value = near[0]
+                            events.add(MA_STATE_CHANGED, stock, state=IN_BAND, indicators=[rule for rule, _ in near])
+                            alert = {
+                                "symbol": stock.symbol,
+                                "price": price,
+                                "ma_200": value,
+                                "distance_to_ma": distance_pct(price, value),
+                                "indicator": name,
+                                "indicator_label": indicator_label(name)
+                            }
                             
-                            # Send notification 
-                            success = await notification_service.send_ma_alert(
-                                user.email, 
-                                {
-                                    "symbol": stock.symbol,
-                                    "price": stock.last_price,
-                                    "ma_200": stock.ma_200,
-                                    "distance_to_ma": stock.distance_to_ma
-                                }
-                            )
-                            
-                            if success:
+                            if portfolio.alert_mode in DIGEST_MODES:
+                                queue_alert(session, stock, user.id, portfolio.alert_mode, alert)
                                 stock.notification_sent = True
-                                logger.info(f"Notification sent for {stock.symbol}")
+                                events.add(
+                                    ALERT_QUEUED, stock,
+                                    indicator=name, distance=alert["distance_to_ma"], digest=portfolio.alert_mode,
+                                )
                             else:
-                                logger.warning(f"Failed to send notification for {stock.symbol}")
+                                symbol_logger.info("Stock %s is near %s, sending notification", stock.symbol, indicator_label(name))
+                                
+                                # Send notification 
+                                success = await notification_service.send_ma_alert(user.email, alert)
+                                
+                                if success:
+                                    stock.notification_sent = True
+                                    symbol_logger.info("Notification sent for %s", stock.symbol)
+                                else:
+                                    logger.warning("Failed to send notification for %s", stock.symbol)
+                                events.add(
+                                    ALERT_SENT if success else ALERT_FAILED, stock,
+                                    indicator=name, distance=alert["distance_to_ma"],
+                                )
                         
                         # Reset notification flag if stock is no longer near MA
                         elif not is_near_ma and stock.notification_sent:
                             stock.notification_sent = False
-                            logger.info(f"Stock {stock.symbol} moved away from 200-day MA, reset notification flag")
+                            symbol_logger.info("Stock %s moved away from its indicators, reset notification flag", stock.symbol)
+                            events.add(MA_STATE_CHANGED, stock, state=OUT_OF_BAND)
                     
                     session.add(stock)
                 
                 except Exception as e:
-                    logger.error(f"Error checking stock {stock.symbol}: {str(e)}")
+                    logger.error("Error checking stock %s: %s", stock.symbol, e)
                     # Important: Don't update the stock if there's an error
                     continue
             
-            # Commit all changes
+            # Commit all changes and their events
+            events.flush(session)
             session.commit()
-            
+            user_id = user.id
+        
+        # A manual check counts as a sweep for this user's digest
+        await deliver_digests(notification_service, SWEEP_DIGEST, user_ids=[user_id])
+        
+        SWEEP_DURATION.observe(time.perf_counter() - sweep_start, job="manual")
+        SWEEP_SYMBOLS.observe(len(stocks), job="manual")
         return True
     
     except Exception as e:
-        logger.error(f"Error in manual stock check: {str(e)}")
-        return False
\ No newline at end of file
+        logger.error("Error in manual stock check: %s", e)
+        return False
+
+async def deliver_daily_digests():
+    """
+    Send the daily digest to users whose portfolios collect alerts for the day
+    """
+    logger.info("Delivering daily digests")
+    await deliver_digests(notification_service, DAILY_DIGEST)
+
+def sync_price_archive():
+    """
+    Append newly stored daily bars to the shared price archive.
+    Runs in a scheduler thread; skipped if another process is writing.
+    """
+    if not ARCHIVE_PATH:
+        return
+    
+    try:
+        with PriceArchiveWriter(ARCHIVE_PATH) as writer, Session(get_engine()) as session:
+            sync_from_database(session, writer)
+    except ArchiveLockedError:
+        logger.info("Price archive is being written by another process, skipping sync")
+    except Exception as e:
+        logger.error("Error syncing price archive: %s", e)
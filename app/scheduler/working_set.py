@@ -0,0 +1,136 @@
+"""
+Compact working set for the scheduled sweep.
+
+The sweep reads only the columns it needs into `__slots__` records instead
+of ORM instances, walks each portfolio's holdings in fixed-size chunks
+(keyset pagination on the holding id) and writes the changed alert state
+back with one executemany UPDATE per chunk. Nothing is tracked by the
+session, so memory stays flat however many holdings there are.
+"""
+import logging
+import os
+from typing import Iterator, List, Sequence
+
+from sqlalchemy import update
+from sqlmodel import Session, select
+
+from app.models.models import Portfolio, Stock, Symbol, User
+
+logger = logging.getLogger(__name__)
+
+# Holdings loaded, evaluated and written back at a time
+CHUNK_SIZE = int(os.getenv("SWEEP_CHUNK_SIZE", "500"))
+
+
+class SweepPortfolio:
+    """The settings the sweep needs from a portfolio and its owner"""
+
+    __slots__ = ("id", "name", "user_id", "email", "polling_rate", "indicators", "alert_mode")
+
+    def __init__(self, id, name, user_id, email, polling_rate, indicators, alert_mode):
+        self.id = id
+        self.name = name
+        self.user_id = user_id
+        self.email = email
+        self.polling_rate = polling_rate
+        self.indicators = indicators
+        self.alert_mode = alert_mode
+
+
+class Holding:
+    """
+    A holding's alert state plus the shared quote for its symbol
+
+    Has the `id`, `portfolio_id` and `symbol` attributes that event and
+    digest helpers read from a Stock. Set `changed` after modifying the
+    alert state so `write_holdings` saves it.
+    """
+
+    __slots__ = (
+        "id", "portfolio_id", "symbol",
+        "notification_sent", "last_ma_break_date", "days_since_ma_break",
+        "last_price", "last_checked", "volatility",
+        "changed",
+    )
+
+    def __init__(
+        self, id, portfolio_id, symbol,
+        notification_sent, last_ma_break_date, days_since_ma_break,
+        last_price, last_checked, volatility,
+    ):
+        self.id = id
+        self.portfolio_id = portfolio_id
+        self.symbol = symbol
+        self.notification_sent = notification_sent
+        self.last_ma_break_date = last_ma_break_date
+        self.days_since_ma_break = days_since_ma_break
+        self.last_price = last_price
+        self.last_checked = last_checked
+        self.volatility = volatility
+        self.changed = False
+
+
+HOLDING_COLUMNS = (
+    Stock.id, Stock.portfolio_id, Stock.symbol,
+    Stock.notification_sent, Stock.last_ma_break_date, Stock.days_since_ma_break,
+    Symbol.last_price, Symbol.last_checked, Symbol.volatility,
+)
+
+
+def load_portfolios(session: Session, portfolio_ids: Sequence[int]) -> List[SweepPortfolio]:
+    """Claimed portfolios with their owner's email; portfolios without a user are left out"""
+    rows = session.connection().execute(
+        select(
+            Portfolio.id, Portfolio.name, Portfolio.user_id, User.email,
+            Portfolio.polling_rate, Portfolio.indicators, Portfolio.alert_mode,
+        )
+        .join(User, User.id == Portfolio.user_id)
+        .where(Portfolio.id.in_(portfolio_ids))
+        .order_by(Portfolio.id)
+    ).all()
+    if len(rows) < len(portfolio_ids):
+        missing = set(portfolio_ids) - {row[0] for row in rows}
+        logger.warning("User not found for portfolios %s, skipping", sorted(missing))
+    return [SweepPortfolio(*row) for row in rows]
+
+
+def iter_holding_chunks(session: Session, portfolio_id: int, chunk_size: int = CHUNK_SIZE) -> Iterator[List[Holding]]:
+    """Yield a portfolio's holdings, joined with their symbol's quote, `chunk_size` at a time"""
+    after = 0
+    while True:
+        rows = session.connection().execute(
+            select(*HOLDING_COLUMNS)
+            .join(Symbol, Symbol.symbol == Stock.symbol, isouter=True)
+            .where(Stock.portfolio_id == portfolio_id, Stock.id > after)
+            .order_by(Stock.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            return
+        yield [Holding(*row) for row in rows]
+        if len(rows) < chunk_size:
+            return
+        after = rows[-1][0]
+
+
+def write_holdings(session: Session, holdings: Sequence[Holding]) -> int:
+    """
+    Write changed alert state back with one executemany UPDATE; the caller commits
+
+    Returns:
+        int: Number of holdings written
+    """
+    rows = [
+        {
+            "id": holding.id,
+            "notification_sent": holding.notification_sent,
+            "last_ma_break_date": holding.last_ma_break_date,
+            "days_since_ma_break": holding.days_since_ma_break,
+        }
+        for holding in holdings
+        if holding.changed
+    ]
+    if rows:
+        # Bulk UPDATE by primary key
+        session.execute(update(Stock), rows)
+    return len(rows)
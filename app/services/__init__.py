@@ -6,16 +6,29 @@ This package includes:
 - stock_service: Stock data retrieval and processing
 - email_service: Email notification functionality
 - notification_service: NotificationAPI integration for alerts
+- bulk_service: Streaming portfolio import/export
+- symbol_service: Local symbol universe index
+- resilience: Circuit breaker, adaptive timeouts and hedged retries for upstream calls
+- cache: In-process quote cache
+- cache_snapshot: Warm-start snapshot of the caches across restarts
+- indicator_service: SMA/EMA indicators computed from stored daily bars
+- backtest_service: Vectorized historical backtests of the alert rules
+- price_archive: Memory-mapped on-disk archive of daily price history
+- event_service: Append-only change log of stock updates and alerts
+- maintenance_service: Bulk maintenance operations used by the admin CLI
 """
 
 from app.services.auth_service import create_access_token, validate_pin, get_current_user
 from app.services.stock_service import StockService
 from app.services.notification_service import NotificationService
+from app.services.symbol_service import SymbolIndex, symbol_index
 
 __all__ = [
     "create_access_token", 
     "validate_pin", 
     "get_current_user",
     "StockService",
-    "NotificationService"
+    "NotificationService",
+    "SymbolIndex",
+    "symbol_index"
 ]
\ No newline at end of file
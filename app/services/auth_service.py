@@ -1,11 +1,13 @@
 import os
 from datetime import datetime, timedelta
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
 from jose import JWTError, jwt
 from fastapi import Cookie, Depends, HTTPException, status
+from sqlalchemy import and_
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlmodel import Session, select
 
-from app.models.models import User, get_engine
+from app.models.models import Portfolio, User, get_session
 
 # JWT settings (should be in environment variables in production)
 SECRET_KEY = os.getenv("SECRET_KEY", "supersecretkey")
@@ -30,37 +32,86 @@ def validate_pin(pin: str) -> bool:
     
     return letters.isalpha() and digits.isdigit()
 
-def get_session():
-    with Session(get_engine()) as session:
-        yield session
-
-def get_current_user(
-    access_token: Optional[str] = Cookie(None, alias="access_token"),
-    session: Session = Depends(get_session)
-) -> User:
-    """Dependency to get the current authenticated user from JWT token"""
-    credentials_exception = HTTPException(
+def credentials_exception() -> HTTPException:
+    """401 for a missing or invalid token, or one issued to an unknown user"""
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
+
+def get_token_subject(access_token: Optional[str] = Cookie(None, alias="access_token")) -> str:
+    """Dependency to get the PIN the JWT cookie was issued for, without a database lookup"""
     if not access_token:
-        raise credentials_exception
+        raise credentials_exception()
     
     try:
         # Decode the JWT token
         payload = jwt.decode(access_token, SECRET_KEY, algorithms=[ALGORITHM])
-        pin: str = payload.get("sub")
-        if pin is None:
-            raise credentials_exception
-    
     except JWTError:
-        raise credentials_exception
+        raise credentials_exception()
     
-    # Get the user from the database
+    pin: Optional[str] = payload.get("sub")
+    if pin is None:
+        raise credentials_exception()
+    return pin
+
+def get_current_user(
+    pin: str = Depends(get_token_subject),
+    session: Session = Depends(get_session)
+) -> User:
+    """Dependency to get the current authenticated user from JWT token"""
     user = session.exec(select(User).where(User.pin == pin)).first()
     if user is None:
-        raise credentials_exception
+        raise credentials_exception()
+    
+    return user
+
+def load_user_portfolio(
+    session: Session,
+    pin: str,
+    portfolio_id: Optional[int] = None
+) -> Tuple[User, Optional[Portfolio]]:
+    """
+    Load a user and their portfolio (`portfolio_id`, or their first one) in one query
+    
+    The owner is attached to the portfolio, so `portfolio.user` doesn't query again.
+    
+    Raises:
+        HTTPException: 401 when no user has this PIN
+    """
+    owned = Portfolio.user_id == User.id
+    if portfolio_id is not None:
+        owned = and_(owned, Portfolio.id == portfolio_id)
+    row = session.exec(
+        select(User, Portfolio)
+        .join(Portfolio, owned, isouter=True)
+        .where(User.pin == pin)
+        .order_by(Portfolio.id)
+    ).first()
+    if row is None:
+        raise credentials_exception()
+    
+    user, portfolio = row
+    if portfolio is not None:
+        set_committed_value(portfolio, "user", user)
+    return user, portfolio
+
+def get_user_portfolio(
+    portfolio_id: int,
+    pin: str = Depends(get_token_subject),
+    session: Session = Depends(get_session)
+) -> Portfolio:
+    """
+    Dependency to get the current user's portfolio `portfolio_id`
+    
+    Authentication and the ownership check are a single query.
     
-    return user
\ No newline at end of file
+    Raises:
+        HTTPException: 401 for an unknown user, 404 when the portfolio doesn't
+            exist or belongs to someone else
+    """
+    _, portfolio = load_user_portfolio(session, pin, portfolio_id)
+    if portfolio is None:
+        raise HTTPException(status_code=404, detail="Portfolio not found")
+    return portfolio
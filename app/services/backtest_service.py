@@ -0,0 +1,376 @@
+"""
+Historical backtests of the moving-average alert rules.
+
+Stored daily bars (PriceBar) are replayed through the same indicator
+definitions and alert band the sweep uses. Each worker process loads a chunk
+of symbols into a (symbols x days) NumPy matrix and evaluates every day at
+once, so the cost is a handful of array operations per chunk rather than a
+Python loop per symbol-day. Closes are read from the shared price archive
+when one is given, and from the database otherwise.
+
+    python -m app.services.backtest_service --rules sma_200:15 --start 2015-01-01
+"""
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlmodel import Session, select
+
+from app.models.models import PriceBar, get_engine
+from app.services.indicator_service import is_in_alert_band, parse_indicator_name, parse_rules
+from app.services.price_archive import ARCHIVE_PATH, PriceArchive
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HORIZONS = (5, 20, 60)
+# Calendar days loaded before `start` so the longest indicator is warmed up
+WARMUP_DAYS = 450
+CHUNK_SIZE = 250
+
+
+def iter_chunks(items: Sequence[str], size: int) -> List[List[str]]:
+    return [list(items[i:i + size]) for i in range(0, len(items), size)]
+
+
+def load_price_matrix(
+    session: Session,
+    symbols: Sequence[str],
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """
+    Load daily closes into a dense matrix
+
+    Returns:
+        Tuple of (symbols, day ordinals, closes) where closes has one row per
+        symbol and one column per trading day, with NaN where a symbol has no bar
+    """
+    statement = select(PriceBar.symbol, PriceBar.day, PriceBar.close).where(PriceBar.symbol.in_(symbols))
+    if start:
+        statement = statement.where(PriceBar.day >= start)
+    if end:
+        statement = statement.where(PriceBar.day <= end)
+    # Plain Core rows: ORM row processing dominates otherwise
+    rows = session.connection().execute(statement).all()
+
+    symbol_list = sorted(set(symbols))
+    if not rows:
+        return symbol_list, np.empty(0, dtype=np.int64), np.empty((len(symbol_list), 0))
+
+    row_symbols, row_days, row_closes = zip(*rows)
+    ordinals = np.fromiter((day.toordinal() for day in row_days), dtype=np.int64, count=len(rows))
+    days = np.unique(ordinals)
+
+    symbol_positions = {symbol: i for i, symbol in enumerate(symbol_list)}
+    row_index = np.fromiter((symbol_positions[s] for s in row_symbols), dtype=np.int64, count=len(rows))
+    closes = np.full((len(symbol_list), len(days)), np.nan)
+    closes[row_index, np.searchsorted(days, ordinals)] = np.asarray(row_closes, dtype=np.float64)
+    return symbol_list, days, closes
+
+
+def load_price_matrix_from_archive(
+    archive: PriceArchive,
+    symbols: Sequence[str],
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """Same as `load_price_matrix`, reading zero-copy views of the price archive"""
+    symbol_list = sorted(set(symbols))
+    series = [archive.closes(symbol, start, end) for symbol in symbol_list]
+    if not any(len(days) for days, _ in series):
+        return symbol_list, np.empty(0, dtype=np.int64), np.empty((len(symbol_list), 0))
+
+    days = np.unique(np.concatenate([days for days, _ in series]))
+    closes = np.full((len(symbol_list), len(days)), np.nan)
+    for i, (symbol_days, symbol_closes) in enumerate(series):
+        closes[i, np.searchsorted(days, symbol_days)] = symbol_closes
+    return symbol_list, days, closes
+
+
+def forward_fill(matrix: np.ndarray) -> np.ndarray:
+    """Carry the last close forward over missing days (leading gaps stay NaN)"""
+    valid = ~np.isnan(matrix)
+    index = np.where(valid, np.arange(matrix.shape[1]), 0)
+    np.maximum.accumulate(index, axis=1, out=index)
+    filled = matrix[np.arange(matrix.shape[0])[:, None], index]
+    filled[~np.maximum.accumulate(valid, axis=1)] = np.nan
+    return filled
+
+
+def rolling_sma(closes: np.ndarray, window: int) -> np.ndarray:
+    """Simple moving average per row; NaN until `window` closes are available"""
+    valid = ~np.isnan(closes)
+    sums = np.cumsum(np.where(valid, closes, 0.0), axis=1)
+    counts = np.cumsum(valid, axis=1)
+    window_sums = sums.copy()
+    window_counts = counts.copy()
+    window_sums[:, window:] -= sums[:, :-window]
+    window_counts[:, window:] -= counts[:, :-window]
+    return np.where(window_counts == window, window_sums / window, np.nan)
+
+
+def rolling_ema(closes: np.ndarray, window: int) -> np.ndarray:
+    """Exponential moving average per row, seeded with the SMA like `compute_indicators`"""
+    seeds = rolling_sma(closes, window)
+    alpha = 2.0 / (window + 1)
+    result = np.full_like(closes, np.nan)
+    current = np.full(closes.shape[0], np.nan)
+    # The recursion runs over days; each step is vectorized over symbols
+    for t in range(closes.shape[1]):
+        current = np.where(np.isnan(current), seeds[:, t], current + alpha * (closes[:, t] - current))
+        result[:, t] = current
+    return result
+
+
+def indicator_matrix(closes: np.ndarray, name: str) -> np.ndarray:
+    kind, window = parse_indicator_name(name)
+    return rolling_sma(closes, window) if kind == "sma" else rolling_ema(closes, window)
+
+
+def alert_mask(closes: np.ndarray, rules: Sequence[Tuple[str, float]]) -> np.ndarray:
+    """Symbol-days in the alert band of any rule, using the sweep's rule"""
+    mask = np.zeros(closes.shape, dtype=bool)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for name, threshold in rules:
+            values = indicator_matrix(closes, name)
+            distance = np.round((closes - values) / values * 100, 2)
+            mask |= is_in_alert_band(distance, threshold)
+    return mask
+
+
+def signal_mask(in_band: np.ndarray) -> np.ndarray:
+    """Days a symbol enters the alert band, i.e. when the sweep would notify"""
+    signals = in_band.copy()
+    signals[:, 1:] &= ~in_band[:, :-1]
+    return signals
+
+
+def forward_returns(closes: np.ndarray, horizon: int) -> np.ndarray:
+    """Return from each day's close to the close `horizon` trading days later"""
+    returns = np.full_like(closes, np.nan)
+    if horizon < closes.shape[1]:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            returns[:, :-horizon] = closes[:, horizon:] / closes[:, :-horizon] - 1
+    return returns
+
+
+def backtest_chunk(
+    symbols: Sequence[str],
+    start: Optional[date],
+    end: Optional[date],
+    rules: Sequence[Tuple[str, float]],
+    horizons: Sequence[int],
+    archive_path: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Backtest one chunk of symbols (runs inside a worker process)
+
+    Returns:
+        Partial statistics to be combined by `merge_results`
+    """
+    load_start = start - timedelta(days=WARMUP_DAYS) if start else None
+    if archive_path:
+        symbol_list, days, closes = load_price_matrix_from_archive(
+            _open_archive(archive_path), symbols, load_start, end
+        )
+    else:
+        with Session(get_engine()) as session:
+            symbol_list, days, closes = load_price_matrix(session, symbols, load_start, end)
+
+    closes = forward_fill(closes)
+    in_band = alert_mask(closes, rules)
+    signals = signal_mask(in_band)
+
+    # Only days inside the requested range are counted; the warm-up is not
+    evaluated = np.ones(days.shape, dtype=bool) if start is None else days >= start.toordinal()
+    has_data = ~np.isnan(closes) & evaluated
+    in_band &= evaluated
+    signals &= evaluated
+
+    returns = {}
+    for horizon in horizons:
+        values = forward_returns(closes, horizon)[signals]
+        returns[horizon] = values[~np.isnan(values)]
+
+    signal_counts = signals.sum(axis=1)
+    return {
+        "symbols": len(symbol_list),
+        "symbol_days": int(has_data.sum()),
+        "alert_days": int(in_band.sum()),
+        "signals": int(signal_counts.sum()),
+        "signals_by_symbol": {
+            symbol: int(count) for symbol, count in zip(symbol_list, signal_counts) if count
+        },
+        "returns": returns,
+    }
+
+
+# One mapping of the archive per process, shared by all chunks it runs
+_archives: Dict[str, PriceArchive] = {}
+
+
+def _open_archive(path: str) -> PriceArchive:
+    archive = _archives.get(path)
+    if archive is None:
+        archive = _archives[path] = PriceArchive(path)
+    else:
+        archive.refresh()
+    return archive
+
+
+def _backtest_chunk_args(args: Tuple) -> Dict[str, Any]:
+    return backtest_chunk(*args)
+
+
+def _init_worker() -> None:
+    # Connections inherited from the parent process must not be reused
+    get_engine().dispose(close=False)
+
+
+def merge_results(partials: Sequence[Dict[str, Any]], horizons: Sequence[int]) -> Dict[str, Any]:
+    """Combine per-chunk statistics into the final report"""
+    symbol_days = sum(p["symbol_days"] for p in partials)
+    alert_days = sum(p["alert_days"] for p in partials)
+    signals = sum(p["signals"] for p in partials)
+    signals_by_symbol: Dict[str, int] = {}
+    for partial in partials:
+        signals_by_symbol.update(partial["signals_by_symbol"])
+
+    returns = {}
+    for horizon in horizons:
+        values = np.concatenate([p["returns"][horizon] for p in partials]) if partials else np.empty(0)
+        returns[horizon] = {
+            "count": int(values.size),
+            "mean_pct": round(float(values.mean()) * 100, 2) if values.size else None,
+            "median_pct": round(float(np.median(values)) * 100, 2) if values.size else None,
+            "win_rate_pct": round(float((values > 0).mean()) * 100, 1) if values.size else None,
+        }
+
+    # Roughly 252 trading days per year
+    symbol_years = symbol_days / 252
+    return {
+        "symbols": sum(p["symbols"] for p in partials),
+        "symbol_days": symbol_days,
+        "signals": signals,
+        "alert_frequency_pct": round(alert_days / symbol_days * 100, 2) if symbol_days else 0.0,
+        "signals_per_symbol_year": round(signals / symbol_years, 2) if symbol_years else 0.0,
+        "returns": returns,
+        "top_symbols": sorted(signals_by_symbol.items(), key=lambda item: (-item[1], item[0]))[:10],
+    }
+
+
+def list_symbols() -> List[str]:
+    """All symbols with stored daily bars"""
+    with Session(get_engine()) as session:
+        return list(session.exec(select(PriceBar.symbol).distinct().order_by(PriceBar.symbol)).all())
+
+
+def run_backtest(
+    symbols: Optional[Sequence[str]] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    rules: str = "sma_200:15",
+    horizons: Sequence[int] = DEFAULT_HORIZONS,
+    workers: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+    archive_path: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Replay stored daily bars through a set of alert rules
+
+    Args:
+        symbols: Symbols to include (default: every symbol with stored bars)
+        start: First day to evaluate (earlier bars are only used as warm-up)
+        end: Last day to evaluate
+        rules: Alert rules in the portfolio format, e.g. "sma_200:15,ema_50:5"
+        horizons: Hold periods in trading days for signal returns
+        workers: Worker processes (default: CPU count; 1 runs in-process)
+        archive_path: Read closes from this price archive instead of the database
+
+    Returns:
+        Dictionary with signal counts, alert frequency and hold-period returns
+    """
+    parsed_rules = parse_rules(rules)
+    if symbols:
+        symbols = sorted({s.upper() for s in symbols})
+    else:
+        symbols = _open_archive(archive_path).symbols() if archive_path else list_symbols()
+    chunks = iter_chunks(symbols, chunk_size)
+    args = [(chunk, start, end, parsed_rules, tuple(horizons), archive_path) for chunk in chunks]
+    workers = min(workers or os.cpu_count() or 1, max(1, len(chunks)))
+
+    started = time.perf_counter()
+    if workers == 1:
+        partials = [_backtest_chunk_args(arg) for arg in args]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            partials = list(pool.map(_backtest_chunk_args, args))
+
+    result = merge_results(partials, horizons)
+    result["rules"] = rules
+    result["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+    logger.info("Backtested %s symbols in %.2fs", result["symbols"], result["elapsed_seconds"])
+    return result
+
+
+def format_report(result: Dict[str, Any]) -> str:
+    lines = [
+        f"Rules:                   {result['rules']}",
+        f"Symbols:                 {result['symbols']}",
+        f"Symbol-days:             {result['symbol_days']}",
+        f"Signals:                 {result['signals']}",
+        f"Alert frequency:         {result['alert_frequency_pct']}% of symbol-days in band",
+        f"Signals per symbol-year: {result['signals_per_symbol_year']}",
+        "",
+        f"{'hold':>6} {'signals':>8} {'mean %':>8} {'median %':>9} {'win %':>7}",
+    ]
+    for horizon, stats in result["returns"].items():
+        lines.append(
+            f"{str(horizon) + 'd':>6} {stats['count']:>8} {stats['mean_pct'] if stats['count'] else '-':>8} "
+            f"{stats['median_pct'] if stats['count'] else '-':>9} {stats['win_rate_pct'] if stats['count'] else '-':>7}"
+        )
+    if result["top_symbols"]:
+        lines.append("")
+        lines.append("Most signals: " + ", ".join(f"{symbol} ({count})" for symbol, count in result["top_symbols"]))
+    lines.append(f"\nCompleted in {result['elapsed_seconds']}s")
+    return "\n".join(lines)
+
+
+def build_parser(parser: Optional[argparse.ArgumentParser] = None) -> argparse.ArgumentParser:
+    parser = parser or argparse.ArgumentParser(description="Backtest moving-average alert rules on stored daily bars")
+    parser.add_argument("--symbols", default="", help="Comma-separated symbols (default: all with stored bars)")
+    parser.add_argument("--start", type=date.fromisoformat, default=None, help="First day to evaluate (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, default=None, help="Last day to evaluate (YYYY-MM-DD)")
+    parser.add_argument("--rules", default="sma_200:15", help="Alert rules, e.g. sma_200:15,ema_50:5")
+    parser.add_argument("--horizons", default=",".join(map(str, DEFAULT_HORIZONS)),
+                        help="Hold periods in trading days")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--archive", default=ARCHIVE_PATH,
+                        help="Price archive directory (default: PRICE_ARCHIVE_PATH; reads the database if unset)")
+    return parser
+
+
+def run_from_args(args: argparse.Namespace) -> Dict[str, Any]:
+    """Run a backtest from arguments parsed by `build_parser`"""
+    return run_backtest(
+        symbols=[s.strip() for s in args.symbols.split(",") if s.strip()],
+        start=args.start,
+        end=args.end,
+        rules=args.rules,
+        horizons=[int(h) for h in args.horizons.split(",") if h.strip()],
+        workers=args.workers,
+        archive_path=args.archive,
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    print(format_report(run_from_args(build_parser().parse_args(argv))))
+
+
+if __name__ == "__main__":
+    main()
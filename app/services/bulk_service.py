@@ -0,0 +1,247 @@
+"""
+Bulk import/export of portfolio holdings.
+
+Uploads are parsed incrementally and inserted in fixed-size batches within
+one transaction, and exports are produced by generators so memory stays flat regardless of the
+number of holdings.
+"""
+import csv
+import io
+import logging
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+from sqlalchemy import insert
+from sqlmodel import Session, select
+
+from app.models.models import Stock, Symbol, get_engine
+from app.services.symbol_service import symbol_index
+
+# Parquet support is optional
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = 500
+EXPORT_BATCH_SIZE = 500
+MAX_REPORTED_INVALID = 20
+
+EXPORT_COLUMNS = [
+    "symbol",
+    "last_price",
+    "ma_200",
+    "distance_to_ma",
+    "last_checked",
+    "days_since_ma_break",
+]
+
+
+def iter_batches(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Group an iterable into lists of at most `size` items"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_symbols_from_csv(fileobj) -> Iterator[str]:
+    """
+    Yield symbols from a CSV upload one row at a time
+
+    The file may have a header row with a `symbol` column; otherwise the
+    first column of every row is used.
+    """
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    try:
+        reader = csv.reader(text)
+        column = 0
+        first_row = True
+        for row in reader:
+            if not row:
+                continue
+            if first_row:
+                first_row = False
+                header = [cell.strip().lower() for cell in row]
+                if "symbol" in header:
+                    column = header.index("symbol")
+                    continue
+            if column < len(row):
+                yield row[column]
+    finally:
+        # Don't close the underlying upload file along with the wrapper
+        text.detach()
+
+
+def iter_symbols_from_parquet(fileobj) -> Iterator[str]:
+    """Yield symbols from a Parquet upload one record batch at a time"""
+    if not PARQUET_AVAILABLE:
+        raise ValueError("Parquet support requires pyarrow to be installed")
+
+    parquet_file = pq.ParquetFile(fileobj)
+    for record_batch in parquet_file.iter_batches(batch_size=IMPORT_BATCH_SIZE, columns=["symbol"]):
+        for symbol in record_batch.column(0).to_pylist():
+            if symbol is not None:
+                yield symbol
+
+
+def import_symbols(session: Session, portfolio_id: int, symbols: Iterable[str]) -> Dict[str, Any]:
+    """
+    Validate and bulk insert symbols into a portfolio
+
+    Symbols are validated against the local symbol index; no upstream API
+    calls are made. New holdings are inserted without market data and are
+    picked up by the next scheduled check.
+
+    Batches are inserted as the file is read but committed together at the
+    end, so an error partway through (a malformed row, a dropped upload)
+    leaves the portfolio untouched once the caller rolls back.
+
+    Args:
+        session: Database session
+        portfolio_id: Portfolio to import into
+        symbols: Iterable of raw symbols, consumed lazily
+
+    Returns:
+        Dictionary with imported/skipped counts and a sample of invalid symbols
+    """
+    existing: Set[str] = set(
+        session.exec(select(Stock.symbol).where(Stock.portfolio_id == portfolio_id)).all()
+    )
+
+    imported = 0
+    skipped = 0
+    invalid: List[str] = []
+    invalid_count = 0
+
+    for batch in iter_batches(symbols, IMPORT_BATCH_SIZE):
+        rows = []
+        for raw_symbol in batch:
+            symbol = raw_symbol.strip().upper()
+            if not symbol:
+                continue
+            if not symbol_index.is_valid(symbol):
+                invalid_count += 1
+                if len(invalid) < MAX_REPORTED_INVALID:
+                    invalid.append(symbol)
+                continue
+            if symbol in existing:
+                skipped += 1
+                continue
+            existing.add(symbol)
+            rows.append({"symbol": symbol, "portfolio_id": portfolio_id, "notification_sent": False})
+
+        if rows:
+            session.execute(insert(Stock), rows)
+            imported += len(rows)
+
+    session.commit()
+
+    logger.info(
+        "Imported %s stocks into portfolio %s (%s already present, %s invalid)",
+        imported, portfolio_id, skipped, invalid_count,
+    )
+
+    return {
+        "imported": imported,
+        "skipped": skipped,
+        "invalid_count": invalid_count,
+        "invalid": invalid,
+    }
+
+
+def _iter_export_partitions(portfolio_id: int) -> Iterator[List[Any]]:
+    """Yield holdings of a portfolio in partitions of EXPORT_BATCH_SIZE rows"""
+    # Market data comes from the shared Symbol row, alert state from the holding
+    columns = [getattr(Stock if hasattr(Stock, name) else Symbol, name) for name in EXPORT_COLUMNS]
+    with Session(get_engine()) as session:
+        result = session.execute(
+            select(*columns)
+            .join(Symbol, Symbol.symbol == Stock.symbol, isouter=True)
+            .where(Stock.portfolio_id == portfolio_id)
+            .order_by(Stock.id)
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        for partition in result.partitions():
+            yield partition
+
+
+def iter_portfolio_csv(portfolio_id: int) -> Iterator[str]:
+    """Stream the holdings of a portfolio as CSV text chunks"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+
+    for partition in _iter_export_partitions(portfolio_id):
+        for row in partition:
+            writer.writerow(
+                [value.isoformat() if hasattr(value, "isoformat") else value for value in row]
+            )
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that collects bytes until they are drained"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_portfolio_parquet(portfolio_id: int) -> Iterator[bytes]:
+    """Stream the holdings of a portfolio as Parquet, one row group per partition"""
+    if not PARQUET_AVAILABLE:
+        raise ValueError("Parquet support requires pyarrow to be installed")
+
+    schema = pa.schema([
+        ("symbol", pa.string()),
+        ("last_price", pa.float64()),
+        ("ma_200", pa.float64()),
+        ("distance_to_ma", pa.float64()),
+        ("last_checked", pa.timestamp("us")),
+        ("days_since_ma_break", pa.int64()),
+    ])
+
+    sink = _ChunkSink()
+    writer: Optional[pq.ParquetWriter] = None
+    try:
+        writer = pq.ParquetWriter(sink, schema)
+        for partition in _iter_export_partitions(portfolio_id):
+            columns = list(zip(*partition))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                schema=schema,
+            ))
+            yield sink.drain()
+    finally:
+        if writer is not None:
+            writer.close()
+    yield sink.drain()
@@ -0,0 +1,352 @@
+"""
+Cache for market data lookups.
+
+Entries are fresh for `ttl` seconds, after which they are only handed out
+as stale fallbacks (for example while the upstream circuit is open) until
+`max_stale` seconds have passed. With a market calendar, entries stored
+after a session closed stay fresh until the next session opens.
+
+`QuoteCache` keeps entries in process memory. When QUOTE_CACHE_PATH is
+set, `SqliteQuoteCache` keeps them in a local SQLite file instead, so every
+worker process on the host shares one cache. `get_or_compute` makes sure
+only one caller (across processes, for the SQLite backend) fetches a
+missing key while the others wait for its result.
+
+Values are stored as JSON (with dates and datetimes tagged), the same
+encoding the warm-start snapshot uses, so reading the cache file can't run
+code.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.services.market_calendar import USE_MARKET_CALENDAR, MarketCalendar, market_calendar
+
+logger = logging.getLogger(__name__)
+
+# Empty keeps the cache in process memory
+CACHE_PATH = os.getenv("QUOTE_CACHE_PATH", "")
+# Seconds a fetch's claim on a key lasts unless renewed; the fetching process
+# renews it while the fetch runs, so this only bounds recovery from a crash
+CACHE_LOCK_TIMEOUT = float(os.getenv("QUOTE_CACHE_LOCK_TIMEOUT", "30"))
+
+
+def encode_json(value: Any) -> Any:
+    """`json.dumps` default for the date types cached values carry"""
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, date):
+        return {"__date__": value.isoformat()}
+    raise TypeError(f"Cannot encode {type(value).__name__}")
+
+
+def decode_json(obj: Dict[str, Any]) -> Any:
+    """`json.loads` object hook reversing `encode_json`"""
+    if "__datetime__" in obj:
+        return datetime.fromisoformat(obj["__datetime__"])
+    if "__date__" in obj:
+        return date.fromisoformat(obj["__date__"])
+    return obj
+
+
+class QuoteCache:
+    """Bounded LRU cache with separate fresh and stale lifetimes"""
+
+    # Whether entries outlive the process (no need to snapshot them)
+    persistent = False
+    # Whether lookups do I/O that may block, and so run in a worker thread
+    blocking = False
+
+    def __init__(
+        self,
+        ttl: float = 900.0,
+        max_stale: float = 86400.0,
+        max_entries: int = 50000,
+        calendar: Optional[MarketCalendar] = None,
+    ):
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.max_entries = max_entries
+        self.calendar = calendar
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Fetches in progress in this process, awaited by concurrent callers
+        self._inflight: Dict[str, "asyncio.Future[Any]"] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def is_settled(self, stored_at: float) -> bool:
+        """Whether the market has stayed closed since the entry was stored"""
+        return self.calendar is not None and self.calendar.is_settled(datetime.fromtimestamp(stored_at))
+
+    def is_expired(self, stored_at: float, now: Optional[float] = None) -> bool:
+        """Whether an entry is too old to hand out at all"""
+        return (now or time.time()) - stored_at > self.max_stale and not self.is_settled(stored_at)
+
+    def _lookup(self, key: str, max_age: float) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            age = time.time() - stored_at
+            # Values fetched after a close stay good until the next session opens
+            if age > min(max_age, self.max_stale) and not self.is_settled(stored_at):
+                if age > self.max_stale:
+                    del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return a fresh value or None"""
+        return self._lookup(key, self.ttl)
+
+    def get_stale(self, key: str) -> Optional[Any]:
+        """Return a value regardless of freshness, as long as it isn't expired"""
+        return self._lookup(key, self.max_stale)
+
+    def set(self, key: str, value: Any, stored_at: Optional[float] = None) -> None:
+        with self._lock:
+            self._entries[key] = (stored_at if stored_at is not None else time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def items(self) -> Dict[str, Tuple[float, Any]]:
+        """Snapshot of all entries as {key: (stored_at, value)}"""
+        with self._lock:
+            return dict(self._entries)
+
+    def _try_lock(self, key: str) -> bool:
+        """Claim the right to fetch `key`; in-process callers are already coalesced"""
+        return True
+
+    def _unlock(self, key: str) -> None:
+        pass
+
+    async def _keep_lock(self, key: str) -> None:
+        """Hold the claim on `key` while its fetch runs"""
+
+    async def offload(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Call one of the cache's methods without blocking the event loop"""
+        if self.blocking:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        cacheable: Optional[Callable[[Any], bool]] = None,
+    ) -> Tuple[Any, bool]:
+        """
+        Return the fresh value for `key`, computing it at most once at a time
+
+        Concurrent callers for the same key wait for the one fetch in
+        progress instead of starting their own.
+
+        Args:
+            key: Cache key
+            compute: Coroutine function producing the value on a miss
+            cacheable: Predicate deciding whether a computed value is stored
+
+        Returns:
+            Tuple of the value and whether this call computed it
+        """
+        value = await self.offload(self.get, key)
+        if value is not None:
+            return value, False
+
+        loop = asyncio.get_running_loop()
+        pending = self._inflight.get(key)
+        if pending is not None and pending.get_loop() is loop:
+            return await asyncio.shield(pending), False
+
+        future = loop.create_future()
+        # Nobody may be waiting to retrieve a failure
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+        try:
+            result = await self._compute_locked(key, compute, cacheable)
+            future.set_result(result[0])
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    async def _compute_locked(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        cacheable: Optional[Callable[[Any], bool]],
+    ) -> Tuple[Any, bool]:
+        # Another process may be fetching the same key; wait for its result
+        while not await self.offload(self._try_lock, key):
+            await asyncio.sleep(0.05)
+            value = await self.offload(self.get, key)
+            if value is not None:
+                return value, False
+        keeper = asyncio.create_task(self._keep_lock(key))
+        try:
+            value = await self.offload(self.get, key)
+            if value is not None:
+                return value, False
+            value = await compute()
+            if cacheable is None or cacheable(value):
+                await self.offload(self.set, key, value)
+            return value, True
+        finally:
+            keeper.cancel()
+            await self.offload(self._unlock, key)
+
+
+class SqliteQuoteCache(QuoteCache):
+    """
+    Quote cache stored in a SQLite file shared by every process on the host
+
+    Keys being fetched are claimed in a lock table. The fetching process
+    renews its claim every third of `lock_timeout` for as long as the fetch
+    runs; a claim left behind by a crashed process expires after
+    `lock_timeout` seconds.
+    """
+
+    persistent = True
+    blocking = True
+
+    def __init__(self, path: str, lock_timeout: float = CACHE_LOCK_TIMEOUT, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.path = path
+        self.lock_timeout = lock_timeout
+        self._owner = uuid.uuid4().hex
+        self._writes = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS quote_cache (key TEXT PRIMARY KEY, stored_at REAL NOT NULL, value BLOB NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS quote_cache_lock (key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM quote_cache").fetchone()[0]
+
+    def _lookup(self, key: str, max_age: float) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute("SELECT stored_at, value FROM quote_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            stored_at, blob = row
+            age = time.time() - stored_at
+            if age > min(max_age, self.max_stale) and not self.is_settled(stored_at):
+                if age > self.max_stale:
+                    self._conn.execute("DELETE FROM quote_cache WHERE key = ? AND stored_at = ?", (key, stored_at))
+                return None
+        try:
+            return json.loads(blob, object_hook=decode_json)
+        except ValueError:
+            # Written by an older version in another format; refetch it
+            return None
+
+    def set(self, key: str, value: Any, stored_at: Optional[float] = None) -> None:
+        blob = json.dumps(value, default=encode_json, separators=(",", ":"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO quote_cache (key, stored_at, value) VALUES (?, ?, ?)",
+                (key, stored_at if stored_at is not None else time.time(), blob),
+            )
+            self._writes += 1
+            # Evict the oldest entries now and then rather than on every write
+            if self._writes % 100 == 0:
+                self._conn.execute(
+                    "DELETE FROM quote_cache WHERE key IN "
+                    "(SELECT key FROM quote_cache ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM quote_cache")
+
+    def items(self) -> Dict[str, Tuple[float, Any]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT key, stored_at, value FROM quote_cache").fetchall()
+        entries = {}
+        for key, stored_at, blob in rows:
+            try:
+                entries[key] = (stored_at, json.loads(blob, object_hook=decode_json))
+            except ValueError:
+                continue
+        return entries
+
+    def _try_lock(self, key: str) -> bool:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM quote_cache_lock WHERE key = ? AND expires_at < ?", (key, now))
+                claimed = self._conn.execute(
+                    "INSERT OR IGNORE INTO quote_cache_lock (key, owner, expires_at) VALUES (?, ?, ?)",
+                    (key, self._owner, now + self.lock_timeout),
+                ).rowcount
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return claimed == 1
+
+    def _unlock(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM quote_cache_lock WHERE key = ? AND owner = ?", (key, self._owner))
+
+    def _renew_lock(self, key: str) -> bool:
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE quote_cache_lock SET expires_at = ? WHERE key = ? AND owner = ?",
+                (time.time() + self.lock_timeout, key, self._owner),
+            ).rowcount == 1
+
+    async def _keep_lock(self, key: str) -> None:
+        while True:
+            await asyncio.sleep(self.lock_timeout / 3)
+            if not await self.offload(self._renew_lock, key):
+                logger.warning("Lost the fetch claim on %s; another process may fetch it too", key)
+                return
+
+
+def build_quote_cache() -> QuoteCache:
+    """The process-wide cache, shared between workers when QUOTE_CACHE_PATH is set"""
+    options = dict(
+        ttl=float(os.getenv("QUOTE_CACHE_TTL", "900")),
+        max_stale=float(os.getenv("QUOTE_CACHE_MAX_STALE", "86400")),
+        max_entries=int(os.getenv("QUOTE_CACHE_MAX_ENTRIES", "50000")),
+        calendar=market_calendar if USE_MARKET_CALENDAR else None,
+    )
+    if CACHE_PATH:
+        logger.info("Using shared quote cache at %s", CACHE_PATH)
+        return SqliteQuoteCache(CACHE_PATH, **options)
+    return QuoteCache(**options)
+
+
+# Shared by every StockService instance in this process
+quote_cache = build_quote_cache()
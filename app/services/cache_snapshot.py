@@ -0,0 +1,114 @@
+"""
+Warm-start snapshot of the in-process caches.
+
+The quote/indicator cache and the symbol universe are written to a local
+file at shutdown (and periodically), and restored at startup so a restart
+doesn't send the first sweep and page loads to the upstream API cold.
+
+File format: an 8-byte magic, a little-endian uint16 version, then a
+zlib-compressed JSON document. Cache entries keep their original storage
+time, so restored quotes go stale exactly when they would have without the
+restart, and expired entries are dropped.
+"""
+import json
+import logging
+import os
+import struct
+import time
+import zlib
+from typing import Dict, Optional
+
+from app.services.cache import QuoteCache, decode_json, encode_json, quote_cache
+from app.services.symbol_service import SymbolIndex, symbol_index
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_PATH = os.getenv("CACHE_SNAPSHOT_PATH", "./data/cache_snapshot.bin")
+# Minutes between periodic snapshots; 0 only snapshots at shutdown
+SNAPSHOT_INTERVAL = int(os.getenv("CACHE_SNAPSHOT_INTERVAL", "15"))
+
+MAGIC = b"MA200SNP"
+VERSION = 1
+_HEADER = struct.Struct("<8sH")
+
+
+def save_snapshot(
+    path: str = SNAPSHOT_PATH,
+    cache: QuoteCache = quote_cache,
+    index: Optional[SymbolIndex] = symbol_index,
+) -> int:
+    """
+    Write the caches to `path` atomically
+
+    Returns:
+        int: Size of the snapshot in bytes
+    """
+    payload = {
+        "created_at": time.time(),
+        # A shared cache file already survives restarts
+        "quotes": [] if cache.persistent else [
+            [key, stored_at, value] for key, (stored_at, value) in cache.items().items()
+        ],
+        "symbols": index.snapshot() if index is not None and index.is_loaded else {},
+    }
+    data = _HEADER.pack(MAGIC, VERSION) + zlib.compress(
+        json.dumps(payload, default=encode_json, separators=(",", ":")).encode("utf-8")
+    )
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+    logger.info("Saved cache snapshot with %s quotes (%s bytes)", len(payload["quotes"]), len(data))
+    return len(data)
+
+
+def load_snapshot(
+    path: str = SNAPSHOT_PATH,
+    cache: QuoteCache = quote_cache,
+    index: Optional[SymbolIndex] = symbol_index,
+) -> Dict[str, int]:
+    """
+    Restore the caches from a snapshot, skipping expired entries
+
+    The symbol universe is only restored when no listing file could be
+    loaded, since the listing is the source of truth.
+
+    Returns:
+        Dictionary with counts of restored and expired quotes and restored symbols
+    """
+    counts = {"quotes": 0, "expired": 0, "symbols": 0}
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return counts
+
+    try:
+        magic, version = _HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"unsupported snapshot header {magic!r} v{version}")
+        payload = json.loads(zlib.decompress(data[_HEADER.size:]), object_hook=decode_json)
+    except (ValueError, struct.error, zlib.error) as e:
+        logger.warning("Ignoring unreadable cache snapshot %s: %s", path, e)
+        return counts
+
+    now = time.time()
+    for key, stored_at, value in payload.get("quotes", []):
+        if cache.is_expired(stored_at, now):
+            counts["expired"] += 1
+            continue
+        cache.set(key, value, stored_at=stored_at)
+        counts["quotes"] += 1
+
+    symbols = payload.get("symbols")
+    if index is not None and symbols and not index.is_loaded:
+        counts["symbols"] = index.restore(symbols)
+
+    logger.info(
+        "Restored cache snapshot: %s quotes, %s expired, %s symbols",
+        counts["quotes"], counts["expired"], counts["symbols"],
+    )
+    return counts
@@ -0,0 +1,188 @@
+"""
+Downsampled price and moving-average series for charts.
+
+Closes come from the price archive when one is configured and holds the
+symbol, otherwise from the stored daily bars. Moving averages are computed
+over the full history (so they are settled at the start of the range),
+then the range is reduced to the requested number of points with
+largest-triangle-three-buckets on the closes; the averages are sampled at
+the same days so every column lines up. Results are cached per symbol,
+range, resolution and indicator set in a small cache of their own, so
+chart traffic can't evict quotes and isn't written to the warm-start
+snapshot.
+"""
+import asyncio
+import logging
+import os
+import threading
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from sqlmodel import Session
+
+from app.models.models import get_engine
+from app.services.backtest_service import indicator_matrix, load_price_matrix, load_price_matrix_from_archive
+from app.services.cache import QuoteCache
+from app.services.indicator_service import parse_indicator_name
+from app.services.price_archive import ARCHIVE_PATH, PriceArchive
+
+logger = logging.getLogger(__name__)
+
+# Calendar days per range; None is the full history
+RANGES: Dict[str, Optional[int]] = {
+    "1m": 31,
+    "3m": 92,
+    "6m": 183,
+    "1y": 366,
+    "2y": 731,
+    "5y": 1827,
+    "10y": 3653,
+    "max": None,
+}
+DEFAULT_POINTS = 500
+MIN_POINTS = 10
+MAX_POINTS = 5000
+
+# Series are derived from stored bars, which change at most once per sweep
+chart_cache = QuoteCache(
+    ttl=float(os.getenv("CHART_CACHE_TTL", "900")),
+    max_stale=float(os.getenv("CHART_CACHE_TTL", "900")),
+    max_entries=int(os.getenv("CHART_CACHE_MAX_ENTRIES", "1000")),
+)
+
+_EPOCH = date(1970, 1, 1).toordinal()
+_archive: Optional[PriceArchive] = None
+# Series are built in worker threads; refreshing the archive view isn't thread-safe
+_archive_lock = threading.Lock()
+
+
+def lttb(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """
+    Largest-triangle-three-buckets downsampling
+
+    Keeps the first and last points and, from each of `points - 2` equal
+    buckets in between, the point forming the largest triangle with the
+    point kept from the previous bucket and the mean of the next bucket.
+
+    Returns:
+        Indices of the kept points, in order
+    """
+    n = len(x)
+    if points >= n or points < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    kept = np.empty(points, dtype=np.int64)
+    kept[0] = 0
+    kept[-1] = n - 1
+    previous = 0
+    for bucket in range(points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_start, next_end = end, edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x = x[next_start:next_end].mean()
+        next_y = y[next_start:next_end].mean()
+        # Twice the triangle area; the constant factor doesn't change the argmax
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        kept[bucket + 1] = previous
+    return kept
+
+
+def _load_closes(symbol: str):
+    global _archive
+    if ARCHIVE_PATH:
+        with _archive_lock:
+            if _archive is None:
+                _archive = PriceArchive(ARCHIVE_PATH)
+            else:
+                _archive.refresh()
+            if symbol in _archive:
+                _, days, closes = load_price_matrix_from_archive(_archive, [symbol])
+                return days, closes
+    with Session(get_engine()) as session:
+        _, days, closes = load_price_matrix(session, [symbol])
+    return days, closes
+
+
+def _column(values: np.ndarray) -> List[Optional[float]]:
+    return [None if np.isnan(value) else round(float(value), 4) for value in values]
+
+
+def build_series(
+    symbol: str,
+    range_: str = "1y",
+    points: int = DEFAULT_POINTS,
+    indicators: Sequence[str] = ("sma_200",),
+    today: Optional[date] = None,
+) -> Dict[str, Any]:
+    """
+    Price and indicator series for a symbol, downsampled to at most `points`
+
+    Args:
+        symbol: Stock symbol
+        range_: One of RANGES
+        points: Maximum points to return (clamped to MIN_POINTS..MAX_POINTS)
+        indicators: Indicator names such as "sma_200" or "ema_50"
+
+    Returns:
+        Columnar dictionary: `t` (Unix seconds of each day), `close` and one
+        list per indicator (None where it has no value yet), plus the number
+        of bars the range held before downsampling
+    """
+    if range_ not in RANGES:
+        raise ValueError(f"Unknown range '{range_}'")
+    for name in indicators:
+        parse_indicator_name(name)
+    symbol = symbol.upper()
+    points = max(MIN_POINTS, min(points, MAX_POINTS))
+
+    days, closes = _load_closes(symbol)
+    closes = closes.reshape(1, -1)
+    series = {name: indicator_matrix(closes, name)[0] for name in indicators}
+    closes = closes[0]
+
+    start = 0
+    if RANGES[range_] is not None:
+        first_day = (today or date.today()) - timedelta(days=RANGES[range_])
+        start = int(np.searchsorted(days, first_day.toordinal()))
+    days, closes = days[start:], closes[start:]
+    series = {name: values[start:] for name, values in series.items()}
+
+    kept = lttb(days.astype(np.float64), closes, points)
+    result: Dict[str, Any] = {
+        "symbol": symbol,
+        "range": range_,
+        "bars": len(days),
+        "points": len(kept),
+        "t": ((days[kept] - _EPOCH) * 86400).tolist(),
+        "close": _column(closes[kept]),
+    }
+    for name, values in series.items():
+        result[name] = _column(values[kept])
+    return result
+
+
+async def get_series(
+    symbol: str,
+    range_: str = "1y",
+    points: int = DEFAULT_POINTS,
+    indicators: Sequence[str] = ("sma_200",),
+) -> Dict[str, Any]:
+    """`build_series` through `chart_cache`, keyed by symbol, range, resolution and indicators"""
+    if range_ not in RANGES:
+        raise ValueError(f"Unknown range '{range_}'")
+    for name in indicators:
+        parse_indicator_name(name)
+    points = max(MIN_POINTS, min(points, MAX_POINTS))
+    key = f"chart:{symbol.upper()}:{range_}:{points}:{','.join(indicators)}"
+
+    async def compute() -> Dict[str, Any]:
+        # Database reads and numpy work; keep them off the event loop
+        return await asyncio.to_thread(build_series, symbol, range_, points, indicators)
+
+    series, _ = await chart_cache.get_or_compute(key, compute, cacheable=lambda data: data["bars"] > 0)
+    return series
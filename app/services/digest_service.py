@@ -0,0 +1,162 @@
+"""
+Digest delivery for portfolios that batch their alerts.
+
+Portfolios in "sweep" or "daily" alert mode don't send a notification
+per crossing. The sweep writes each alert to the PendingAlert outbox in
+the same transaction as the Stock update, and a digest run later sends
+one message per user covering everything queued for them. Users are
+notified concurrently, so a market-wide drop costs one NotificationAPI
+call per user instead of one per stock.
+"""
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import delete, or_, update
+from sqlmodel import Session, select
+
+from app.models.models import PendingAlert, Stock, User, get_engine
+from app.services.event_service import ALERT_FAILED, ALERT_SENT, EventBuffer
+from app.utils.metrics import DIGEST_ALERTS, DIGEST_USERS
+
+logger = logging.getLogger(__name__)
+
+IMMEDIATE = "immediate"
+SWEEP_DIGEST = "sweep"
+DAILY_DIGEST = "daily"
+ALERT_MODES = (IMMEDIATE, SWEEP_DIGEST, DAILY_DIGEST)
+DIGEST_MODES = (SWEEP_DIGEST, DAILY_DIGEST)
+
+# Local hour the daily digest goes out
+DIGEST_HOUR = int(os.getenv("DIGEST_HOUR", "18"))
+# Digests sent at once
+DIGEST_CONCURRENCY = int(os.getenv("DIGEST_CONCURRENCY", "8"))
+# How long a claimed alert is kept from other workers if its sender dies
+CLAIM_LEASE = timedelta(minutes=10)
+
+
+def queue_alert(session: Session, stock: Stock, user_id: int, mode: str, alert: Dict[str, Any]) -> None:
+    """Add an alert to the user's next digest; the caller commits"""
+    session.add(PendingAlert(
+        user_id=user_id,
+        portfolio_id=stock.portfolio_id,
+        stock_id=stock.id,
+        symbol=stock.symbol,
+        mode=mode,
+        payload=json.dumps(alert, default=str),
+    ))
+
+
+def claim_alerts(session: Session, mode: str, user_ids: Optional[Sequence[int]] = None) -> List[Dict[str, Any]]:
+    """
+    Claim queued alerts so concurrent digest runs don't send them twice
+
+    Returns:
+        List of dictionaries with the alert row fields, its decoded payload and the user's email
+    """
+    now = datetime.now()
+    due = (
+        select(PendingAlert.id)
+        .where(
+            PendingAlert.mode == mode,
+            or_(PendingAlert.claimed_at.is_(None), PendingAlert.claimed_at < now - CLAIM_LEASE),
+        )
+        .with_for_update(skip_locked=True)
+    )
+    if user_ids is not None:
+        due = due.where(PendingAlert.user_id.in_(user_ids))
+    claimed = session.execute(
+        update(PendingAlert)
+        .where(PendingAlert.id.in_(due.scalar_subquery()))
+        .values(claimed_at=now)
+        .returning(PendingAlert.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    session.commit()
+    if not claimed:
+        return []
+
+    rows = session.exec(
+        select(PendingAlert, User.email)
+        .join(User, User.id == PendingAlert.user_id)
+        .where(PendingAlert.id.in_(claimed))
+        .order_by(PendingAlert.user_id, PendingAlert.id)
+    ).all()
+    return [
+        {
+            "id": alert.id,
+            "portfolio_id": alert.portfolio_id,
+            "stock_id": alert.stock_id,
+            "symbol": alert.symbol,
+            "alert": json.loads(alert.payload),
+            "email": email,
+        }
+        for alert, email in rows
+    ]
+
+
+async def deliver_digests(notification_service, mode: str, user_ids: Optional[Sequence[int]] = None) -> Dict[str, int]:
+    """
+    Send one digest per user for the alerts queued in `mode`
+
+    Alerts of users whose digest failed stay queued for the next run.
+
+    Args:
+        notification_service: NotificationService used to send
+        mode: SWEEP_DIGEST or DAILY_DIGEST
+        user_ids: Only deliver to these users
+
+    Returns:
+        Dictionary with counts of users sent and failed and alerts delivered
+    """
+    with Session(get_engine()) as session:
+        claimed = claim_alerts(session, mode, user_ids)
+
+    by_user: Dict[str, List[Dict[str, Any]]] = {}
+    for row in claimed:
+        by_user.setdefault(row["email"], []).append(row)
+
+    semaphore = asyncio.Semaphore(DIGEST_CONCURRENCY)
+
+    async def send(email: str, rows: List[Dict[str, Any]]) -> bool:
+        async with semaphore:
+            return await notification_service.send_digest(email, [row["alert"] for row in rows])
+
+    results = await asyncio.gather(*(send(email, rows) for email, rows in by_user.items()))
+
+    counts = {"users": 0, "failed": 0, "alerts": 0}
+    sent_ids, failed_ids = [], []
+    events = EventBuffer()
+    for rows, success in zip(by_user.values(), results):
+        counts["users" if success else "failed"] += 1
+        for row in rows:
+            (sent_ids if success else failed_ids).append(row["id"])
+            events.add_for(
+                ALERT_SENT if success else ALERT_FAILED,
+                row["portfolio_id"], row["stock_id"], row["symbol"],
+                indicator=row["alert"].get("indicator"), distance=row["alert"].get("distance_to_ma"), digest=mode,
+            )
+    counts["alerts"] = len(sent_ids)
+
+    if claimed:
+        with Session(get_engine()) as session:
+            if sent_ids:
+                session.execute(delete(PendingAlert).where(PendingAlert.id.in_(sent_ids)))
+            if failed_ids:
+                session.execute(
+                    update(PendingAlert).where(PendingAlert.id.in_(failed_ids)).values(claimed_at=None)
+                )
+            events.flush(session)
+            session.commit()
+
+    DIGEST_USERS.observe(counts["users"], mode=mode)
+    DIGEST_ALERTS.inc(counts["alerts"], mode=mode)
+    if by_user:
+        logger.info(
+            "Sent %s digests with %s alerts (%s failed)", counts["users"], counts["alerts"], counts["failed"],
+            extra={"mode": mode},
+        )
+    return counts
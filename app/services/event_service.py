@@ -0,0 +1,131 @@
+"""
+Change-data-capture log of stock updates and alerts.
+
+The scheduler records what happened to each holding (price observed, MA
+state changed, alert queued for a digest, sent or failed) in the append-only StockEvent table.
+Events are buffered during a sweep and inserted in one batch per
+portfolio, in the same transaction as the Stock updates they describe.
+Consumers tail the log by remembering the last event id they have seen.
+
+That cursor is only safe if ids become visible in order. SQLite has a
+single writer, so they do. On PostgreSQL, sequence values are handed out at
+insert time, so two sweep workers could commit ids 101 and 102 in the
+opposite order and a tailer past 102 would never see 101. `flush` therefore
+takes a transaction-scoped advisory lock before inserting, which serializes
+event inserts from insert to commit across workers. Callers commit right
+after flushing, so the lock is held only briefly.
+"""
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import func, insert
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.models.models import Stock, StockEvent, is_postgres
+
+logger = logging.getLogger(__name__)
+
+PRICE_OBSERVED = "price_observed"
+MA_STATE_CHANGED = "ma_state_changed"
+ALERT_SENT = "alert_sent"
+ALERT_FAILED = "alert_failed"
+# Held for a digest; followed by alert_sent or alert_failed when the digest goes out
+ALERT_QUEUED = "alert_queued"
+EVENT_KINDS = (PRICE_OBSERVED, MA_STATE_CHANGED, ALERT_SENT, ALERT_FAILED, ALERT_QUEUED)
+
+# `state` of a ma_state_changed event, for both the sweep and manual checks
+IN_BAND = "in_band"
+OUT_OF_BAND = "out_of_band"
+
+MAX_PAGE_SIZE = 1000
+
+# pg_advisory_xact_lock key guarding StockEvent inserts (arbitrary, app-wide)
+EVENT_LOCK_KEY = 0x3A200E7E
+
+
+class EventBuffer:
+    """Collects events and writes them with a single multi-row insert"""
+
+    def __init__(self):
+        self._rows: List[Dict[str, Any]] = []
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, kind: str, stock: Stock, **payload: Any) -> None:
+        self.add_for(kind, stock.portfolio_id, stock.id, stock.symbol, **payload)
+
+    def add_for(self, kind: str, portfolio_id: int, stock_id: Optional[int], symbol: str, **payload: Any) -> None:
+        """Add an event for a holding that isn't loaded as a Stock"""
+        self._rows.append({
+            "created_at": datetime.now(),
+            "kind": kind,
+            "portfolio_id": portfolio_id,
+            "stock_id": stock_id,
+            "symbol": symbol,
+            "payload": json.dumps(payload, default=str),
+        })
+
+    def flush(self, session: Session) -> int:
+        """
+        Insert buffered events into the session's transaction
+
+        The caller commits, so events land atomically with the changes they
+        describe. Commit promptly: on PostgreSQL other writers wait for the
+        event lock until this transaction ends.
+
+        Returns:
+            int: Number of events written
+        """
+        if not self._rows:
+            return 0
+        if is_postgres(session.get_bind()):
+            # Ids must become visible in commit order for the id cursor to be safe
+            session.execute(select(func.pg_advisory_xact_lock(EVENT_LOCK_KEY)))
+        session.execute(insert(StockEvent), self._rows)
+        count = len(self._rows)
+        self._rows = []
+        return count
+
+
+async def read_events(
+    session: AsyncSession,
+    after: int = 0,
+    limit: int = 100,
+    portfolio_ids: Optional[Sequence[int]] = None,
+    kinds: Optional[Sequence[str]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Read events after a cursor, oldest first
+
+    Args:
+        after: Return events with an id greater than this cursor
+        limit: Maximum events to return (capped at MAX_PAGE_SIZE)
+        portfolio_ids: Only events for these portfolios
+        kinds: Only these event kinds
+
+    Returns:
+        List of event dictionaries with decoded payloads
+    """
+    statement = select(StockEvent).where(StockEvent.id > after)
+    if portfolio_ids is not None:
+        statement = statement.where(StockEvent.portfolio_id.in_(portfolio_ids))
+    if kinds:
+        statement = statement.where(StockEvent.kind.in_(kinds))
+    statement = statement.order_by(StockEvent.id).limit(max(1, min(limit, MAX_PAGE_SIZE)))
+
+    return [
+        {
+            "id": event.id,
+            "created_at": event.created_at.isoformat(),
+            "kind": event.kind,
+            "portfolio_id": event.portfolio_id,
+            "stock_id": event.stock_id,
+            "symbol": event.symbol,
+            "payload": json.loads(event.payload),
+        }
+        for event in (await session.exec(statement)).all()
+    ]
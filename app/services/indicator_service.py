@@ -0,0 +1,386 @@
+"""
+Moving-average indicators computed from stored daily closes.
+
+A symbol's daily closes are fetched with a single TIME_SERIES_DAILY call,
+stored in the PriceBar table, and every supported SMA/EMA window is computed
+in one pass over the stored series. Latest values go to the Indicator table
+and the latest price to the shared Symbol row, so adding indicators does not
+add upstream calls and a price update is one row write however many
+portfolios hold the symbol.
+"""
+import logging
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from app.models.bulk import upsert
+from app.models.models import Indicator, PriceBar, Symbol, get_engine
+from app.services.cache import quote_cache
+from app.services.market_calendar import USE_MARKET_CALENDAR, market_calendar
+from app.services.stock_service import StockService
+from app.utils.metrics import QUOTE_CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_KINDS = ("sma", "ema")
+SUPPORTED_WINDOWS = (20, 50, 100, 200)
+ALL_INDICATORS = [f"{kind}_{window}" for kind in SUPPORTED_KINDS for window in SUPPORTED_WINDOWS]
+DEFAULT_RULES = "sma_200:15"
+
+# Closes loaded per computation; EMAs need a few multiples of the window to settle
+HISTORY_BARS = 800
+# Daily changes used to estimate a symbol's volatility
+VOLATILITY_WINDOW = 20
+
+
+def parse_indicator_name(name: str) -> Tuple[str, int]:
+    """Split "sma_200" into ("sma", 200), validating it is supported"""
+    kind, _, window = name.strip().lower().partition("_")
+    if kind not in SUPPORTED_KINDS or not window.isdigit() or int(window) not in SUPPORTED_WINDOWS:
+        raise ValueError(f"Unsupported indicator '{name}'")
+    return kind, int(window)
+
+
+def indicator_label(name: str) -> str:
+    """Human-readable label, e.g. "200-day SMA" """
+    kind, window = parse_indicator_name(name)
+    return f"{window}-day {kind.upper()}"
+
+
+def parse_rules(spec: Optional[str]) -> List[Tuple[str, float]]:
+    """
+    Parse a portfolio's alert rules
+
+    Args:
+        spec: Comma-separated "indicator:threshold" pairs, e.g. "sma_200:15,ema_50:5"
+
+    Returns:
+        List of (indicator name, threshold %) tuples
+    """
+    rules = []
+    for item in (spec or DEFAULT_RULES).split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, threshold = item.partition(":")
+        kind, window = parse_indicator_name(name)
+        value = float(threshold) if threshold else 15.0
+        if not 0 < value <= 100:
+            raise ValueError(f"Threshold for '{name}' must be between 0 and 100")
+        rules.append((f"{kind}_{window}", value))
+    if not rules:
+        raise ValueError("At least one indicator is required")
+    return rules
+
+
+def format_rules(rules: Sequence[Tuple[str, float]]) -> str:
+    return ",".join(f"{name}:{threshold:g}" for name, threshold in rules)
+
+
+def compute_indicators(closes: Sequence[float], names: Sequence[str] = ALL_INDICATORS) -> Dict[str, Optional[float]]:
+    """
+    Compute the latest value of every requested indicator in a single pass
+
+    Args:
+        closes: Daily closes, oldest first
+        names: Indicator names such as "sma_50" or "ema_200"
+
+    Returns:
+        Dictionary of indicator name to latest value (None without enough history)
+    """
+    sma_windows = sorted({window for kind, window in map(parse_indicator_name, names) if kind == "sma"})
+    ema_windows = sorted({window for kind, window in map(parse_indicator_name, names) if kind == "ema"})
+
+    sums = {window: 0.0 for window in sma_windows}
+    ema_values: Dict[int, Optional[float]] = {window: None for window in ema_windows}
+    ema_seeds = {window: 0.0 for window in ema_windows}
+    alphas = {window: 2.0 / (window + 1) for window in ema_windows}
+
+    for i, close in enumerate(closes):
+        for window in sma_windows:
+            sums[window] += close
+            if i >= window:
+                sums[window] -= closes[i - window]
+        for window in ema_windows:
+            if i < window:
+                # Seed the EMA with the SMA of the first `window` closes
+                ema_seeds[window] += close
+                if i == window - 1:
+                    ema_values[window] = ema_seeds[window] / window
+            else:
+                ema_values[window] += alphas[window] * (close - ema_values[window])
+
+    count = len(closes)
+    results: Dict[str, Optional[float]] = {}
+    for name in names:
+        kind, window = parse_indicator_name(name)
+        if kind == "sma":
+            results[name] = sums[window] / window if count >= window else None
+        else:
+            results[name] = ema_values[window]
+    return results
+
+
+def compute_volatility(closes: Sequence[float], window: int = VOLATILITY_WINDOW) -> Optional[float]:
+    """
+    Standard deviation of the last `window` daily close-to-close changes
+
+    Returns:
+        Volatility in percent per day (None with fewer than two changes)
+    """
+    recent = closes[-(window + 1):]
+    changes = [(close - prev) / prev * 100 for prev, close in zip(recent, recent[1:]) if prev]
+    if len(changes) < 2:
+        return None
+    mean = sum(changes) / len(changes)
+    return round((sum((c - mean) ** 2 for c in changes) / (len(changes) - 1)) ** 0.5, 4)
+
+
+def sessions_below_sma(closes: Sequence[float], window: int = 200) -> Optional[int]:
+    """
+    Number of most recent sessions in a row that closed below the SMA
+
+    Returns:
+        0 when the latest close is at or above the SMA (None without enough history)
+    """
+    if len(closes) < window:
+        return None
+    total = sum(closes[:window])
+    below = []
+    for i in range(window - 1, len(closes)):
+        if i >= window:
+            total += closes[i] - closes[i - window]
+        below.append(closes[i] < total / window)
+    count = 0
+    for is_below in reversed(below):
+        if not is_below:
+            break
+        count += 1
+    return count
+
+
+def distance_pct(price: Optional[float], value: Optional[float]) -> Optional[float]:
+    """Percentage distance of a price from an indicator value"""
+    if price is None or not value:
+        return None
+    return round((price - value) / value * 100, 2)
+
+
+def is_in_alert_band(distance: Optional[float], threshold: float) -> bool:
+    """
+    The alert rule: at or below the indicator by no more than `threshold` %
+
+    Also accepts a NumPy array of distances (NaN never matches), which is how
+    the backtester applies the exact same rule.
+    """
+    if distance is None:
+        return False
+    return (distance >= -threshold) & (distance <= 0)
+
+
+def evaluate_rules(
+    price: Optional[float],
+    indicators: Dict[str, Optional[float]],
+    rules: Sequence[Tuple[str, float]],
+) -> List[Dict[str, Any]]:
+    """Return the rules whose alert band the price is currently in"""
+    triggered = []
+    for name, threshold in rules:
+        value = indicators.get(name)
+        distance = distance_pct(price, value)
+        if is_in_alert_band(distance, threshold):
+            triggered.append({
+                "indicator": name,
+                "label": indicator_label(name),
+                "value": value,
+                "distance": distance,
+                "threshold": threshold,
+            })
+    return triggered
+
+
+def store_bars(session: Session, symbol: str, bars: Sequence[Tuple[date, float, Optional[int]]]) -> None:
+    """Insert or update daily bars for a symbol"""
+    rows = [{"symbol": symbol, "day": day, "close": close, "volume": volume} for day, close, volume in bars]
+    upsert(session, PriceBar, rows, index_elements=["symbol", "day"], update_columns=["close", "volume"])
+
+
+def load_closes(session: Session, symbol: str, limit: int = HISTORY_BARS) -> Tuple[List[float], Optional[date]]:
+    """Return up to `limit` most recent closes (oldest first) and the latest bar date"""
+    rows = session.exec(
+        select(PriceBar.day, PriceBar.close)
+        .where(PriceBar.symbol == symbol)
+        .order_by(PriceBar.day.desc())
+        .limit(limit)
+    ).all()
+    if not rows:
+        return [], None
+    return [close for _, close in reversed(rows)], rows[0][0]
+
+
+def bars_behind(session: Session, symbol: str, latest_day: date) -> bool:
+    """
+    Whether the stored bars may be behind the market
+
+    Without the market calendar, only a missing bar for today counts. With
+    it, bars are current once the last session's bar is stored and was
+    fetched after that session's close settled, so nights, weekends and
+    holidays need no upstream calls.
+    """
+    if not USE_MARKET_CALENDAR:
+        return latest_day < date.today()
+    if latest_day < market_calendar.latest_session_day():
+        return True
+    last_checked = session.exec(select(Symbol.last_checked).where(Symbol.symbol == symbol)).first()
+    return last_checked is None or not market_calendar.is_settled(last_checked)
+
+
+def store_indicators(session: Session, symbol: str, values: Dict[str, Optional[float]], as_of: date) -> None:
+    """Insert or update the latest indicator values for a symbol"""
+    now = datetime.now()
+    rows = [
+        {"symbol": symbol, "name": name, "value": value, "as_of": as_of, "updated_at": now}
+        for name, value in values.items()
+        if value is not None
+    ]
+    upsert(session, Indicator, rows, index_elements=["symbol", "name"], update_columns=["value", "as_of", "updated_at"])
+
+
+def load_indicator_values(
+    session: Session, symbols: Sequence[str], names: Sequence[str]
+) -> Dict[str, Dict[str, Optional[float]]]:
+    """Stored indicator values for many symbols in one query, keyed by symbol then indicator name"""
+    values: Dict[str, Dict[str, Optional[float]]] = {}
+    if not symbols or not names:
+        return values
+    rows = session.exec(
+        select(Indicator.symbol, Indicator.name, Indicator.value).where(
+            Indicator.symbol.in_(set(symbols)),
+            Indicator.name.in_(names)
+        )
+    ).all()
+    for symbol, name, value in rows:
+        values.setdefault(symbol, {})[name] = value
+    return values
+
+
+def store_quote(
+    session: Session,
+    symbol: str,
+    price: float,
+    ma_200: Optional[float],
+    volatility: Optional[float],
+    days_below_ma: Optional[int],
+    as_of: date,
+    checked_at: datetime,
+) -> None:
+    """Write the latest market data to the symbol's shared row"""
+    upsert(session, Symbol, [{
+        "symbol": symbol,
+        "last_price": price,
+        "ma_200": ma_200,
+        "distance_to_ma": distance_pct(price, ma_200),
+        "volatility": volatility,
+        "days_below_ma": days_below_ma,
+        "last_checked": checked_at,
+        "as_of": as_of,
+    }], index_elements=["symbol"], update_columns=[
+        "last_price", "ma_200", "distance_to_ma", "volatility", "days_below_ma", "last_checked", "as_of"
+    ])
+
+
+class IndicatorService:
+    """Fetches daily history once per symbol and derives every indicator from it"""
+
+    def __init__(self, stock_service: Optional[StockService] = None):
+        self.stock_service = stock_service or StockService()
+        self.logger = logging.getLogger(__name__)
+
+    async def get_indicator_data(self, symbol: str, full_history: bool = False) -> Dict[str, Any]:
+        """
+        Get the latest close and all supported indicators for a symbol
+
+        Args:
+            symbol: Stock symbol
+            full_history: Bypass the cache and re-fetch the full daily history
+
+        Returns:
+            Dictionary with symbol, price, ma_200, distance_to_ma (to the
+            200-day SMA), indicators, volatility, days_below_ma, as_of and
+            timestamp. `stale` is set when the values come from stored
+            history because the upstream failed.
+        """
+        symbol = symbol.upper()
+        if full_history:
+            QUOTE_CACHE_REQUESTS.inc(result="miss")
+            result = await self._compute(symbol, full_history=True)
+            if not result.get("stale") and result["price"] is not None:
+                await quote_cache.offload(quote_cache.set, f"indicators:{symbol}", result)
+            return result
+
+        # Concurrent lookups (in any worker sharing the cache) wait for one computation
+        result, computed = await quote_cache.get_or_compute(
+            f"indicators:{symbol}",
+            lambda: self._compute(symbol),
+            cacheable=lambda data: not data.get("stale") and data["price"] is not None,
+        )
+        QUOTE_CACHE_REQUESTS.inc(result="miss" if computed else "hit")
+        return result
+
+    async def _compute(self, symbol: str, full_history: bool = False) -> Dict[str, Any]:
+        """Refresh stored bars if they are behind, then derive the indicators"""
+        stale = False
+        bars = None
+        # Sessions aren't held across the upstream call, which can take a
+        # minute with retries; on SQLite that would block every writer
+        with Session(get_engine()) as session:
+            latest_day, bar_count = session.exec(
+                select(func.max(PriceBar.day), func.count())
+                .where(PriceBar.symbol == symbol)
+            ).one()
+            behind = full_history or latest_day is None or bars_behind(session, symbol, latest_day)
+
+        if behind:
+            try:
+                # Compact responses (100 bars) are enough once history is stored
+                full = full_history or bar_count < max(SUPPORTED_WINDOWS)
+                bars = await self.stock_service.get_daily_series(symbol, full=full)
+                if not bars:
+                    stale = True
+            except Exception as e:
+                self.logger.warning("Could not fetch daily series for %s: %s", symbol, e)
+                stale = True
+
+        with Session(get_engine()) as session:
+            if bars:
+                store_bars(session, symbol, bars)
+            closes, as_of = load_closes(session, symbol)
+            values = compute_indicators(closes) if closes else {name: None for name in ALL_INDICATORS}
+            price = closes[-1] if closes else None
+            volatility = compute_volatility(closes)
+            days_below_ma = sessions_below_sma(closes)
+            checked_at = datetime.now()
+            if as_of is not None:
+                store_indicators(session, symbol, values, as_of)
+                # Stale values are left for the next check to refresh
+                if not stale:
+                    store_quote(session, symbol, price, values.get("sma_200"), volatility, days_below_ma, as_of, checked_at)
+            session.commit()
+
+        result = {
+            "symbol": symbol,
+            "price": price,
+            "ma_200": values.get("sma_200"),
+            "distance_to_ma": distance_pct(price, values.get("sma_200")),
+            "indicators": values,
+            "volatility": volatility,
+            "days_below_ma": days_below_ma,
+            "as_of": as_of,
+            "timestamp": checked_at,
+        }
+
+        if stale:
+            result["stale"] = True
+        return result
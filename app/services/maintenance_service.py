@@ -0,0 +1,213 @@
+"""
+Bulk maintenance operations for the admin CLI.
+
+These reuse the same internals as the scheduler (IndicatorService for
+market data, set-based SQL for bulk updates) so a one-off run behaves
+exactly like the background jobs.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import httpx
+from sqlalchemy import Integer, cast, extract, func, text, update
+from sqlmodel import Session, select
+
+from app.models.models import Indicator, PriceBar, Stock, Symbol, get_engine, is_postgres
+from app.services.cache import QuoteCache, quote_cache
+from app.services.cache_snapshot import load_snapshot, save_snapshot
+from app.services.indicator_service import ALL_INDICATORS, IndicatorService
+from app.services.price_archive import PriceArchive
+from app.services.stock_service import StockService
+from app.services.symbol_service import SYMBOL_LISTING_PATH
+
+logger = logging.getLogger(__name__)
+
+# progress(done, total, label)
+Progress = Callable[[int, int, str], None]
+
+
+def held_symbols(session: Session) -> List[str]:
+    """Distinct symbols held in any portfolio"""
+    return list(session.exec(select(Stock.symbol).distinct().order_by(Stock.symbol)).all())
+
+
+async def backfill_prices(
+    symbols: Optional[Sequence[str]] = None,
+    concurrency: int = 4,
+    full_history: bool = False,
+    progress: Optional[Progress] = None,
+) -> Dict[str, int]:
+    """
+    Fetch and store daily history (and indicators) for many symbols in parallel
+
+    Args:
+        symbols: Symbols to backfill (default: every held symbol)
+        concurrency: Upstream requests in flight at once
+        full_history: Re-fetch the full history even where bars are stored
+
+    Returns:
+        Dictionary with counts of updated and failed symbols
+    """
+    if symbols is None:
+        with Session(get_engine()) as session:
+            symbols = held_symbols(session)
+
+    service = IndicatorService(StockService())
+    semaphore = asyncio.Semaphore(concurrency)
+    counts = {"symbols": len(symbols), "updated": 0, "failed": 0}
+    done = 0
+
+    async def backfill(symbol: str) -> None:
+        nonlocal done
+        async with semaphore:
+            try:
+                data = await service.get_indicator_data(symbol, full_history=full_history)
+                ok = data.get("price") is not None and not data.get("stale")
+            except Exception as e:
+                logger.error("Error backfilling %s: %s", symbol, e)
+                ok = False
+        counts["updated" if ok else "failed"] += 1
+        done += 1
+        if progress:
+            progress(done, len(symbols), symbol)
+
+    await asyncio.gather(*(backfill(symbol) for symbol in symbols))
+    return counts
+
+
+def recompute_days_since_break(session: Session, now: Optional[datetime] = None) -> int:
+    """
+    Recompute `days_since_ma_break` for every stock in one UPDATE
+
+    Returns:
+        int: Number of rows updated
+    """
+    now = now or datetime.now()
+    if is_postgres(session.get_bind()):
+        days = extract("day", now - Stock.last_ma_break_date)
+    else:
+        days = func.julianday(now) - func.julianday(Stock.last_ma_break_date)
+    result = session.execute(
+        update(Stock)
+        .where(Stock.last_ma_break_date.is_not(None))
+        .values(days_since_ma_break=cast(days, Integer))
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    return result.rowcount
+
+
+def vacuum_database() -> None:
+    """Reclaim free pages and refresh planner statistics"""
+    # VACUUM cannot run inside a transaction
+    with get_engine().connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if is_postgres(conn):
+            conn.execute(text("VACUUM (ANALYZE)"))
+            return
+        conn.execute(text("VACUUM"))
+        conn.execute(text("ANALYZE"))
+        conn.execute(text("PRAGMA optimize"))
+
+
+def stored_indicator_results(session: Session, symbols: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    The latest stored quote and indicators of each symbol, shaped like
+    `IndicatorService.get_indicator_data` results
+
+    Symbols that were never successfully checked are left out.
+    """
+    rows = session.exec(
+        select(Symbol).where(
+            Symbol.symbol.in_(symbols),
+            Symbol.last_price.is_not(None),
+            Symbol.last_checked.is_not(None),
+            Symbol.as_of.is_not(None),
+        )
+    ).all()
+    values: Dict[str, Dict[str, Optional[float]]] = {}
+    for symbol, name, value, as_of in session.exec(
+        select(Indicator.symbol, Indicator.name, Indicator.value, Indicator.as_of)
+        .where(Indicator.symbol.in_(symbols))
+    ):
+        values.setdefault(symbol, {})[name, as_of] = value
+
+    results = {}
+    for row in rows:
+        indicators = {name: values.get(row.symbol, {}).get((name, row.as_of)) for name in ALL_INDICATORS}
+        results[row.symbol] = {
+            "symbol": row.symbol,
+            "price": row.last_price,
+            "ma_200": row.ma_200,
+            "distance_to_ma": row.distance_to_ma,
+            "indicators": indicators,
+            "volatility": row.volatility,
+            "days_below_ma": row.days_below_ma,
+            "as_of": row.as_of,
+            "timestamp": row.last_checked,
+        }
+    return results
+
+
+async def warm_caches(
+    refresh_listing: bool = False,
+    archive_path: Optional[str] = None,
+    cache: QuoteCache = quote_cache,
+) -> Dict[str, int]:
+    """
+    Prepare the caches and files the app reads on startup
+
+    Downloads the symbol listing when it is missing (or `refresh_listing` is
+    set) and loads the stored quote and indicators of every held symbol
+    into the quote cache, keeping the time they were checked so they go
+    stale on schedule. An in-process cache is handed to the app through
+    the warm-start snapshot, merged over the existing one. Finally reads
+    through the price history tables and, if configured, the price archive
+    so the next app or backtest start hits warm pages.
+
+    Returns:
+        Dictionary with listing bytes, cached quotes, stored bars and archived symbols
+    """
+    stats = {"listing_bytes": 0, "quotes": 0, "bars": 0, "indicators": 0, "archived_symbols": 0}
+
+    if refresh_listing or not os.path.exists(SYMBOL_LISTING_PATH):
+        try:
+            stats["listing_bytes"] = await StockService().download_listing(SYMBOL_LISTING_PATH)
+        except (httpx.HTTPError, ValueError) as e:
+            logger.warning("Could not download symbol listing: %s", e)
+
+    if not cache.persistent:
+        load_snapshot(cache=cache)
+
+    with Session(get_engine()) as session:
+        now = time.time()
+        cached = {key: stored_at for key, (stored_at, _) in cache.items().items()}
+        for symbol, result in stored_indicator_results(session, held_symbols(session)).items():
+            stored_at = result["timestamp"].timestamp()
+            if cache.is_expired(stored_at, now):
+                continue
+            key = f"indicators:{symbol}"
+            # Don't replace anything the app fetched after the last database write
+            if cached.get(key, 0) < stored_at:
+                cache.set(key, result, stored_at=stored_at)
+                stats["quotes"] += 1
+
+        stats["bars"] = session.exec(select(func.count(PriceBar.close))).one()
+        stats["indicators"] = session.exec(select(func.count(Indicator.value))).one()
+
+    if archive_path and os.path.exists(archive_path):
+        archive = PriceArchive(archive_path)
+        for symbol in archive.symbols():
+            days, closes, _ = archive.read(symbol)
+            # Touch every page of the symbol's columns
+            days.sum()
+            closes.sum()
+        stats["archived_symbols"] = len(archive)
+
+    if not cache.persistent:
+        save_snapshot(cache=cache)
+
+    return stats
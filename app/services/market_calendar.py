@@ -0,0 +1,188 @@
+"""
+Exchange trading calendar (NYSE) from a bundled holiday table.
+
+Sessions run 09:30-16:00 America/New_York on weekdays, except full-day
+closures and 13:00 early closes listed below. No network access is needed;
+dates past the end of the table are treated as regular weekdays (with a
+warning) until the table is extended.
+
+The scheduler uses the calendar to skip sweeps while the market is closed
+and to run one sweep after each close, and the quote cache uses it to keep
+values fetched after a close fresh until the next session opens.
+"""
+import logging
+import os
+from datetime import date, datetime, time, timedelta
+from typing import Dict, FrozenSet, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+logger = logging.getLogger(__name__)
+
+MARKET_TIMEZONE = ZoneInfo("America/New_York")
+SESSION_OPEN = time(9, 30)
+SESSION_CLOSE = time(16, 0)
+EARLY_CLOSE = time(13, 0)
+# Minutes after the close before the day's bar is treated as final
+POST_CLOSE_DELAY_MINUTES = int(os.getenv("POST_CLOSE_DELAY_MINUTES", "30"))
+# Set to 0 to sweep around the clock and expire cached quotes by age only
+USE_MARKET_CALENDAR = os.getenv("MARKET_CALENDAR", "1") == "1"
+
+HOLIDAYS: Dict[date, str] = {
+    date(2025, 1, 1): "New Year's Day",
+    date(2025, 1, 9): "National Day of Mourning",
+    date(2025, 1, 20): "Martin Luther King Jr. Day",
+    date(2025, 2, 17): "Washington's Birthday",
+    date(2025, 4, 18): "Good Friday",
+    date(2025, 5, 26): "Memorial Day",
+    date(2025, 6, 19): "Juneteenth",
+    date(2025, 7, 4): "Independence Day",
+    date(2025, 9, 1): "Labor Day",
+    date(2025, 11, 27): "Thanksgiving Day",
+    date(2025, 12, 25): "Christmas Day",
+    date(2026, 1, 1): "New Year's Day",
+    date(2026, 1, 19): "Martin Luther King Jr. Day",
+    date(2026, 2, 16): "Washington's Birthday",
+    date(2026, 4, 3): "Good Friday",
+    date(2026, 5, 25): "Memorial Day",
+    date(2026, 6, 19): "Juneteenth",
+    date(2026, 7, 3): "Independence Day (observed)",
+    date(2026, 9, 7): "Labor Day",
+    date(2026, 11, 26): "Thanksgiving Day",
+    date(2026, 12, 25): "Christmas Day",
+    date(2027, 1, 1): "New Year's Day",
+    date(2027, 1, 18): "Martin Luther King Jr. Day",
+    date(2027, 2, 15): "Washington's Birthday",
+    date(2027, 3, 26): "Good Friday",
+    date(2027, 5, 31): "Memorial Day",
+    date(2027, 6, 18): "Juneteenth (observed)",
+    date(2027, 7, 5): "Independence Day (observed)",
+    date(2027, 9, 6): "Labor Day",
+    date(2027, 11, 25): "Thanksgiving Day",
+    date(2027, 12, 24): "Christmas Day (observed)",
+    date(2028, 1, 17): "Martin Luther King Jr. Day",
+    date(2028, 2, 21): "Washington's Birthday",
+    date(2028, 4, 14): "Good Friday",
+    date(2028, 5, 29): "Memorial Day",
+    date(2028, 6, 19): "Juneteenth",
+    date(2028, 7, 4): "Independence Day",
+    date(2028, 9, 4): "Labor Day",
+    date(2028, 11, 23): "Thanksgiving Day",
+    date(2028, 12, 25): "Christmas Day",
+    date(2029, 1, 1): "New Year's Day",
+    date(2029, 1, 15): "Martin Luther King Jr. Day",
+    date(2029, 2, 19): "Washington's Birthday",
+    date(2029, 3, 30): "Good Friday",
+    date(2029, 5, 28): "Memorial Day",
+    date(2029, 6, 19): "Juneteenth",
+    date(2029, 7, 4): "Independence Day",
+    date(2029, 9, 3): "Labor Day",
+    date(2029, 11, 22): "Thanksgiving Day",
+    date(2029, 12, 25): "Christmas Day",
+    date(2030, 1, 1): "New Year's Day",
+    date(2030, 1, 21): "Martin Luther King Jr. Day",
+    date(2030, 2, 18): "Washington's Birthday",
+    date(2030, 4, 19): "Good Friday",
+    date(2030, 5, 27): "Memorial Day",
+    date(2030, 6, 19): "Juneteenth",
+    date(2030, 7, 4): "Independence Day",
+    date(2030, 9, 2): "Labor Day",
+    date(2030, 11, 28): "Thanksgiving Day",
+    date(2030, 12, 25): "Christmas Day",
+}
+
+EARLY_CLOSES: FrozenSet[date] = frozenset({
+    date(2025, 7, 3), date(2025, 11, 28), date(2025, 12, 24),
+    date(2026, 11, 27), date(2026, 12, 24),
+    date(2027, 11, 26),
+    date(2028, 7, 3), date(2028, 11, 24),
+    date(2029, 7, 3), date(2029, 11, 23), date(2029, 12, 24),
+    date(2030, 7, 3), date(2030, 11, 29), date(2030, 12, 24),
+})
+
+CALENDAR_END = date(2030, 12, 31)
+
+
+class MarketCalendar:
+    """Trading days and session times for one exchange"""
+
+    def __init__(
+        self,
+        holidays: Dict[date, str] = HOLIDAYS,
+        early_closes: FrozenSet[date] = EARLY_CLOSES,
+        end: date = CALENDAR_END,
+        tz: ZoneInfo = MARKET_TIMEZONE,
+    ):
+        self.holidays = holidays
+        self.early_closes = early_closes
+        self.end = end
+        self.tz = tz
+        self._warned_past_end = False
+
+    def _local(self, when: Optional[datetime]) -> datetime:
+        # Naive datetimes are the server's local time, like datetime.now()
+        return (when or datetime.now()).astimezone(self.tz)
+
+    def is_trading_day(self, day: date) -> bool:
+        if day > self.end and not self._warned_past_end:
+            logger.warning("Market calendar ends %s; treating later weekdays as trading days", self.end)
+            self._warned_past_end = True
+        return day.weekday() < 5 and day not in self.holidays
+
+    def session(self, day: date) -> Optional[Tuple[datetime, datetime]]:
+        """Open and close of the session on `day`, or None when the market is closed all day"""
+        if not self.is_trading_day(day):
+            return None
+        close = EARLY_CLOSE if day in self.early_closes else SESSION_CLOSE
+        return (
+            datetime.combine(day, SESSION_OPEN, tzinfo=self.tz),
+            datetime.combine(day, close, tzinfo=self.tz),
+        )
+
+    def is_open(self, when: Optional[datetime] = None) -> bool:
+        """Whether a session is in progress"""
+        local = self._local(when)
+        bounds = self.session(local.date())
+        return bounds is not None and bounds[0] <= local < bounds[1]
+
+    def next_open(self, when: Optional[datetime] = None) -> datetime:
+        """Start of the next session after `when` (or of the current one)"""
+        local = self._local(when)
+        day = local.date()
+        while True:
+            bounds = self.session(day)
+            if bounds is not None and local < bounds[1]:
+                return bounds[0]
+            day += timedelta(days=1)
+
+    def last_close(self, when: Optional[datetime] = None) -> datetime:
+        """End of the most recent session that closed at or before `when`"""
+        local = self._local(when)
+        day = local.date()
+        while True:
+            bounds = self.session(day)
+            if bounds is not None and bounds[1] <= local:
+                return bounds[1]
+            day -= timedelta(days=1)
+
+    def latest_session_day(self, when: Optional[datetime] = None) -> date:
+        """Date of the session in progress, or of the last one to close"""
+        local = self._local(when)
+        bounds = self.session(local.date())
+        if bounds is not None and local >= bounds[0]:
+            return local.date()
+        return self.last_close(when).date()
+
+    def is_settled(self, stored_at: datetime, when: Optional[datetime] = None) -> bool:
+        """
+        Whether data fetched at `stored_at` still reflects the latest close at `when`
+
+        True when it was fetched at least POST_CLOSE_DELAY_MINUTES after the
+        most recent close and no session has opened since.
+        """
+        if self.is_open(when):
+            return False
+        settled_at = self.last_close(when) + timedelta(minutes=POST_CLOSE_DELAY_MINUTES)
+        return self._local(stored_at) >= settled_at
+
+
+market_calendar = MarketCalendar()
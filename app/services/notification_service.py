@@ -4,7 +4,9 @@ Notification service for sending alerts using NotificationAPI
 import os
 import logging
 import asyncio
-from typing import Dict, Any
+from typing import Dict, Any, List
+
+from app.utils.metrics import NOTIFICATION_LATENCY, NOTIFICATIONS
 
 # Import NotificationAPI SDK
 try:
@@ -22,6 +24,8 @@ class NotificationService:
         self.client_id = os.getenv("NOTIFICATIONAPI_CLIENT_ID")
         self.client_secret = os.getenv("NOTIFICATIONAPI_CLIENT_SECRET")
         self.notification_id = os.getenv("NOTIFICATIONAPI_NOTIFICATION_ID")
+        # Digests can use their own template; by default they share the alert template
+        self.digest_notification_id = os.getenv("NOTIFICATIONAPI_DIGEST_NOTIFICATION_ID", self.notification_id)
         
         # Initialize NotificationAPI if available and credentials are provided
         if NOTIFICATION_API_AVAILABLE and self.client_id and self.client_secret:
@@ -41,19 +45,22 @@ class NotificationService:
         
         Args:
             user_email: Email address to send the alert to
-            stock_data: Dictionary containing stock info
+            stock_data: Dictionary containing stock info; `ma_200` holds the value
+                of the indicator named by `indicator_label` (default "200-day MA")
             
         Returns:
             bool: True if notification was sent successfully, False otherwise
         """
+        label = stock_data.get("indicator_label", "200-day MA")
+        
         # Format the comment/message for the notification template
         message = (
-            f"Stock Alert: {stock_data['symbol']} is near its 200-day Moving Average\n\n"
+            f"Stock Alert: {stock_data['symbol']} is near its {label}\n\n"
             f"• Symbol: {stock_data['symbol']}\n"
             f"• Current Price: ${stock_data['price']:.2f}\n"
-            f"• 200-day MA: ${stock_data['ma_200']:.2f}\n"
+            f"• {label}: ${stock_data['ma_200']:.2f}\n"
             f"• Distance to MA: {stock_data['distance_to_ma']:.2f}%\n\n"
-            f"The 200-day moving average is a key technical indicator used by traders and investors "
+            f"Moving averages are key technical indicators used by traders and investors "
             f"to identify potential market trends and support/resistance levels."
         )
         
@@ -70,18 +77,65 @@ class NotificationService:
                     "symbol": stock_data['symbol'],
                     "price": f"${stock_data['price']:.2f}",
                     "ma_200": f"${stock_data['ma_200']:.2f}",
-                    "distance": f"{stock_data['distance_to_ma']:.2f}%"
+                    "distance": f"{stock_data['distance_to_ma']:.2f}%",
+                    "indicator": label
                 }
             }
             
             # Send the notification
-            await notificationapi.send(payload)
+            with NOTIFICATION_LATENCY.time(kind="ma_alert"):
+                await notificationapi.send(payload)
+            
+            NOTIFICATIONS.inc(kind="ma_alert", outcome="sent")
+            self.logger.info("Notification sent to %s for stock %s", user_email, stock_data['symbol'])
+            return True
+            
+        except Exception as e:
+            NOTIFICATIONS.inc(kind="ma_alert", outcome="failed")
+            self.logger.error("Failed to send notification to %s: %s", user_email, e)
+            return False
+    
+    async def send_digest(self, user_email: str, alerts: List[Dict[str, Any]]) -> bool:
+        """
+        Send one notification covering several stock alerts
+        
+        Args:
+            user_email: Email address to send the digest to
+            alerts: Alert dictionaries in the format taken by send_ma_alert
+            
+        Returns:
+            bool: True if notification was sent successfully, False otherwise
+        """
+        lines = [
+            f"• {alert['symbol']}: ${alert['price']:.2f}, {alert['distance_to_ma']:.2f}% from its "
+            f"{alert.get('indicator_label', '200-day MA')} (${alert['ma_200']:.2f})"
+            for alert in alerts
+        ]
+        
+        try:
+            payload = {
+                "notificationId": self.digest_notification_id,
+                "user": {
+                    "id": user_email,
+                    "email": user_email
+                },
+                "mergeTags": {
+                    "symbol": ", ".join(alert["symbol"] for alert in alerts),
+                    "count": str(len(alerts)),
+                    "alerts": "\n".join(lines)
+                }
+            }
+            
+            with NOTIFICATION_LATENCY.time(kind="digest"):
+                await notificationapi.send(payload)
             
-            self.logger.info(f"Notification sent to {user_email} for stock {stock_data['symbol']}")
+            NOTIFICATIONS.inc(kind="digest", outcome="sent")
+            self.logger.info("Digest with %s alerts sent to %s", len(alerts), user_email)
             return True
             
         except Exception as e:
-            self.logger.error(f"Failed to send notification to {user_email}: {str(e)}")
+            NOTIFICATIONS.inc(kind="digest", outcome="failed")
+            self.logger.error("Failed to send digest to %s: %s", user_email, e)
             return False
     
     async def send_test_notification(self, user_email: str) -> bool:
@@ -112,11 +166,14 @@ class NotificationService:
             }
             
             # Send the notification
-            await notificationapi.send(payload)
+            with NOTIFICATION_LATENCY.time(kind="test"):
+                await notificationapi.send(payload)
             
-            self.logger.info(f"Test notification sent to {user_email}")
+            NOTIFICATIONS.inc(kind="test", outcome="sent")
+            self.logger.info("Test notification sent to %s", user_email)
             return True
             
         except Exception as e:
-            self.logger.error(f"Failed to send test notification to {user_email}: {str(e)}")
+            NOTIFICATIONS.inc(kind="test", outcome="failed")
+            self.logger.error("Failed to send test notification to %s: %s", user_email, e)
             return False
\ No newline at end of file
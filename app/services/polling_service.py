@@ -0,0 +1,76 @@
+"""
+Adaptive polling intervals for the scheduled sweep.
+
+A holding far from its alert band can't reach it before the next few
+checks, so there is no point re-fetching it every sweep. The interval is
+the time a price move of `POLL_VOLATILITY_SIGMAS` standard deviations
+(scaled by the square root of time) would need to cover the gap to the
+nearest band edge, clamped between `POLL_MIN_HOURS` and the portfolio's
+`polling_rate`. Holdings in or next to the band are checked every sweep;
+quiet holdings far from it fall back to the portfolio's polling rate.
+"""
+import logging
+import os
+from typing import Dict, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Shortest interval; should match the sweep cadence
+POLL_MIN_HOURS = float(os.getenv("POLL_MIN_HOURS", "1"))
+# Size of the move (in standard deviations) a holding is assumed able to make
+POLL_VOLATILITY_SIGMAS = float(os.getenv("POLL_VOLATILITY_SIGMAS", "3"))
+
+
+def gap_to_band(price: Optional[float], value: Optional[float], threshold: float) -> Optional[float]:
+    """
+    Price move needed to enter a rule's alert band, in percent of the price
+
+    The band runs from the indicator value down to `threshold` % below it.
+
+    Returns:
+        0 inside the band, otherwise the percentage move (None without data)
+    """
+    if not price or not value:
+        return None
+    upper = value
+    lower = value * (1 - threshold / 100)
+    if price > upper:
+        return (price - upper) / price * 100
+    if price < lower:
+        return (lower - price) / price * 100
+    return 0.0
+
+
+def poll_interval_hours(
+    price: Optional[float],
+    indicators: Dict[str, Optional[float]],
+    rules: Sequence[Tuple[str, float]],
+    volatility: Optional[float],
+    polling_rate: float,
+) -> float:
+    """
+    Hours until a holding could plausibly reach any of its alert bands
+
+    Args:
+        price: Latest price
+        indicators: Latest indicator values by name
+        rules: The portfolio's (indicator, threshold %) rules
+        volatility: Daily volatility in percent
+        polling_rate: The portfolio's polling rate, used as the upper bound
+
+    Returns:
+        float: Hours to wait before re-fetching the holding
+    """
+    upper_bound = max(POLL_MIN_HOURS, float(polling_rate))
+    if not volatility:
+        return upper_bound
+
+    gaps = [gap_to_band(price, indicators.get(name), threshold) for name, threshold in rules]
+    gaps = [gap for gap in gaps if gap is not None]
+    if not gaps:
+        return upper_bound
+
+    # Random-walk estimate: a move of k sigma takes (gap / (k * sigma))^2 trading days.
+    # Counting those as calendar days errs on the side of checking early.
+    days = (min(gaps) / (POLL_VOLATILITY_SIGMAS * volatility)) ** 2
+    return min(upper_bound, max(POLL_MIN_HOURS, days * 24))
@@ -0,0 +1,379 @@
+"""
+Memory-mapped on-disk archive of daily price history.
+
+The archive is a directory holding one data file and a JSON offset index.
+Each symbol owns an extent in the data file made of three fixed-width
+columns of `capacity` 8-byte words: day ordinals (int64), closes (float64)
+and volumes (int64, 0 when unknown). Readers map the data file with
+`numpy.memmap` and hand out zero-copy views, so every process reading the
+archive shares the same pages through the OS page cache.
+
+Only one process may write at a time (enforced with an advisory lock on
+POSIX). Appends go into the free capacity of a symbol's extent, or move the
+extent to the end of the file when it is full, and only become visible to
+readers when the index is atomically replaced on `flush()`. Bars for days
+missing from the middle or the start of a symbol's history (a later full
+backfill) are merged by rewriting the symbol into a new extent.
+"""
+import json
+import logging
+import os
+from datetime import date
+from itertools import groupby
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from app.models.models import PriceBar
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Directory of the shared archive; unset disables it
+ARCHIVE_PATH = os.getenv("PRICE_ARCHIVE_PATH")
+
+INDEX_FILE = "index.json"
+LOCK_FILE = "writer.lock"
+WORD = 8
+# Initial rows reserved per symbol; roughly four years of trading days
+MIN_CAPACITY = 1024
+
+Bar = Tuple[date, float, Optional[int]]
+
+
+class ArchiveLockedError(RuntimeError):
+    """Raised when another process already holds the archive writer lock"""
+
+
+def _read_index(path: str) -> Dict:
+    try:
+        with open(os.path.join(path, INDEX_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"data": None, "end": 0, "symbols": {}}
+
+
+class PriceArchive:
+    """Read-only view of a price archive"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._index_stat: Optional[Tuple[int, int]] = None
+        self._data_name: Optional[str] = None
+        self._symbols: Dict[str, List[int]] = {}
+        self._words = np.empty(0, dtype=np.int64)
+        self.refresh()
+
+    def refresh(self) -> bool:
+        """
+        Pick up changes published by the writer
+
+        Returns:
+            bool: True if the index changed since the last refresh
+        """
+        try:
+            stat = os.stat(os.path.join(self.path, INDEX_FILE))
+        except FileNotFoundError:
+            return False
+        key = (stat.st_mtime_ns, stat.st_size)
+        if key == self._index_stat:
+            return False
+
+        index = _read_index(self.path)
+        data_name = index["data"]
+        if data_name and (data_name != self._data_name or index["end"] > len(self._words)):
+            data_path = os.path.join(self.path, data_name)
+            if os.path.getsize(data_path):
+                self._words = np.memmap(data_path, dtype=np.int64, mode="r")
+            self._data_name = data_name
+
+        self._symbols = index["symbols"]
+        self._index_stat = key
+        return True
+
+    def __len__(self) -> int:
+        return len(self._symbols)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol.upper() in self._symbols
+
+    def symbols(self) -> List[str]:
+        return sorted(self._symbols)
+
+    def read(self, symbol: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Get a symbol's full history as zero-copy views
+
+        Returns:
+            Tuple of (day ordinals, closes, volumes), oldest first; empty
+            arrays for unknown symbols
+        """
+        entry = self._symbols.get(symbol.upper())
+        if entry is None:
+            return np.empty(0, dtype=np.int64), np.empty(0), np.empty(0, dtype=np.int64)
+        offset, length, capacity = entry
+        days = self._words[offset:offset + length]
+        closes = self._words[offset + capacity:offset + capacity + length].view(np.float64)
+        volumes = self._words[offset + 2 * capacity:offset + 2 * capacity + length]
+        return days, closes, volumes
+
+    def closes(
+        self,
+        symbol: str,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Get (day ordinals, closes) for a symbol, optionally limited to a date range"""
+        days, closes, _ = self.read(symbol)
+        lo = np.searchsorted(days, start.toordinal()) if start else 0
+        hi = np.searchsorted(days, end.toordinal(), side="right") if end else len(days)
+        return days[lo:hi], closes[lo:hi]
+
+    def last_day(self, symbol: str) -> Optional[date]:
+        days, _, _ = self.read(symbol)
+        return date.fromordinal(int(days[-1])) if len(days) else None
+
+
+class PriceArchiveWriter:
+    """Single writer for a price archive; use as a context manager"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+        self._lock = open(os.path.join(path, LOCK_FILE), "a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self._lock.close()
+                raise ArchiveLockedError(f"Price archive {path} is locked by another writer")
+
+        index = _read_index(path)
+        self._data_name = index["data"] or "prices-1.bin"
+        self._end = index["end"]
+        self._symbols: Dict[str, List[int]] = index["symbols"]
+        self._fd = os.open(os.path.join(path, self._data_name), os.O_RDWR | os.O_CREAT, 0o644)
+        self._dirty = index["data"] is None
+
+    def __enter__(self) -> "PriceArchiveWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _read_column(self, offset: int, length: int, dtype) -> np.ndarray:
+        return np.frombuffer(os.pread(self._fd, length * WORD, offset * WORD), dtype=dtype)
+
+    def _write_column(self, offset: int, values: np.ndarray) -> None:
+        os.pwrite(self._fd, values.tobytes(), offset * WORD)
+
+    def _allocate(self, capacity: int) -> int:
+        offset = self._end
+        self._end += 3 * capacity
+        os.ftruncate(self._fd, self._end * WORD)
+        return offset
+
+    def symbols(self) -> List[str]:
+        return sorted(self._symbols)
+
+    def first_day(self, symbol: str) -> Optional[date]:
+        entry = self._symbols.get(symbol.upper())
+        if not entry or not entry[1]:
+            return None
+        return date.fromordinal(int(self._read_column(entry[0], 1, np.int64)[0]))
+
+    def last_day(self, symbol: str) -> Optional[date]:
+        entry = self._symbols.get(symbol.upper())
+        if not entry or not entry[1]:
+            return None
+        offset, length, _ = entry
+        return date.fromordinal(int(self._read_column(offset + length - 1, 1, np.int64)[0]))
+
+    def _merge(self, symbol: str, bars: Sequence[Bar]) -> int:
+        """Rewrite a symbol's history into a new extent with `bars` merged in"""
+        offset, length, capacity = self._symbols[symbol]
+        days = self._read_column(offset, length, np.int64)
+        closes = self._read_column(offset + capacity, length, np.float64)
+        volumes = self._read_column(offset + 2 * capacity, length, np.int64)
+        merged = {int(day): (close, volume) for day, close, volume in zip(days, closes, volumes)}
+        # Incoming bars win, as they do for the stored PriceBar rows
+        merged.update((bar[0].toordinal(), (bar[1], bar[2] or 0)) for bar in bars)
+
+        ordered = sorted(merged)
+        new_length = len(ordered)
+        new_capacity = max(MIN_CAPACITY, 2 * new_length)
+        # Readers may be mapping the old extent, so never rewrite it in place
+        new_offset = self._allocate(new_capacity)
+        self._write_column(new_offset, np.array(ordered, dtype=np.int64))
+        self._write_column(new_offset + new_capacity, np.array([merged[day][0] for day in ordered], dtype=np.float64))
+        self._write_column(new_offset + 2 * new_capacity, np.array([merged[day][1] for day in ordered], dtype=np.int64))
+        self._symbols[symbol] = [new_offset, new_length, new_capacity]
+        self._dirty = True
+        return new_length - length
+
+    def append(self, symbol: str, bars: Sequence[Bar]) -> int:
+        """
+        Append daily bars for a symbol
+
+        A bar for the last archived day replaces it (intraday refresh). Bars
+        for earlier days the archive doesn't have yet are merged in; earlier
+        days it already has are left as they are.
+
+        Returns:
+            int: Number of new rows
+        """
+        symbol = symbol.upper()
+        entry = self._symbols.get(symbol)
+        last = self.last_day(symbol)
+
+        if entry and any(bar[0] < last for bar in bars):
+            offset, length, _ = entry
+            archived = self._read_column(offset, length, np.int64)
+            earlier = np.array([bar[0].toordinal() for bar in bars if bar[0] < last], dtype=np.int64)
+            if not np.isin(earlier, archived).all():
+                return self._merge(symbol, bars)
+
+        new = [bar for bar in sorted(bars, key=lambda bar: bar[0]) if last is None or bar[0] > last]
+        same_day = [bar for bar in bars if last is not None and bar[0] == last]
+
+        if entry and same_day:
+            offset, length, capacity = entry
+            _, close, volume = same_day[-1]
+            position = offset + length - 1
+            self._write_column(position + capacity, np.array([close], dtype=np.float64))
+            self._write_column(position + 2 * capacity, np.array([volume or 0], dtype=np.int64))
+            self._dirty = True
+
+        if not new:
+            return 0
+
+        if entry is None:
+            capacity = max(MIN_CAPACITY, 2 * len(new))
+            entry = [self._allocate(capacity), 0, capacity]
+            self._symbols[symbol] = entry
+        elif entry[1] + len(new) > entry[2]:
+            # Move the extent to the end of the file with room to grow
+            offset, length, capacity = entry
+            columns = [
+                self._read_column(offset, length, np.int64),
+                self._read_column(offset + capacity, length, np.float64),
+                self._read_column(offset + 2 * capacity, length, np.int64),
+            ]
+            capacity = max(2 * capacity, length + len(new))
+            entry[0] = offset = self._allocate(capacity)
+            entry[2] = capacity
+            for i, column in enumerate(columns):
+                self._write_column(offset + i * capacity, column)
+
+        offset, length, capacity = entry
+        position = offset + length
+        self._write_column(position, np.fromiter((bar[0].toordinal() for bar in new), dtype=np.int64, count=len(new)))
+        self._write_column(position + capacity, np.fromiter((bar[1] for bar in new), dtype=np.float64, count=len(new)))
+        self._write_column(position + 2 * capacity, np.fromiter((bar[2] or 0 for bar in new), dtype=np.int64, count=len(new)))
+        entry[1] += len(new)
+        self._dirty = True
+        return len(new)
+
+    def flush(self) -> None:
+        """Make appended data durable and publish it to readers"""
+        if not self._dirty:
+            return
+        os.fsync(self._fd)
+        index_path = os.path.join(self.path, INDEX_FILE)
+        tmp_path = index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"data": self._data_name, "end": self._end, "symbols": self._symbols}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, index_path)
+        self._dirty = False
+
+    def compact(self) -> int:
+        """
+        Rewrite the archive without space left behind by moved extents
+
+        Returns:
+            int: Number of bytes reclaimed
+        """
+        generation = int(self._data_name.split("-")[1].split(".")[0]) + 1
+        new_name = f"prices-{generation}.bin"
+        new_fd = os.open(os.path.join(self.path, new_name), os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        end = 0
+        symbols = {}
+        for symbol, (offset, length, capacity) in sorted(self._symbols.items()):
+            new_capacity = max(MIN_CAPACITY, length + length // 4)
+            for i in range(3):
+                os.pwrite(new_fd, os.pread(self._fd, length * WORD, (offset + i * capacity) * WORD),
+                          (end + i * new_capacity) * WORD)
+            symbols[symbol] = [end, length, new_capacity]
+            end += 3 * new_capacity
+        os.ftruncate(new_fd, end * WORD)
+
+        old_name, old_end = self._data_name, self._end
+        os.close(self._fd)
+        self._fd, self._data_name, self._end, self._symbols = new_fd, new_name, end, symbols
+        self._dirty = True
+        self.flush()
+        # Readers that still map the old file keep it alive until they refresh
+        os.remove(os.path.join(self.path, old_name))
+        return (old_end - end) * WORD
+
+    def close(self) -> None:
+        if self._fd is None:
+            return
+        self.flush()
+        os.close(self._fd)
+        self._fd = None
+        if fcntl is not None:
+            fcntl.flock(self._lock, fcntl.LOCK_UN)
+        self._lock.close()
+
+
+def sync_from_database(session: Session, writer: PriceArchiveWriter, symbols: Optional[Iterable[str]] = None) -> int:
+    """
+    Append stored PriceBar rows that are not in the archive yet
+
+    Symbols with stored bars older than their archived history (a full
+    backfill after the archive was started) are re-read in full so the
+    older days get merged in.
+
+    Returns:
+        int: Number of rows appended
+    """
+    base = select(PriceBar.symbol, PriceBar.day, PriceBar.close, PriceBar.volume)
+    if symbols is not None:
+        base = base.where(PriceBar.symbol.in_([symbol.upper() for symbol in symbols]))
+
+    archived = writer.symbols()
+    statements = [base.where(PriceBar.symbol.notin_(archived)) if archived else base]
+    if archived:
+        first_stored = session.exec(
+            select(PriceBar.symbol, func.min(PriceBar.day))
+            .where(PriceBar.symbol.in_(archived))
+            .group_by(PriceBar.symbol)
+        ).all()
+        backfilled = [symbol for symbol, day in first_stored if day < writer.first_day(symbol)]
+        current = sorted(set(archived) - set(backfilled))
+        if backfilled:
+            statements.append(base.where(PriceBar.symbol.in_(backfilled)))
+        if current:
+            # The rest only need bars from the oldest "last archived day" on
+            since = min(writer.last_day(symbol) for symbol in current)
+            statements.append(base.where(PriceBar.symbol.in_(current), PriceBar.day >= since))
+
+    appended = 0
+    for statement in statements:
+        statement = statement.order_by(PriceBar.symbol, PriceBar.day).execution_options(yield_per=5000)
+        rows = session.connection().execute(statement)
+        for symbol, bars in groupby(rows, key=lambda row: row[0]):
+            appended += writer.append(symbol, [(day, close, volume) for _, day, close, volume in bars])
+    writer.flush()
+    logger.info("Appended %s bars to price archive %s", appended, writer.path)
+    return appended
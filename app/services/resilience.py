@@ -0,0 +1,160 @@
+"""
+Resilience primitives for upstream API calls.
+
+- CircuitBreaker: stops calling an endpoint after repeated failures and lets a
+  single trial call through once the reset timeout has passed
+- LatencyTracker: derives timeouts and hedge delays from observed latency
+- backoff_delay: exponential backoff with full jitter
+- hedged: issues a second request when the first is slower than usual
+"""
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the circuit is open"""
+
+
+class TransientUpstreamError(Exception):
+    """Retryable upstream failure (5xx, connection problems)"""
+
+
+class RateLimitedError(Exception):
+    """Upstream rejected the call because of rate limiting"""
+
+
+class CircuitBreaker:
+    """Per-endpoint circuit breaker (closed -> open -> half-open -> closed)"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        on_state_change: Optional[Callable[[str, str], None]] = None,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.on_state_change = on_state_change
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        # Start of the one trial call allowed while half-open, if in progress
+        self._probe_started: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _set_state(self, state: str) -> None:
+        if state != self.state:
+            self.state = state
+            if self.on_state_change:
+                self.on_state_change(self.name, state)
+
+    def allow(self) -> bool:
+        """
+        Return True if a call may be attempted
+
+        While half-open only one trial call is let through; everyone else is
+        rejected until it records its outcome. A trial that never reports
+        back (cancelled, or failed in a way that isn't counted) is replaced
+        after another `reset_timeout`.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.OPEN:
+                if now - self.opened_at < self.reset_timeout:
+                    return False
+                self._set_state(self.HALF_OPEN)
+            if self.state == self.HALF_OPEN:
+                if self._probe_started is not None and now - self._probe_started < self.reset_timeout:
+                    return False
+                self._probe_started = now
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self._probe_started = None
+            self._set_state(self.CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._probe_started = None
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._set_state(self.OPEN)
+
+
+class LatencyTracker:
+    """Sliding window of recent latencies used to derive timeouts"""
+
+    def __init__(
+        self,
+        window: int = 200,
+        initial: float = 1.0,
+        min_timeout: float = 1.0,
+        max_timeout: float = 10.0,
+        multiplier: float = 2.0,
+    ):
+        self.samples = deque(maxlen=window)
+        self.initial = initial
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.multiplier = multiplier
+
+    def observe(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, pct: float) -> float:
+        if not self.samples:
+            return self.initial
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(pct / 100 * len(ordered)))
+        return ordered[index]
+
+    def timeout(self) -> float:
+        """Timeout as a multiple of the observed p99, clamped to [min, max]"""
+        if len(self.samples) < 10:
+            return self.max_timeout
+        return max(self.min_timeout, min(self.max_timeout, self.percentile(99) * self.multiplier))
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 8.0) -> float:
+    """Exponential backoff with full jitter for the given (1-based) attempt"""
+    return random.uniform(0, min(cap, base * (2 ** (attempt - 1))))
+
+
+async def hedged(factory: Callable[[], Awaitable[T]], hedge_after: float) -> T:
+    """
+    Run `factory()`, and if it hasn't finished after `hedge_after` seconds,
+    start a second attempt and return whichever succeeds first
+    """
+    first = asyncio.ensure_future(factory())
+    done, _ = await asyncio.wait({first}, timeout=hedge_after)
+    if done:
+        return first.result()
+
+    pending = {first, asyncio.ensure_future(factory())}
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+    finally:
+        for task in pending:
+            task.cancel()
+    raise error
@@ -0,0 +1,101 @@
+"""
+Screener over every tracked symbol.
+
+Reads the shared Symbol rows the scheduler keeps current, so a query is a
+range scan on the indexed `distance_to_ma` column rather than a pass over
+every holding. Symbols no portfolio holds any more are left out; nothing
+refreshes them, so their prices would be frozen.
+"""
+import logging
+from typing import Any, Dict, Optional
+
+from sqlalchemy import exists, func
+from sqlmodel import Session, select
+
+from app.models.models import Stock, Symbol
+
+logger = logging.getLogger(__name__)
+
+SORT_COLUMNS = {
+    "distance": Symbol.distance_to_ma,
+    "price": Symbol.last_price,
+    "days": Symbol.days_below_ma,
+    "symbol": Symbol.symbol,
+}
+MAX_RESULTS = 500
+
+
+def screen(
+    session: Session,
+    min_distance: Optional[float] = None,
+    max_distance: Optional[float] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_days: Optional[int] = None,
+    max_days: Optional[int] = None,
+    sort: str = "distance",
+    descending: bool = False,
+    limit: int = 100,
+    offset: int = 0,
+) -> Dict[str, Any]:
+    """
+    Find tracked symbols by distance to the 200-day SMA, price and days below it
+
+    Args:
+        min_distance / max_distance: Distance to the 200-day SMA in % (inclusive)
+        min_price / max_price: Latest close (inclusive)
+        min_days / max_days: Sessions in a row closed below the SMA (inclusive)
+        sort: One of SORT_COLUMNS
+        descending: Sort largest first
+        limit: Maximum rows to return (capped at MAX_RESULTS)
+        offset: Rows to skip, for paging
+
+    Returns:
+        Dictionary with the total match count and the page of results
+    """
+    if sort not in SORT_COLUMNS:
+        raise ValueError(f"Unknown sort '{sort}'")
+
+    filters = [
+        Symbol.distance_to_ma.is_not(None),
+        # Still held somewhere; a probe of the stock.symbol index per row
+        exists().where(Stock.symbol == Symbol.symbol),
+    ]
+    if min_distance is not None:
+        filters.append(Symbol.distance_to_ma >= min_distance)
+    if max_distance is not None:
+        filters.append(Symbol.distance_to_ma <= max_distance)
+    if min_price is not None:
+        filters.append(Symbol.last_price >= min_price)
+    if max_price is not None:
+        filters.append(Symbol.last_price <= max_price)
+    if min_days is not None:
+        filters.append(Symbol.days_below_ma >= min_days)
+    if max_days is not None:
+        filters.append(Symbol.days_below_ma <= max_days)
+
+    column = SORT_COLUMNS[sort]
+    order = column.desc() if descending else column.asc()
+    total = session.exec(select(func.count()).select_from(Symbol).where(*filters)).one()
+    rows = session.exec(
+        select(Symbol)
+        .where(*filters)
+        .order_by(order.nulls_last(), Symbol.symbol)
+        .offset(max(0, offset))
+        .limit(max(1, min(limit, MAX_RESULTS)))
+    ).all()
+
+    return {
+        "total": total,
+        "results": [
+            {
+                "symbol": row.symbol,
+                "last_price": row.last_price,
+                "ma_200": row.ma_200,
+                "distance_to_ma": row.distance_to_ma,
+                "days_below_ma": row.days_below_ma,
+                "as_of": row.as_of.isoformat() if row.as_of else None,
+            }
+            for row in rows
+        ],
+    }
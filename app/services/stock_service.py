@@ -1,9 +1,70 @@
 import os
+import time
+import asyncio
 import httpx
-from datetime import datetime
-from typing import Dict, Optional, Any
+from datetime import date, datetime
+from typing import Dict, List, Optional, Any, Tuple
 import logging
 
+from app.services.cache import quote_cache
+from app.services.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    LatencyTracker,
+    RateLimitedError,
+    TransientUpstreamError,
+    backoff_delay,
+    hedged,
+)
+from app.utils.metrics import (
+    CIRCUIT_BREAKER_TRANSITIONS,
+    QUOTE_CACHE_REQUESTS,
+    UPSTREAM_ERRORS,
+    UPSTREAM_LATENCY,
+    UPSTREAM_REQUESTS,
+)
+
+# Upstream resilience settings
+UPSTREAM_MAX_ATTEMPTS = int(os.getenv("UPSTREAM_MAX_ATTEMPTS", "3"))
+UPSTREAM_MAX_TIMEOUT = float(os.getenv("UPSTREAM_MAX_TIMEOUT", "10"))
+UPSTREAM_HEDGING = os.getenv("UPSTREAM_HEDGING", "false").lower() == "true"
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "60"))
+
+# Breakers and latency trackers are per upstream function and shared by
+# every StockService instance in the process
+_breakers: Dict[str, CircuitBreaker] = {}
+_latencies: Dict[str, LatencyTracker] = {}
+
+
+def _on_breaker_state_change(function: str, state: str) -> None:
+    CIRCUIT_BREAKER_TRANSITIONS.inc(function=function, state=state)
+    logging.getLogger(__name__).warning("Circuit for %s is now %s", function, state)
+
+
+def get_breaker(function: str) -> CircuitBreaker:
+    breaker = _breakers.get(function)
+    if breaker is None:
+        breaker = _breakers.setdefault(function, CircuitBreaker(
+            function,
+            failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+            reset_timeout=CIRCUIT_RESET_TIMEOUT,
+            on_state_change=_on_breaker_state_change,
+        ))
+    return breaker
+
+
+def open_circuits() -> List[str]:
+    """Upstream functions whose circuit is currently open"""
+    return [function for function, breaker in _breakers.items() if breaker.state == CircuitBreaker.OPEN]
+
+
+def get_latency_tracker(function: str) -> LatencyTracker:
+    tracker = _latencies.get(function)
+    if tracker is None:
+        tracker = _latencies.setdefault(function, LatencyTracker(max_timeout=UPSTREAM_MAX_TIMEOUT))
+    return tracker
+
 class StockService:
     """Service for interacting with stock market APIs"""
     
@@ -11,14 +72,104 @@ class StockService:
         # Using Alpha Vantage API as an example
         # Sign up for a free API key at https://www.alphavantage.co/
         self.api_key = os.getenv("ALPHA_VANTAGE_API_KEY", "demo")
-        self.base_url = "https://www.alphavantage.co/query"
+        self.base_url = os.getenv("ALPHA_VANTAGE_BASE_URL", "https://www.alphavantage.co/query")
 
         # Set up logging
         self.logger = logging.getLogger(__name__)
     
+    async def _fetch(self, client: httpx.AsyncClient, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Call the upstream API through the circuit breaker for its function
+
+        Transient failures (timeouts, connection errors, 5xx) are retried with
+        jittered backoff. Timeouts follow the observed latency of the function,
+        and with UPSTREAM_HEDGING a second request is sent when the first is
+        slower than the usual p95.
+        """
+        function = params["function"]
+        breaker = get_breaker(function)
+        tracker = get_latency_tracker(function)
+        
+        for attempt in range(1, UPSTREAM_MAX_ATTEMPTS + 1):
+            if not breaker.allow():
+                UPSTREAM_ERRORS.inc(function=function, reason="circuit_open")
+                raise CircuitOpenError(function)
+            
+            UPSTREAM_REQUESTS.inc(function=function)
+            timeout = tracker.timeout()
+            start = time.perf_counter()
+            try:
+                request = lambda: client.get(self.base_url, params=params, timeout=timeout)
+                # A half-open trial call must stay a single request
+                if UPSTREAM_HEDGING and len(tracker.samples) >= 10 and breaker.state != breaker.HALF_OPEN:
+                    response = await hedged(request, hedge_after=tracker.percentile(95))
+                else:
+                    response = await request()
+                
+                elapsed = time.perf_counter() - start
+                tracker.observe(elapsed)
+                UPSTREAM_LATENCY.observe(elapsed, function=function)
+                
+                if response.status_code == 429:
+                    raise RateLimitedError(f"{function} returned 429")
+                if response.status_code >= 500:
+                    raise TransientUpstreamError(f"{function} returned {response.status_code}")
+                
+                data = response.json()
+                # Alpha Vantage reports throttling in the body of a 200 response
+                if "Note" in data or "Information" in data:
+                    raise RateLimitedError(data.get("Note") or data.get("Information"))
+                
+                breaker.record_success()
+                return data
+            
+            except RateLimitedError:
+                # Retrying within the same minute won't help
+                breaker.record_failure()
+                UPSTREAM_ERRORS.inc(function=function, reason="rate_limited")
+                raise
+            
+            except (httpx.TimeoutException, httpx.TransportError, TransientUpstreamError) as e:
+                if isinstance(e, httpx.TimeoutException):
+                    tracker.observe(timeout)
+                breaker.record_failure()
+                UPSTREAM_ERRORS.inc(function=function, reason="transient")
+                if attempt >= UPSTREAM_MAX_ATTEMPTS:
+                    raise
+                await asyncio.sleep(backoff_delay(attempt))
+            
+            except Exception:
+                UPSTREAM_ERRORS.inc(function=function, reason="exception")
+                raise
+    
     async def get_stock_data(self, symbol: str) -> Dict[str, Any]:
         """
         Get current stock price and 200-day moving average
+        
+        Fresh results are served from the quote cache. When the upstream call
+        fails (or the circuit is open) the last known result is returned with
+        `stale` set instead of an empty one.
+        """
+        cache_key = symbol.upper()
+        # Concurrent lookups (in any worker sharing the cache) wait for one fetch
+        result, fetched = await quote_cache.get_or_compute(
+            cache_key,
+            lambda: self._fetch_stock_data(symbol),
+            cacheable=lambda data: data["price"] is not None,
+        )
+        QUOTE_CACHE_REQUESTS.inc(result="miss" if fetched else "hit")
+        if result["price"] is not None:
+            return result
+        
+        stale = await quote_cache.offload(quote_cache.get_stale, cache_key)
+        if stale is not None:
+            QUOTE_CACHE_REQUESTS.inc(result="stale")
+            return {**stale, "stale": True}
+        return result
+    
+    async def _fetch_stock_data(self, symbol: str) -> Dict[str, Any]:
+        """
+        Fetch current stock price and 200-day moving average from the API
         """
         async with httpx.AsyncClient() as client:
             try:
@@ -32,12 +183,12 @@ class StockService:
                     "apikey": self.api_key
                 }
                 
-                sma_response = await client.get(self.base_url, params=params, timeout=10.0)
-                sma_data = sma_response.json()
+                sma_data = await self._fetch(client, params)
                 
                 # Check if we got valid data
                 if "Technical Analysis: SMA" not in sma_data:
-                    self.logger.warning(f"Invalid SMA data for {symbol}: {sma_data}")
+                    UPSTREAM_ERRORS.inc(function="SMA", reason="invalid")
+                    self.logger.warning("Invalid SMA data for %s: %s", symbol, sma_data)
                     # Return None values rather than zeros
                     return {
                         "symbol": symbol,
@@ -54,12 +205,12 @@ class StockService:
                     "apikey": self.api_key
                 }
                 
-                quote_response = await client.get(self.base_url, params=quote_params, timeout=10.0)
-                quote_data = quote_response.json()
+                quote_data = await self._fetch(client, quote_params)
                 
                 # Check if we got valid quote data
                 if "Global Quote" not in quote_data or not quote_data["Global Quote"]:
-                    self.logger.warning(f"Invalid quote data for {symbol}: {quote_data}")
+                    UPSTREAM_ERRORS.inc(function="GLOBAL_QUOTE", reason="invalid")
+                    self.logger.warning("Invalid quote data for %s: %s", symbol, quote_data)
                     # Return None values rather than zeros
                     return {
                         "symbol": symbol,
@@ -74,7 +225,7 @@ class StockService:
                 
                 # Make sure we have a valid price
                 if current_price <= 0:
-                    self.logger.warning(f"Invalid price ({current_price}) for {symbol}")
+                    self.logger.warning("Invalid price (%s) for %s", current_price, symbol)
                     current_price = None
                 
                 # Get the latest SMA value
@@ -87,10 +238,10 @@ class StockService:
                     try:
                         ma_200 = float(technical_data[latest_date]["SMA"])
                         if ma_200 <= 0:
-                            self.logger.warning(f"Invalid MA ({ma_200}) for {symbol}")
+                            self.logger.warning("Invalid MA (%s) for %s", ma_200, symbol)
                             ma_200 = None
                     except (ValueError, KeyError):
-                        self.logger.error(f"Could not parse SMA value for {symbol}")
+                        self.logger.error("Could not parse SMA value for %s", symbol)
                 
                 # Calculate distance to MA (percentage)
                 distance_to_ma = None
@@ -106,8 +257,19 @@ class StockService:
                     "timestamp": datetime.now()
                 }
                     
+            except CircuitOpenError as e:
+                # Fail fast without logging every symbol while the upstream is down
+                self.logger.debug("Circuit open for %s, skipping %s", e, symbol)
+                return {
+                    "symbol": symbol,
+                    "price": None,
+                    "ma_200": None,
+                    "distance_to_ma": None,
+                    "timestamp": datetime.now()
+                }
+            
             except Exception as e:
-                self.logger.error(f"API error for {symbol}: {str(e)}")
+                self.logger.error("API error for %s: %s", symbol, e)
                 # Don't use mock data in production, return None values instead
                 return {
                     "symbol": symbol,
@@ -117,6 +279,75 @@ class StockService:
                     "timestamp": datetime.now()
                 }
     
+    async def get_daily_series(self, symbol: str, full: bool = False) -> List[Tuple[date, float, Optional[int]]]:
+        """
+        Get daily closes for a symbol, oldest first
+
+        Args:
+            symbol: Stock symbol
+            full: Request the full history instead of the latest 100 bars
+
+        Returns:
+            List of (day, close, volume) tuples; empty if the API returned no data
+        """
+        params = {
+            "function": "TIME_SERIES_DAILY",
+            "symbol": symbol,
+            "outputsize": "full" if full else "compact",
+            "apikey": self.api_key
+        }
+
+        async with httpx.AsyncClient() as client:
+            data = await self._fetch(client, params)
+
+        series = data.get("Time Series (Daily)")
+        if not series:
+            UPSTREAM_ERRORS.inc(function="TIME_SERIES_DAILY", reason="invalid")
+            self.logger.warning("Invalid daily series for %s: %s", symbol, data)
+            return []
+
+        bars = []
+        for day, values in series.items():
+            try:
+                close = float(values["4. close"])
+                volume = int(float(values["5. volume"])) if "5. volume" in values else None
+                bars.append((date.fromisoformat(day), close, volume))
+            except (ValueError, KeyError):
+                self.logger.error("Could not parse daily bar %s for %s", day, symbol)
+
+        bars.sort(key=lambda bar: bar[0])
+        return bars
+
+    async def download_listing(self, path: str) -> int:
+        """
+        Download the active symbol listing (LISTING_STATUS) to a local CSV file
+
+        Returns:
+            int: Number of bytes written
+        """
+        params = {
+            "function": "LISTING_STATUS",
+            "state": "active",
+            "apikey": self.api_key
+        }
+
+        async with httpx.AsyncClient() as client:
+            response = await client.get(self.base_url, params=params, timeout=60.0)
+            response.raise_for_status()
+
+        # Errors and rate limit notes come back as JSON with a 200 status
+        if not response.content.lstrip().lower().startswith(b"symbol"):
+            raise ValueError(f"Unexpected listing response: {response.text[:200]}")
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(response.content)
+        os.replace(tmp_path, path)
+
+        self.logger.info("Downloaded symbol listing to %s", path)
+        return len(response.content)
+
     def _get_mock_data(self, symbol: str) -> Dict[str, Any]:
         """Return mock data for demo purposes"""
         import random
@@ -0,0 +1,159 @@
+"""
+Local symbol universe for instant symbol validation and autocomplete.
+
+The universe is loaded from a listing file in the Alpha Vantage
+LISTING_STATUS CSV format (symbol,name,exchange,assetType,...) and kept in
+sorted lists so prefix lookups are a binary search.
+"""
+import bisect
+import csv
+import itertools
+import logging
+import os
+import threading
+from typing import Dict, List, Optional
+
+from app.utils.helpers import validate_stock_symbol
+
+SYMBOL_LISTING_PATH = os.getenv("SYMBOL_LISTING_PATH", "./data/listing_status.csv")
+
+logger = logging.getLogger(__name__)
+
+
+class SymbolIndex:
+    """Sorted prefix index over the listed symbol universe"""
+
+    def __init__(self, listing_path: str = SYMBOL_LISTING_PATH):
+        self.listing_path = listing_path
+        self._symbols: List[str] = []
+        self._names: List[tuple] = []  # (lowercase name, symbol), sorted
+        self._info: Dict[str, Dict[str, str]] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded and bool(self._symbols)
+
+    def __len__(self) -> int:
+        return len(self._symbols)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol.upper() in self._info
+
+    def load(self, listing_path: Optional[str] = None) -> int:
+        """
+        Load (or reload) the symbol universe from a listing file
+
+        Returns:
+            int: Number of symbols loaded
+        """
+        path = listing_path or self.listing_path
+        info: Dict[str, Dict[str, str]] = {}
+
+        try:
+            with open(path, newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    symbol = (row.get("symbol") or "").strip().upper()
+                    if not symbol:
+                        continue
+                    # Skip delisted entries when the listing includes them
+                    if row.get("status") and row["status"].strip().lower() != "active":
+                        continue
+                    info[symbol] = {
+                        "symbol": symbol,
+                        "name": (row.get("name") or "").strip(),
+                        "exchange": (row.get("exchange") or "").strip(),
+                    }
+        except FileNotFoundError:
+            logger.warning("Symbol listing not found at %s, falling back to format validation", path)
+
+        self._install(info, path)
+        logger.info("Loaded %s symbols from %s", len(info), path)
+        return len(info)
+
+    def _install(self, info: Dict[str, Dict[str, str]], path: str) -> None:
+        symbols = sorted(info)
+        names = sorted((entry["name"].lower(), symbol) for symbol, entry in info.items() if entry["name"])
+
+        with self._lock:
+            self.listing_path = path
+            self._info = info
+            self._symbols = symbols
+            self._names = names
+            self._loaded = True
+
+    def snapshot(self) -> Dict[str, Dict[str, str]]:
+        """Listing details keyed by symbol, for the warm-start cache snapshot"""
+        return dict(self._info)
+
+    def restore(self, info: Dict[str, Dict[str, str]]) -> int:
+        """
+        Install a universe saved with `snapshot()`
+
+        Returns:
+            int: Number of symbols restored
+        """
+        self._install(dict(info), self.listing_path)
+        return len(info)
+
+    def ensure_loaded(self) -> None:
+        """Load the listing on first use"""
+        if not self._loaded:
+            self.load()
+
+    def is_valid(self, symbol: str) -> bool:
+        """
+        Check whether a symbol exists in the universe
+
+        Falls back to format validation when no listing is available.
+        """
+        self.ensure_loaded()
+        symbol = symbol.strip().upper()
+        if not self._symbols:
+            return validate_stock_symbol(symbol)
+        return symbol in self._info
+
+    def get(self, symbol: str) -> Optional[Dict[str, str]]:
+        """Return listing details for a symbol, if known"""
+        self.ensure_loaded()
+        return self._info.get(symbol.strip().upper())
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, str]]:
+        """
+        Return symbols whose ticker or company name starts with the query
+
+        Ticker matches are returned first, followed by name matches.
+        """
+        self.ensure_loaded()
+        query = query.strip()
+        if not query or limit <= 0:
+            return []
+
+        results: List[Dict[str, str]] = []
+        seen = set()
+
+        prefix = query.upper()
+        start = bisect.bisect_left(self._symbols, prefix)
+        for symbol in self._symbols[start:start + limit]:
+            if not symbol.startswith(prefix):
+                break
+            seen.add(symbol)
+            results.append(self._info[symbol])
+
+        if len(results) < limit:
+            name_prefix = query.lower()
+            start = bisect.bisect_left(self._names, (name_prefix, ""))
+            # Walk the tail lazily; slicing would copy it on every keystroke
+            for name, symbol in itertools.islice(self._names, start, None):
+                if not name.startswith(name_prefix) or len(results) >= limit:
+                    break
+                if symbol not in seen:
+                    seen.add(symbol)
+                    results.append(self._info[symbol])
+
+        return results
+
+
+# Shared index used by the routes
+symbol_index = SymbolIndex()
@@ -0,0 +1,223 @@
+"""
+Admission control for routes that fan out to the market data API.
+
+Refreshing or checking a portfolio makes one upstream call per symbol, so a
+few users clicking repeatedly can use up the API quota the scheduler needs.
+`AdmissionMiddleware` puts those routes behind:
+
+- a global cap on requests in progress, with a short bounded queue; requests
+  that can't get a slot in time are shed with 503
+- a per-user cap; a user over it gets 429
+- coalescing: a repeat of a request the same user already has in progress
+  for the same portfolio waits for it and gets the same response
+
+Rejections carry a Retry-After estimated from recent request durations.
+Users are identified from the session cookie's subject without a database
+round trip, falling back to the client address.
+"""
+import asyncio
+import logging
+import math
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from jose import JWTError, jwt
+from starlette.requests import HTTPConnection
+from starlette.responses import PlainTextResponse
+
+from app.services.auth_service import ALGORITHM, SECRET_KEY
+from app.utils.metrics import ADMISSION_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# Expensive requests in progress at once, across all users
+MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "4"))
+# Expensive requests in progress at once for one user
+MAX_PER_USER = int(os.getenv("ADMISSION_MAX_PER_USER", "1"))
+# Requests allowed to wait for a slot, and for how long
+MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "16"))
+QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))
+
+# (method, path pattern, route name); the first group is the portfolio id
+EXPENSIVE_ROUTES = (
+    ("GET", re.compile(r"^/portfolio/(\d+)/refresh$"), "refresh"),
+    ("GET", re.compile(r"^/portfolio/(\d+)/check-alerts$"), "check-alerts"),
+)
+
+# Largest response kept for replaying to coalesced requests
+_MAX_REPLAY_BYTES = 64 * 1024
+
+
+class _Flight:
+    """A request in progress, and its response once it has finished"""
+
+    def __init__(self):
+        self.done = asyncio.Event()
+        self.messages: Optional[List[Dict[str, Any]]] = []
+        self.size = 0
+
+    def record(self, message: Dict[str, Any]) -> None:
+        if self.messages is None:
+            return
+        self.size += len(message.get("body", b""))
+        if self.size > _MAX_REPLAY_BYTES:
+            self.messages = None
+        else:
+            self.messages.append(message)
+
+
+class AdmissionController:
+    """Concurrency caps, queueing and coalescing for expensive requests"""
+
+    def __init__(
+        self,
+        max_concurrent: int = MAX_CONCURRENT,
+        max_per_user: int = MAX_PER_USER,
+        max_queue: int = MAX_QUEUE,
+        queue_timeout: float = QUEUE_TIMEOUT,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_per_user = max_per_user
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.queued = 0
+        self._per_user: Dict[str, int] = {}
+        self._flights: Dict[Tuple[str, str, str], _Flight] = {}
+        self._slots: Optional[asyncio.Semaphore] = None
+        # Moving average of how long an admitted request takes, for Retry-After
+        self._avg_duration = 1.0
+
+    @property
+    def slots(self) -> asyncio.Semaphore:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+        return self._slots
+
+    def retry_after(self) -> int:
+        """Seconds until the backlog ahead of a new request should have drained"""
+        waves = 1 + self.queued / max(1, self.max_concurrent)
+        return max(1, math.ceil(self._avg_duration * waves))
+
+    def backlog(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+        }
+
+    @property
+    def saturated(self) -> bool:
+        """Whether new expensive requests would be shed right away"""
+        return self.active + self.queued >= self.max_concurrent + self.max_queue
+
+    async def _acquire(self) -> bool:
+        if self.saturated:
+            return False
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self.slots.acquire(), self.queue_timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.queued -= 1
+
+    async def handle(self, scope, receive, send, app, route: str, portfolio_id: str, user: str) -> None:
+        key = (user, route, portfolio_id)
+        # Wait for the same request in progress; if it had no response to share, go through admission
+        while (flight := self._flights.get(key)) is not None:
+            await flight.done.wait()
+            if flight.messages:
+                ADMISSION_REQUESTS.inc(route=route, outcome="coalesced")
+                for message in flight.messages:
+                    await send(message)
+                return
+
+        if self._per_user.get(user, 0) >= self.max_per_user:
+            ADMISSION_REQUESTS.inc(route=route, outcome="user_limited")
+            await self._reject(scope, receive, send, 429, "You already have a check in progress")
+            return
+
+        self._per_user[user] = self._per_user.get(user, 0) + 1
+        flight = self._flights[key] = _Flight()
+        try:
+            if not await self._acquire():
+                ADMISSION_REQUESTS.inc(route=route, outcome="shed")
+                logger.warning("Shedding %s for portfolio %s: %s", route, portfolio_id, self.backlog())
+                flight.messages = None
+                await self._reject(scope, receive, send, 503, "Too many checks in progress")
+                return
+
+            ADMISSION_REQUESTS.inc(route=route, outcome="admitted")
+            self.active += 1
+            start = time.perf_counter()
+
+            async def send_wrapper(message):
+                flight.record(message)
+                await send(message)
+
+            try:
+                await app(scope, receive, send_wrapper)
+            except BaseException:
+                flight.messages = None
+                raise
+            finally:
+                self.active -= 1
+                self.slots.release()
+                self._avg_duration = 0.8 * self._avg_duration + 0.2 * (time.perf_counter() - start)
+        finally:
+            self._per_user[user] -= 1
+            if not self._per_user[user]:
+                del self._per_user[user]
+            del self._flights[key]
+            flight.done.set()
+
+    async def _reject(self, scope, receive, send, status_code: int, reason: str) -> None:
+        retry_after = self.retry_after()
+        response = PlainTextResponse(
+            f"{reason}, please retry in {retry_after} seconds",
+            status_code=status_code,
+            headers={"Retry-After": str(retry_after)},
+        )
+        await response(scope, receive, send)
+
+
+def _user_key(scope) -> str:
+    """The signed-in user's subject, or the client address when there is none"""
+    connection = HTTPConnection(scope)
+    token = connection.cookies.get("access_token")
+    if token:
+        try:
+            subject = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+            if subject:
+                return f"user:{subject}"
+        except JWTError:
+            pass
+    return f"client:{connection.client.host if connection.client else 'unknown'}"
+
+
+# Shared so the readiness endpoint can report the backlog
+admission = AdmissionController()
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying `admission` to EXPENSIVE_ROUTES"""
+
+    def __init__(self, app, controller: AdmissionController = admission):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            for method, pattern, route in EXPENSIVE_ROUTES:
+                match = pattern.match(scope["path"]) if scope["method"] == method else None
+                if match:
+                    await self.controller.handle(
+                        scope, receive, send, self.app, route, match.group(1), _user_key(scope)
+                    )
+                    return
+        await self.app(scope, receive, send)
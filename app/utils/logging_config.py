@@ -0,0 +1,189 @@
+"""
+Logging setup for the Stock Portfolio Tracker application.
+
+Records are handed to a queue by the calling thread and formatted and written
+by a listener thread, so logging never blocks a request or a sweep on I/O.
+Configuration comes from environment variables:
+
+- LOG_LEVEL: root level (default INFO)
+- LOG_LEVELS: per-logger levels, e.g. "sqlalchemy.engine=INFO,app.scheduler=DEBUG"
+- LOG_FORMAT: "json" for structured records or "text" (default); text
+  lines end with the `extra` fields as key=value pairs
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Attributes present on every LogRecord; anything else came from `extra`
+# (uvicorn's color_message just repeats the message for its own formatter)
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "color_message"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def record_extras(record: logging.LogRecord) -> Dict[str, Any]:
+    """Fields passed to the logging call with `extra=`"""
+    return {
+        key: value for key, value in record.__dict__.items()
+        if key not in _RESERVED_ATTRS and not key.startswith("_")
+    }
+
+
+class TextFormatter(logging.Formatter):
+    """TEXT_FORMAT followed by the `extra` fields as key=value pairs"""
+
+    def __init__(self, fmt: str = TEXT_FORMAT):
+        super().__init__(fmt)
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        line = super().formatMessage(record)
+        pairs = []
+        for key, value in record_extras(record).items():
+            value = str(value)
+            # Quote values that would otherwise run into the next pair
+            if not value or any(char.isspace() or char in "\"=" for char in value):
+                value = json.dumps(value)
+            pairs.append(f"{key}={value}")
+        return f"{line} {' '.join(pairs)}" if pairs else line
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as single-line JSON objects including `extra` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        payload.update(record_extras(record))
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that leaves message formatting to the listener thread
+
+    The stock QueueHandler renders the message in the calling thread so the
+    record can be pickled; our queue is in-process, so the record is passed
+    through untouched.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def parse_levels(spec: str) -> Dict[str, str]:
+    """Parse "logger=LEVEL,other=LEVEL" into a dictionary"""
+    levels = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        name, level = item.split("=", 1)
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging() -> None:
+    """Install the queue handler on the root logger and start the listener"""
+    global _listener
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler()
+    if os.getenv("LOG_FORMAT", "text").lower() == "json":
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(TextFormatter())
+
+    log_queue: queue.Queue = queue.Queue(-1)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(DeferredQueueHandler(log_queue))
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+    # Quiet chatty libraries by default; LOG_LEVELS can override
+    levels = {"sqlalchemy.engine": "WARNING", "httpx": "WARNING"}
+    levels.update(parse_levels(os.getenv("LOG_LEVELS", "")))
+    for name, level in levels.items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class SampledLogger:
+    """
+    Rate-limited wrapper for per-symbol messages in hot loops
+
+    DEBUG and INFO messages are limited to `rate` records per second for each
+    message template; the number of suppressed records is attached to the
+    next record that gets through. WARNING and above always pass.
+    """
+
+    def __init__(self, logger: logging.Logger, rate: Optional[float] = None):
+        self.logger = logger
+        self.rate = rate if rate is not None else float(os.getenv("LOG_SAMPLE_RATE", "5"))
+        self._state: Dict[str, list] = {}  # template -> [tokens, last refill, suppressed]
+        self._lock = threading.Lock()
+
+    def _allow(self, template: str) -> int:
+        """Return -1 to drop the record, otherwise the suppressed count to report"""
+        now = time.monotonic()
+        with self._lock:
+            state = self._state.get(template)
+            if state is None:
+                state = self._state[template] = [max(1.0, self.rate), now, 0]
+            tokens = min(max(1.0, self.rate), state[0] + (now - state[1]) * self.rate)
+            state[1] = now
+            if tokens < 1:
+                state[0] = tokens
+                state[2] += 1
+                return -1
+            state[0] = tokens - 1
+            suppressed, state[2] = state[2], 0
+            return suppressed
+
+    def _log(self, level: int, msg: str, args, kwargs) -> None:
+        if not self.logger.isEnabledFor(level):
+            return
+        suppressed = self._allow(msg)
+        if suppressed < 0:
+            return
+        if suppressed:
+            kwargs.setdefault("extra", {})["suppressed"] = suppressed
+        self.logger.log(level, msg, *args, stacklevel=3, **kwargs)
+
+    def debug(self, msg: str, *args, **kwargs) -> None:
+        self._log(logging.DEBUG, msg, args, kwargs)
+
+    def info(self, msg: str, *args, **kwargs) -> None:
+        self._log(logging.INFO, msg, args, kwargs)
+
+    def warning(self, msg: str, *args, **kwargs) -> None:
+        self.logger.warning(msg, *args, stacklevel=2, **kwargs)
+
+    def error(self, msg: str, *args, **kwargs) -> None:
+        self.logger.error(msg, *args, stacklevel=2, **kwargs)
@@ -0,0 +1,6 @@
+"""
+Benchmarks for the Stock Portfolio Tracker application.
+
+Run `python -m benchmarks.bench_alerts --help` or `python -m benchmarks.load_web --help`
+for options.
+"""
@@ -0,0 +1,298 @@
+"""
+Benchmark the alert pipeline against synthetic portfolios.
+
+Seeds a throwaway database, starts a fake market-data server with injected
+latency and runs the sweep and portfolio routes, reporting throughput,
+p50/p99 latency, DB statement counts and peak memory. Results can be saved
+as a baseline and compared on later runs:
+
+    python -m benchmarks.bench_alerts --holdings 1000 --save-baseline
+    python -m benchmarks.bench_alerts --holdings 1000 --fail-on-regression
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the MA alert pipeline")
+    parser.add_argument("--holdings", type=int, default=1000, help="Total holdings to generate (1k to 1M)")
+    parser.add_argument("--holdings-per-portfolio", type=int, default=20)
+    parser.add_argument("--symbols", type=int, default=500, help="Size of the distinct symbol universe")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Injected upstream latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of upstream calls that fail")
+    parser.add_argument("--notification-latency-ms", type=float, default=5.0)
+    parser.add_argument("--sweeps", type=int, default=1, help="Iterations of check_stock_alerts")
+    parser.add_argument("--samples", type=int, default=20, help="Iterations of the per-portfolio scenarios")
+    parser.add_argument("--scenarios", default="sweep,manual,page,refresh",
+                        help="Comma-separated subset of sweep,manual,page,refresh")
+    parser.add_argument("--database-url", default=None,
+                        help="Database to seed (defaults to a temporary SQLite file)")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc pass")
+    parser.add_argument("--baseline", default=None, help="Baseline name (default: alerts-<holdings>)")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed relative regression before a result is flagged")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    return parser.parse_args(argv)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class StatementCounter:
+    """Counts statements executed through an engine"""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args) -> None:
+        self.count += 1
+
+    def reset(self) -> int:
+        count, self.count = self.count, 0
+        return count
+
+
+class FakeNotificationService:
+    """Stands in for NotificationAPI with a fixed send latency"""
+
+    def __init__(self, latency_ms: float):
+        self.latency_ms = latency_ms
+        self.sent = 0
+
+    async def send_ma_alert(self, user_email: str, stock_data: Dict[str, Any]) -> bool:
+        await asyncio.sleep(self.latency_ms / 1000)
+        self.sent += 1
+        return True
+
+    async def send_test_notification(self, user_email: str) -> bool:
+        return await self.send_ma_alert(user_email, {})
+
+
+async def measure(
+    name: str,
+    run: Callable[[int], Awaitable[Any]],
+    iterations: int,
+    units_per_iteration: float,
+    statements: StatementCounter,
+    track_memory: bool,
+    before: Optional[Callable[[], None]] = None,
+) -> Dict[str, Any]:
+    """Time `iterations` runs of a scenario, then optionally one traced run for peak memory"""
+    latencies = []
+    statement_counts = []
+
+    for i in range(iterations):
+        if before:
+            before()
+        statements.reset()
+        start = time.perf_counter()
+        await run(i)
+        latencies.append(time.perf_counter() - start)
+        statement_counts.append(statements.reset())
+
+    peak_memory = None
+    if track_memory:
+        if before:
+            before()
+        tracemalloc.start()
+        await run(0)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        statements.reset()
+
+    total = sum(latencies)
+    return {
+        "scenario": name,
+        "iterations": iterations,
+        "throughput_per_s": (units_per_iteration * iterations / total) if total else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        "statements_per_iteration": statistics.fmean(statement_counts) if statement_counts else 0.0,
+        "peak_memory_kb": peak_memory / 1024 if peak_memory is not None else None,
+    }
+
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Return human-readable regressions relative to a saved baseline"""
+    regressions = []
+    previous = {entry["scenario"]: entry for entry in baseline.get("results", [])}
+    for result in results:
+        before = previous.get(result["scenario"])
+        if not before:
+            continue
+        checks = [
+            ("p50_ms", True),
+            ("p99_ms", True),
+            ("statements_per_iteration", True),
+            ("peak_memory_kb", True),
+            ("throughput_per_s", False),
+        ]
+        for key, lower_is_better in checks:
+            old, new = before.get(key), result.get(key)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (lower_is_better and change > tolerance) or (not lower_is_better and change < -tolerance):
+                regressions.append(f"{result['scenario']}.{key}: {old:.2f} -> {new:.2f} ({change:+.0%})")
+    return regressions
+
+
+def print_results(results: List[Dict[str, Any]]) -> None:
+    header = f"{'scenario':<10} {'iters':>5} {'thru/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'stmts':>9} {'peak KB':>10}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        peak = f"{r['peak_memory_kb']:.0f}" if r["peak_memory_kb"] is not None else "-"
+        print(
+            f"{r['scenario']:<10} {r['iterations']:>5} {r['throughput_per_s']:>10.1f} "
+            f"{r['p50_ms']:>10.1f} {r['p99_ms']:>10.1f} {r['statements_per_iteration']:>9.1f} {peak:>10}"
+        )
+
+
+async def run_benchmarks(args: argparse.Namespace, base_url: str) -> List[Dict[str, Any]]:
+    # App modules read their configuration at import time
+    import httpx
+    from sqlalchemy import update
+
+    from app.models.models import Portfolio, Stock, Symbol, create_db_and_tables, get_engine
+    from app.services.auth_service import create_access_token
+    from benchmarks.synthetic import seed_database
+
+    engine = get_engine()
+    create_db_and_tables()
+
+    seed_start = time.perf_counter()
+    seeded = seed_database(
+        engine,
+        holdings=args.holdings,
+        holdings_per_portfolio=args.holdings_per_portfolio,
+        symbols=args.symbols,
+    )
+    print(f"Seeded {seeded['holdings']} holdings in {seeded['portfolios']} portfolios "
+          f"({time.perf_counter() - seed_start:.1f}s)")
+
+    from app.scheduler import jobs
+    from app.main import app
+
+    jobs.notification_service = FakeNotificationService(args.notification_latency_ms)
+
+    statements = StatementCounter(engine)
+    scenarios = set(args.scenarios.split(","))
+    track_memory = not args.no_memory
+    rng = random.Random(1)
+    owners = seeded["owners"]
+    sample = [rng.choice(owners) for _ in range(args.samples)]
+    holdings_per_portfolio = seeded["holdings"] / seeded["portfolios"]
+    results = []
+
+    def reset_stocks():
+        with engine.begin() as conn:
+            conn.execute(update(Stock).values(notification_sent=False))
+            conn.execute(update(Symbol).values(last_checked=None))
+            conn.execute(update(Portfolio).values(sweep_claimed_at=None))
+
+    if "sweep" in scenarios:
+        results.append(await measure(
+            "sweep", lambda i: jobs.check_stock_alerts(), args.sweeps,
+            seeded["holdings"], statements, track_memory, before=reset_stocks,
+        ))
+
+    if "manual" in scenarios:
+        results.append(await measure(
+            "manual", lambda i: jobs.manual_check_portfolio_stocks(sample[i][0]), len(sample),
+            holdings_per_portfolio, statements, track_memory,
+        ))
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        def request(path_for):
+            async def run(i):
+                portfolio_id, pin = sample[i]
+                client.cookies.set("access_token", create_access_token({"sub": pin}))
+                response = await client.get(path_for(portfolio_id))
+                if response.status_code >= 400:
+                    raise RuntimeError(f"{response.status_code} from {response.request.url}")
+            return run
+
+        if "page" in scenarios:
+            results.append(await measure(
+                "page", request(lambda pid: "/portfolio"), len(sample),
+                1, statements, track_memory,
+            ))
+
+        if "refresh" in scenarios:
+            results.append(await measure(
+                "refresh", request(lambda pid: f"/portfolio/{pid}/refresh"), len(sample),
+                holdings_per_portfolio, statements, track_memory,
+            ))
+
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="ma200-bench-")
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{workdir}/bench.db"
+    os.environ.setdefault("NOTIFICATIONAPI_CLIENT_ID", "bench")
+    os.environ.setdefault("NOTIFICATIONAPI_CLIENT_SECRET", "bench")
+
+    from benchmarks.fake_market import FakeMarket, FakeMarketServer
+
+    market = FakeMarket(latency_ms=args.latency_ms, error_rate=args.error_rate)
+    with FakeMarketServer(market) as server:
+        os.environ["ALPHA_VANTAGE_BASE_URL"] = server.base_url
+        results = asyncio.run(run_benchmarks(args, server.base_url))
+
+    print_results(results)
+    print(f"Upstream requests served: {market.requests}")
+
+    name = args.baseline or f"alerts-{args.holdings}"
+    path = os.path.join(BASELINE_DIR, f"{name}.json")
+    report = {"name": name, "args": {k: v for k, v in vars(args).items() if k != "save_baseline"}, "results": results}
+
+    status = 0
+    if os.path.exists(path):
+        with open(path) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"Regressions against baseline {name}:")
+            for line in regressions:
+                print(f"  {line}")
+            if args.fail_on_regression:
+                status = 1
+        else:
+            print(f"No regressions against baseline {name}")
+
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline to {path}")
+
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
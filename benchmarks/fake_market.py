@@ -0,0 +1,156 @@
+"""
+Fake Alpha Vantage server for benchmarks and load tests.
+
+Serves deterministic SMA, GLOBAL_QUOTE and TIME_SERIES_DAILY responses from
+`/query` with configurable injected latency and error rate, so the app can be
+exercised without touching the real API.
+"""
+import asyncio
+import random
+import socket
+import threading
+import time
+import zlib
+from datetime import date, timedelta
+from typing import Optional
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+
+def symbol_seed(symbol: str) -> int:
+    return zlib.crc32(symbol.encode())
+
+
+def symbol_prices(symbol: str):
+    """Deterministic (price, 200-day SMA) pair for a symbol"""
+    rng = random.Random(symbol_seed(symbol))
+    ma_200 = rng.uniform(10, 500)
+    # Spread prices around the MA so a share of symbols lands in the alert band
+    price = ma_200 * (1 + rng.uniform(-0.25, 0.25))
+    return round(price, 2), round(ma_200, 4)
+
+
+def symbol_series(symbol: str, bars: int):
+    """Deterministic daily closes (oldest first) oscillating around the symbol's MA and ending at its price"""
+    price, ma_200 = symbol_prices(symbol)
+    rng = random.Random(symbol_seed(symbol) + 1)
+    closes = [round(ma_200 * (1 + rng.uniform(-0.05, 0.05)), 4) for _ in range(bars - 1)]
+    closes.append(price)
+    return closes
+
+
+class FakeMarket:
+    """Fake market data API with injected latency and errors"""
+
+    def __init__(self, latency_ms: float = 50.0, jitter_ms: float = 10.0, error_rate: float = 0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.requests = 0
+        self._rng = random.Random(0)
+        self.app = Starlette(routes=[Route("/query", self.query)])
+
+    async def query(self, request: Request):
+        self.requests += 1
+        delay = max(0.0, self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms))
+        await asyncio.sleep(delay / 1000)
+
+        if self.error_rate and self._rng.random() < self.error_rate:
+            return JSONResponse({"Note": "Thank you for using Alpha Vantage! (simulated rate limit)"})
+
+        function = request.query_params.get("function")
+        symbol = request.query_params.get("symbol", "").upper()
+        price, ma_200 = symbol_prices(symbol)
+        today = date.today()
+
+        if function == "SMA":
+            return JSONResponse({
+                "Meta Data": {"1: Symbol": symbol, "2: Indicator": "Simple Moving Average (SMA)"},
+                "Technical Analysis: SMA": {
+                    (today - timedelta(days=offset)).isoformat(): {"SMA": f"{ma_200 * (1 - offset * 0.001):.4f}"}
+                    for offset in range(5)
+                },
+            })
+
+        if function == "GLOBAL_QUOTE":
+            return JSONResponse({
+                "Global Quote": {
+                    "01. symbol": symbol,
+                    "05. price": f"{price:.4f}",
+                    "07. latest trading day": today.isoformat(),
+                }
+            })
+
+        if function == "TIME_SERIES_DAILY":
+            bars = 1000 if request.query_params.get("outputsize") == "full" else 100
+            closes = symbol_series(symbol, bars)
+            return JSONResponse({
+                "Meta Data": {"2. Symbol": symbol},
+                "Time Series (Daily)": {
+                    (today - timedelta(days=offset)).isoformat(): {
+                        "4. close": f"{close:.4f}",
+                        "5. volume": "1000000",
+                    }
+                    for offset, close in enumerate(reversed(closes))
+                },
+            })
+
+        return JSONResponse({"Error Message": f"Unsupported function {function}"})
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class FakeMarketServer:
+    """Runs a FakeMarket on a local port in a background thread"""
+
+    def __init__(self, market: FakeMarket, port: Optional[int] = None):
+        self.market = market
+        self.port = port or _free_port()
+        self.server = uvicorn.Server(uvicorn.Config(
+            market.app, host="127.0.0.1", port=self.port, log_level="warning", access_log=False
+        ))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/query"
+
+    def start(self) -> "FakeMarketServer":
+        self.thread.start()
+        deadline = time.monotonic() + 10
+        while not self.server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("Fake market server did not start")
+            time.sleep(0.01)
+        return self
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+    def __enter__(self) -> "FakeMarketServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the fake Alpha Vantage server")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    fake = FakeMarket(latency_ms=args.latency_ms, error_rate=args.error_rate)
+    uvicorn.run(fake.app, host="127.0.0.1", port=args.port)
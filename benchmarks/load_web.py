@@ -0,0 +1,369 @@
+"""
+Load test the web tier with simulated user sessions.
+
+Seeds a throwaway database, starts a local fake Alpha Vantage server and the
+app itself (uvicorn, in this process) and then starts user sessions at a
+fixed rate over real HTTP. Each session logs in, views the portfolio, polls
+it the way the htmx page does, adds a stock and refreshes the portfolio.
+Sessions arrive on schedule whether or not earlier ones have finished, so an
+overloaded app shows up as growing latency and errors rather than as a
+slower arrival rate.
+
+The report lists latency percentiles per step, the share of requests that
+failed (5xx or no response) or were turned away by admission control
+(429/503), and the lag of the app's event loop. Results can be saved as a
+baseline and compared on later runs, like `bench_alerts`:
+
+    python -m benchmarks.load_web --users 200 --rate 5 --duration 30 --save-baseline
+    python -m benchmarks.load_web --users 200 --rate 5 --duration 30 --fail-on-regression
+
+The load generator shares the process (and the GIL) with the app, so the
+numbers are for comparing runs and finding the knee, not absolute capacity.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks.bench_alerts import BASELINE_DIR, compare, percentile
+
+STEPS = ("login", "view", "poll", "add_stock", "refresh")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load test the web tier with simulated user sessions")
+    parser.add_argument("--users", type=int, default=200, help="Seeded users, one portfolio each")
+    parser.add_argument("--holdings-per-portfolio", type=int, default=20)
+    parser.add_argument("--symbols", type=int, default=500, help="Size of the distinct symbol universe")
+    parser.add_argument("--rate", type=float, default=5.0, help="Sessions started per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to keep starting sessions")
+    parser.add_argument("--polls", type=int, default=3, help="htmx polls of the portfolio page per session")
+    parser.add_argument("--think-ms", type=float, default=500.0, help="Mean pause between a session's steps")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Injected upstream latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of upstream calls that fail")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Seconds before a request counts as failed")
+    parser.add_argument("--database-url", default=None,
+                        help="Database to seed (defaults to a temporary SQLite file)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=None, help="Baseline name (default: web-<users>-<rate>)")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed relative regression before a result is flagged")
+    parser.add_argument("--max-error-rate", type=float, default=None,
+                        help="Also fail when more than this share of requests fail")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    return parser.parse_args(argv)
+
+
+class LagMonitor:
+    """Samples how late the event loop it runs on wakes up from a short sleep"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.samples: List[float] = []
+
+    async def run(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.perf_counter() - start - self.interval))
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "lag_p50_ms": percentile(self.samples, 50) * 1000,
+            "lag_p99_ms": percentile(self.samples, 99) * 1000,
+            "lag_max_ms": max(self.samples, default=0.0) * 1000,
+        }
+
+
+class AppServer:
+    """Runs the app under uvicorn on a local port in a background thread, watching its event loop"""
+
+    def __init__(self, port: Optional[int] = None):
+        import uvicorn
+
+        from app.main import app
+        from benchmarks.fake_market import _free_port
+
+        self.port = port or _free_port()
+        self.lag = LagMonitor()
+        self.server = uvicorn.Server(uvicorn.Config(
+            app, host="127.0.0.1", port=self.port, log_level="warning", access_log=False
+        ))
+        self.thread = threading.Thread(target=lambda: asyncio.run(self._serve()), daemon=True)
+
+    async def _serve(self) -> None:
+        monitor = asyncio.create_task(self.lag.run())
+        try:
+            await self.server.serve()
+        finally:
+            monitor.cancel()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self) -> "AppServer":
+        self.thread.start()
+        deadline = time.monotonic() + 30
+        while not self.server.started:
+            if time.monotonic() > deadline or not self.thread.is_alive():
+                raise RuntimeError("App server did not start")
+            time.sleep(0.01)
+        return self
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+    def __enter__(self) -> "AppServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+class Recorder:
+    """Latencies and outcomes per session step"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.outcomes: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, step: str, seconds: float, outcome: str) -> None:
+        self.latencies[step].append(seconds)
+        self.outcomes[step][outcome] += 1
+
+    def results(self, elapsed: float) -> List[Dict[str, Any]]:
+        results = []
+        for step in [*STEPS, "all"]:
+            if step == "all":
+                latencies = [value for values in self.latencies.values() for value in values]
+                outcomes: Dict[str, int] = defaultdict(int)
+                for counts in self.outcomes.values():
+                    for outcome, count in counts.items():
+                        outcomes[outcome] += count
+            else:
+                latencies = self.latencies.get(step, [])
+                outcomes = self.outcomes.get(step, {})
+            if not latencies:
+                continue
+            requests = len(latencies)
+            results.append({
+                "scenario": step,
+                "requests": requests,
+                "throughput_per_s": requests / elapsed if elapsed else 0.0,
+                "p50_ms": percentile(latencies, 50) * 1000,
+                "p95_ms": percentile(latencies, 95) * 1000,
+                "p99_ms": percentile(latencies, 99) * 1000,
+                "max_ms": max(latencies) * 1000,
+                "error_rate": outcomes.get("error", 0) / requests,
+                "rejected_rate": outcomes.get("rejected", 0) / requests,
+            })
+        return results
+
+
+async def run_session(
+    client,
+    recorder: Recorder,
+    owner: Tuple[int, str],
+    symbols: List[str],
+    args: argparse.Namespace,
+    rng: random.Random,
+) -> None:
+    """One user visit: log in, view, poll, add a stock, refresh"""
+    portfolio_id, pin = owner
+    # Sessions share the client's connection pool, so each keeps its own cookie
+    headers: Dict[str, str] = {}
+
+    async def step(name: str, method: str, path: str, htmx: bool = False, **kwargs: Any) -> bool:
+        start = time.perf_counter()
+        try:
+            response = await client.request(
+                method, path, headers={**headers, **({"HX-Request": "true"} if htmx else {})}, **kwargs
+            )
+        except Exception:
+            recorder.record(name, time.perf_counter() - start, "error")
+            return False
+        elapsed = time.perf_counter() - start
+        if response.status_code in (429, 503):
+            recorder.record(name, elapsed, "rejected")
+        elif response.status_code >= 400:
+            recorder.record(name, elapsed, "error")
+            return False
+        else:
+            recorder.record(name, elapsed, "ok")
+        if "access_token" in response.cookies:
+            headers["Cookie"] = f"access_token={response.cookies['access_token']}"
+        return True
+
+    async def think() -> None:
+        await asyncio.sleep(rng.expovariate(1000 / args.think_ms) if args.think_ms > 0 else 0)
+
+    if not await step("login", "POST", "/auth/login", data={"pin": pin}):
+        return
+    await think()
+    await step("view", "GET", "/portfolio")
+    for _ in range(args.polls):
+        await think()
+        await step("poll", "GET", "/portfolio", htmx=True)
+    await think()
+    await step("add_stock", "POST", f"/portfolio/{portfolio_id}/add-stock", data={"symbol": rng.choice(symbols)})
+    await think()
+    await step("refresh", "GET", f"/portfolio/{portfolio_id}/refresh")
+
+
+async def generate_load(
+    base_url: str,
+    owners: List[Tuple[int, str]],
+    symbols: List[str],
+    args: argparse.Namespace,
+) -> Tuple[Recorder, float, int]:
+    """Start sessions at `args.rate` per second for `args.duration` seconds and wait for them"""
+    import httpx
+
+    recorder = Recorder()
+    rng = random.Random(args.seed)
+    sessions = []
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=100)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        start = time.perf_counter()
+        started = 0
+        while True:
+            # Open-loop arrivals: the schedule doesn't wait for earlier sessions
+            due = start + started / args.rate
+            if due - start >= args.duration:
+                break
+            await asyncio.sleep(max(0.0, due - time.perf_counter()))
+            session_rng = random.Random(rng.random())
+            sessions.append(asyncio.create_task(
+                run_session(client, recorder, rng.choice(owners), symbols, args, session_rng)
+            ))
+            started += 1
+        await asyncio.gather(*sessions)
+        elapsed = time.perf_counter() - start
+    return recorder, elapsed, started
+
+
+def write_listing(path: str, symbols: List[str]) -> None:
+    """Symbol listing for the synthetic universe, so add-stock validates against it"""
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["symbol", "name", "exchange", "assetType", "ipoDate", "delistingDate", "status"])
+        for symbol in symbols:
+            writer.writerow([symbol, f"{symbol} Inc", "NYSE", "Stock", "2000-01-01", "null", "Active"])
+
+
+def print_results(results: List[Dict[str, Any]], lag: Dict[str, float]) -> None:
+    header = (
+        f"{'step':<10} {'reqs':>6} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+        f"{'max ms':>9} {'errors':>7} {'shed':>7}"
+    )
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r['scenario']:<10} {r['requests']:>6} {r['throughput_per_s']:>8.1f} {r['p50_ms']:>9.1f} "
+            f"{r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f} {r['max_ms']:>9.1f} "
+            f"{r['error_rate']:>7.1%} {r['rejected_rate']:>7.1%}"
+        )
+    print(
+        f"Event loop lag: p50 {lag['lag_p50_ms']:.1f} ms, p99 {lag['lag_p99_ms']:.1f} ms, "
+        f"max {lag['lag_max_ms']:.1f} ms"
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+
+    # App modules read their configuration at import time
+    workdir = tempfile.mkdtemp(prefix="ma200-load-")
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{workdir}/load.db"
+    os.environ["SYMBOL_LISTING_PATH"] = os.path.join(workdir, "listing_status.csv")
+    os.environ["CACHE_SNAPSHOT_PATH"] = os.path.join(workdir, "cache_snapshot.bin")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("NOTIFICATIONAPI_CLIENT_ID", "load")
+    os.environ.setdefault("NOTIFICATIONAPI_CLIENT_SECRET", "load")
+
+    from benchmarks.fake_market import FakeMarket, FakeMarketServer
+
+    market = FakeMarket(latency_ms=args.latency_ms, error_rate=args.error_rate)
+    with FakeMarketServer(market) as fake:
+        os.environ["ALPHA_VANTAGE_BASE_URL"] = fake.base_url
+
+        from app.models.models import get_engine
+        from app.models.schema import upgrade_database
+        from benchmarks.synthetic import seed_database, symbol_for
+
+        upgrade_database()
+        seeded = seed_database(
+            get_engine(),
+            holdings=args.users * args.holdings_per_portfolio,
+            holdings_per_portfolio=args.holdings_per_portfolio,
+            symbols=args.symbols,
+            seed=args.seed,
+        )
+        symbols = [symbol_for(i) for i in range(args.symbols)]
+        write_listing(os.environ["SYMBOL_LISTING_PATH"], symbols)
+        print(f"Seeded {seeded['users']} users with {seeded['holdings']} holdings")
+
+        with AppServer() as server:
+            # Let startup work settle before measuring the loop
+            time.sleep(0.5)
+            server.lag.samples.clear()
+            recorder, elapsed, sessions = asyncio.run(
+                generate_load(server.base_url, seeded["owners"], symbols, args)
+            )
+            lag = server.lag.summary()
+
+    results = recorder.results(elapsed)
+    print(f"{sessions} sessions over {elapsed:.1f}s")
+    print_results(results, lag)
+    print(f"Upstream requests served: {market.requests}")
+
+    name = args.baseline or f"web-{args.users}-{args.rate:g}"
+    path = os.path.join(BASELINE_DIR, f"{name}.json")
+    report = {
+        "name": name,
+        "args": {k: v for k, v in vars(args).items() if k != "save_baseline"},
+        "results": results,
+        "event_loop": lag,
+    }
+
+    status = 0
+    overall = next((r for r in results if r["scenario"] == "all"), None)
+    if args.max_error_rate is not None and overall and overall["error_rate"] > args.max_error_rate:
+        print(f"Error rate {overall['error_rate']:.1%} is above {args.max_error_rate:.1%}")
+        status = 1
+
+    if os.path.exists(path):
+        with open(path) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"Regressions against baseline {name}:")
+            for line in regressions:
+                print(f"  {line}")
+            if args.fail_on_regression:
+                status = 1
+        else:
+            print(f"No regressions against baseline {name}")
+
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline to {path}")
+
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""
+Shared helpers for migration scripts.
+
+Databases created before migrations existed were built by
+`SQLModel.metadata.create_all` and may already have some of the tables,
+columns and indexes a revision adds, so schema steps check first. Data
+backfills run in small autocommitted batches so a large table is never
+locked for the whole backfill and an interrupted upgrade resumes where
+it stopped.
+"""
+import logging
+import time
+
+import sqlalchemy as sa
+from alembic import op
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+BATCH_SIZE = 5000
+# Seconds between batches, giving the app's writers a turn at the lock
+BATCH_PAUSE = 0.05
+
+
+def _offline() -> bool:
+    # Offline SQL scripts are written for a database at the previous revision
+    return op.get_context().as_sql
+
+
+def has_table(table: str) -> bool:
+    return not _offline() and sa.inspect(op.get_bind()).has_table(table)
+
+
+def has_column(table: str, column: str) -> bool:
+    return not _offline() and any(
+        c["name"] == column for c in sa.inspect(op.get_bind()).get_columns(table)
+    )
+
+
+def has_index(table: str, index: str) -> bool:
+    return not _offline() and any(
+        i["name"] == index for i in sa.inspect(op.get_bind()).get_indexes(table)
+    )
+
+
+def create_index_if_missing(index: str, table: str, columns: list, unique: bool = False) -> None:
+    if not has_index(table, index):
+        op.create_index(index, table, columns, unique=unique)
+
+
+def run_batched(statement: str, batch_size: int = BATCH_SIZE, pause: float = BATCH_PAUSE, **params) -> int:
+    """
+    Repeat a set-based UPDATE or DELETE until it stops matching rows
+
+    Each batch commits on its own. The statement must bind `:batch_size`
+    and only select rows that still need the change, e.g.
+    `UPDATE t SET x = ... WHERE id IN (SELECT id FROM t WHERE <not done> LIMIT :batch_size)`,
+    which makes the backfill resumable.
+
+    Returns:
+        int: Total number of rows changed
+    """
+    if _offline():
+        # Offline SQL scripts get one unbounded pass
+        op.execute(sa.text(statement).bindparams(batch_size=2**31 - 1, **params))
+        return 0
+
+    bind = op.get_bind()
+    total = 0
+    with op.get_context().autocommit_block():
+        while True:
+            changed = bind.execute(sa.text(statement), {"batch_size": batch_size, **params}).rowcount
+            if changed <= 0:
+                break
+            total += changed
+            logger.info("Backfilled %s rows", total)
+            if changed < batch_size:
+                break
+            time.sleep(pause)
+    return total
@@ -0,0 +1,68 @@
+"""Baseline: users, portfolios and stocks
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19 09:00:00
+
+The schema as originally created by `SQLModel.metadata.create_all`.
+Tables that already exist are left alone, so pre-migration databases
+can be upgraded in place.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import has_table
+
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if not has_table("user"):
+        op.create_table(
+            "user",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("pin", sa.String(), nullable=False),
+            sa.Column("email", sa.String(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_user_pin", "user", ["pin"], unique=True)
+
+    if not has_table("portfolio"):
+        op.create_table(
+            "portfolio",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("polling_rate", sa.Integer(), nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.ForeignKeyConstraint(["user_id"], ["user.id"]),
+            sa.PrimaryKeyConstraint("id"),
+        )
+
+    if not has_table("stock"):
+        op.create_table(
+            "stock",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("symbol", sa.String(), nullable=False),
+            sa.Column("portfolio_id", sa.Integer(), nullable=True),
+            sa.Column("last_price", sa.Float(), nullable=True),
+            sa.Column("ma_200", sa.Float(), nullable=True),
+            sa.Column("distance_to_ma", sa.Float(), nullable=True),
+            sa.Column("last_checked", sa.DateTime(), nullable=True),
+            sa.Column("notification_sent", sa.Boolean(), nullable=False),
+            sa.ForeignKeyConstraint(["portfolio_id"], ["portfolio.id"]),
+            sa.PrimaryKeyConstraint("id"),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("stock")
+    op.drop_table("portfolio")
+    op.drop_index("ix_user_pin", table_name="user")
+    op.drop_table("user")
@@ -0,0 +1,34 @@
+"""Add MA break tracking columns to stock
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 09:05:00
+
+`last_ma_break_date` and `days_since_ma_break` were added to the model
+after the first databases were created, and `create_all` never alters
+existing tables. Both are nullable, so adding them doesn't rewrite rows.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import has_column
+
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if not has_column("stock", "last_ma_break_date"):
+        op.add_column("stock", sa.Column("last_ma_break_date", sa.DateTime(), nullable=True))
+    if not has_column("stock", "days_since_ma_break"):
+        op.add_column("stock", sa.Column("days_since_ma_break", sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("stock") as batch_op:
+        batch_op.drop_column("days_since_ma_break")
+        batch_op.drop_column("last_ma_break_date")
@@ -0,0 +1,54 @@
+"""Add per-portfolio indicator rules, daily price bars and indicator values
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 09:10:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import has_column, has_table
+
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if not has_column("portfolio", "indicators"):
+        # A constant default is a metadata-only change, existing rows aren't rewritten
+        op.add_column(
+            "portfolio",
+            sa.Column("indicators", sa.String(), nullable=False, server_default="sma_200:15"),
+        )
+
+    if not has_table("pricebar"):
+        op.create_table(
+            "pricebar",
+            sa.Column("symbol", sa.String(), nullable=False),
+            sa.Column("day", sa.Date(), nullable=False),
+            sa.Column("close", sa.Float(), nullable=False),
+            sa.Column("volume", sa.Integer(), nullable=True),
+            sa.PrimaryKeyConstraint("symbol", "day"),
+        )
+
+    if not has_table("indicator"):
+        op.create_table(
+            "indicator",
+            sa.Column("symbol", sa.String(), nullable=False),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("value", sa.Float(), nullable=False),
+            sa.Column("as_of", sa.Date(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint("symbol", "name"),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("indicator")
+    op.drop_table("pricebar")
+    with op.batch_alter_table("portfolio") as batch_op:
+        batch_op.drop_column("indicators")
@@ -0,0 +1,38 @@
+"""Add the stock event log
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 09:15:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import create_index_if_missing, has_table
+
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if not has_table("stockevent"):
+        op.create_table(
+            "stockevent",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.Column("kind", sa.String(), nullable=False),
+            sa.Column("portfolio_id", sa.Integer(), nullable=False),
+            sa.Column("stock_id", sa.Integer(), nullable=True),
+            sa.Column("symbol", sa.String(), nullable=False),
+            sa.Column("payload", sa.String(), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+        )
+    create_index_if_missing("ix_stockevent_portfolio_id", "stockevent", ["portfolio_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_stockevent_portfolio_id", table_name="stockevent")
+    op.drop_table("stockevent")
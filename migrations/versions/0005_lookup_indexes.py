@@ -0,0 +1,38 @@
+"""Index holdings lookups and normalize stored symbols
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 09:20:00
+
+Every portfolio page, sweep and ownership check filters `stock` by
+`portfolio_id` and `portfolio` by `user_id`, and the price history is
+joined on `stock.symbol`; none of these were indexed. Symbols saved
+before validation may carry lower case or whitespace, which misses both
+the index and the shared price bars, so they are upper-cased in batches.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from migrations.helpers import create_index_if_missing, run_batched
+
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    run_batched(
+        "UPDATE stock SET symbol = UPPER(TRIM(symbol)) WHERE id IN ("
+        "SELECT id FROM stock WHERE symbol != UPPER(TRIM(symbol)) LIMIT :batch_size)"
+    )
+    create_index_if_missing("ix_stock_portfolio_id", "stock", ["portfolio_id"])
+    create_index_if_missing("ix_stock_symbol", "stock", ["symbol"])
+    create_index_if_missing("ix_portfolio_user_id", "portfolio", ["user_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_portfolio_user_id", table_name="portfolio")
+    op.drop_index("ix_stock_symbol", table_name="stock")
+    op.drop_index("ix_stock_portfolio_id", table_name="stock")
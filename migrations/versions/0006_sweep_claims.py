@@ -0,0 +1,30 @@
+"""Add sweep claim timestamps to portfolio
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 10:00:00
+
+Sweep workers claim portfolios by setting `sweep_claimed_at`, so several
+app processes can share the hourly check without duplicate alerts.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import has_column
+
+revision: str = "0006"
+down_revision: Union[str, None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if not has_column("portfolio", "sweep_claimed_at"):
+        op.add_column("portfolio", sa.Column("sweep_claimed_at", sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("portfolio") as batch_op:
+        batch_op.drop_column("sweep_claimed_at")
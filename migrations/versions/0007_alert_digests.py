@@ -0,0 +1,48 @@
+"""Add per-portfolio alert modes and the digest outbox
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 11:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import create_index_if_missing, has_column, has_table
+
+revision: str = "0007"
+down_revision: Union[str, None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if not has_column("portfolio", "alert_mode"):
+        op.add_column(
+            "portfolio",
+            sa.Column("alert_mode", sa.String(), nullable=False, server_default="immediate"),
+        )
+
+    if not has_table("pendingalert"):
+        op.create_table(
+            "pendingalert",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("portfolio_id", sa.Integer(), nullable=False),
+            sa.Column("stock_id", sa.Integer(), nullable=True),
+            sa.Column("symbol", sa.String(), nullable=False),
+            sa.Column("mode", sa.String(), nullable=False),
+            sa.Column("payload", sa.String(), nullable=False),
+            sa.Column("claimed_at", sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint("id"),
+        )
+    create_index_if_missing("ix_pendingalert_user_id", "pendingalert", ["user_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_pendingalert_user_id", table_name="pendingalert")
+    op.drop_table("pendingalert")
+    with op.batch_alter_table("portfolio") as batch_op:
+        batch_op.drop_column("alert_mode")
@@ -0,0 +1,68 @@
+"""Move market data from stock to a shared symbol table
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 12:00:00
+
+Every holding stored its own copy of the latest price and 200-day MA,
+so a symbol held in many portfolios was written once per holding per
+sweep. The `symbol` table now owns that data and `stock` keeps only the
+per-holding alert state. Each symbol is seeded from its most recently
+checked holding, in batches so the copy can be interrupted and resumed.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import has_column, has_table, run_batched
+
+revision: str = "0008"
+down_revision: Union[str, None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MARKET_COLUMNS = ("last_price", "ma_200", "distance_to_ma", "last_checked")
+
+
+def upgrade() -> None:
+    if not has_table("symbol"):
+        op.create_table(
+            "symbol",
+            sa.Column("symbol", sa.String(), nullable=False),
+            sa.Column("last_price", sa.Float(), nullable=True),
+            sa.Column("ma_200", sa.Float(), nullable=True),
+            sa.Column("distance_to_ma", sa.Float(), nullable=True),
+            sa.Column("last_checked", sa.DateTime(), nullable=True),
+            sa.Column("as_of", sa.Date(), nullable=True),
+            sa.PrimaryKeyConstraint("symbol"),
+        )
+
+    if has_column("stock", "last_price"):
+        run_batched(
+            "INSERT INTO symbol (symbol, last_price, ma_200, distance_to_ma, last_checked) "
+            "SELECT s.symbol, s.last_price, s.ma_200, s.distance_to_ma, s.last_checked FROM stock s "
+            "WHERE s.id IN ("
+            "SELECT (SELECT s2.id FROM stock s2 WHERE s2.symbol = pending.symbol "
+            "ORDER BY s2.last_checked IS NULL, s2.last_checked DESC, s2.id DESC LIMIT 1) "
+            "FROM (SELECT DISTINCT symbol FROM stock WHERE symbol NOT IN (SELECT symbol FROM symbol)) pending "
+            "LIMIT :batch_size)"
+        )
+        # Dropping nullable, unindexed columns doesn't rewrite the table
+        for column in MARKET_COLUMNS:
+            op.drop_column("stock", column)
+
+
+def downgrade() -> None:
+    op.add_column("stock", sa.Column("last_price", sa.Float(), nullable=True))
+    op.add_column("stock", sa.Column("ma_200", sa.Float(), nullable=True))
+    op.add_column("stock", sa.Column("distance_to_ma", sa.Float(), nullable=True))
+    op.add_column("stock", sa.Column("last_checked", sa.DateTime(), nullable=True))
+    op.execute(
+        "UPDATE stock SET "
+        + ", ".join(
+            f"{column} = (SELECT symbol.{column} FROM symbol WHERE symbol.symbol = stock.symbol)"
+            for column in MARKET_COLUMNS
+        )
+    )
+    op.drop_table("symbol")
@@ -0,0 +1,30 @@
+"""Add volatility to the symbol table for adaptive polling
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19 13:00:00
+
+Symbols without a value are polled at the portfolio's polling rate until
+their next refresh fills it in.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import has_column
+
+revision: str = "0009"
+down_revision: Union[str, None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if not has_column("symbol", "volatility"):
+        op.add_column("symbol", sa.Column("volatility", sa.Float(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("symbol") as batch_op:
+        batch_op.drop_column("volatility")
@@ -0,0 +1,33 @@
+"""Index symbols by distance to the MA for the screener
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19 14:00:00
+
+The screener filters and sorts every tracked symbol by its distance to the
+200-day SMA, so that column is indexed. `days_below_ma` is filled in as
+each symbol is next refreshed.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.helpers import create_index_if_missing, has_column
+
+revision: str = "0010"
+down_revision: Union[str, None] = "0009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if not has_column("symbol", "days_below_ma"):
+        op.add_column("symbol", sa.Column("days_below_ma", sa.Integer(), nullable=True))
+    create_index_if_missing("ix_symbol_distance_to_ma", "symbol", ["distance_to_ma"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_symbol_distance_to_ma", table_name="symbol")
+    with op.batch_alter_table("symbol") as batch_op:
+        batch_op.drop_column("days_below_ma")
@@ -0,0 +1,29 @@
+"""Chart series endpoint"""
+from datetime import date, timedelta
+
+from app.models.bulk import upsert
+from app.models.models import PriceBar
+from app.services.cache import quote_cache
+from app.services.chart_service import chart_cache
+
+
+def test_chart_requires_sign_in(client):
+    client.cookies.clear()
+    assert client.get("/symbols/AAPL/chart").status_code == 401
+
+
+def test_chart_series_are_cached_apart_from_quotes(client, session):
+    today = date.today()
+    upsert(session, PriceBar, [
+        {"symbol": "AAPL", "day": today - timedelta(days=i), "close": 100.0 + i % 7, "volume": None}
+        for i in range(400)
+    ], index_elements=["symbol", "day"], update_columns=["close", "volume"])
+    session.commit()
+
+    response = client.get("/symbols/AAPL/chart?range=1y&points=50")
+
+    assert response.status_code == 200
+    series = response.json()
+    assert series["points"] == 50 and len(series["t"]) == len(series["close"]) == 50
+    assert len(chart_cache) == 1
+    assert not any(key.startswith("chart:") for key in quote_cache.items())
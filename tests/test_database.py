@@ -0,0 +1,159 @@
+"""Dialect-specific database paths: bulk upserts, concurrent claims and the event log"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.models.bulk import COPY_THRESHOLD, copy_upsert, upsert
+from app.models.models import PendingAlert, PriceBar, StockEvent, get_async_engine
+from app.scheduler.jobs import claim_portfolios
+from app.services.digest_service import DAILY_DIGEST, claim_alerts
+from app.services.event_service import PRICE_OBSERVED, EventBuffer, read_events
+from conftest import make_portfolio, make_user, requires_postgres
+
+WORKERS = 4
+
+
+def bars(count, close=1.0, symbol="AAPL"):
+    start = date(2020, 1, 1)
+    return [
+        {"symbol": symbol, "day": start + timedelta(days=i), "close": close + i, "volume": i}
+        for i in range(count)
+    ]
+
+
+def stored_bars(session, symbol="AAPL"):
+    return session.exec(
+        select(PriceBar.day, PriceBar.close).where(PriceBar.symbol == symbol).order_by(PriceBar.day)
+    ).all()
+
+
+def run_workers(database, claim):
+    """Call `claim(session)` from several threads until every worker comes back empty"""
+    start = threading.Barrier(WORKERS)
+
+    def worker():
+        claimed = []
+        with Session(database) as session:
+            start.wait()
+            while batch := claim(session):
+                claimed.extend(batch)
+        return claimed
+
+    with ThreadPoolExecutor(WORKERS) as pool:
+        return [future.result() for future in [pool.submit(worker) for _ in range(WORKERS)]]
+
+
+def test_upsert_inserts_then_updates(session):
+    upsert(session, PriceBar, bars(3), index_elements=["symbol", "day"], update_columns=["close", "volume"])
+    session.commit()
+    upsert(session, PriceBar, bars(5, close=10.0), index_elements=["symbol", "day"], update_columns=["close", "volume"])
+    session.commit()
+
+    assert [close for _, close in stored_bars(session)] == [10.0, 11.0, 12.0, 13.0, 14.0]
+
+
+def test_large_upsert_updates_existing_rows(session):
+    # Goes through COPY and the staging table on PostgreSQL
+    count = COPY_THRESHOLD + 10
+    upsert(session, PriceBar, bars(10), index_elements=["symbol", "day"], update_columns=["close", "volume"])
+    session.commit()
+    upsert(session, PriceBar, bars(count, close=100.0), index_elements=["symbol", "day"], update_columns=["close", "volume"])
+    session.commit()
+
+    rows = stored_bars(session)
+    assert len(rows) == count
+    assert rows[0][1] == 100.0 and rows[-1][1] == 100.0 + count - 1
+
+
+@requires_postgres
+def test_copy_upsert_reuses_staging_table(session):
+    for close in (1.0, 2.0):
+        copy_upsert(session, PriceBar, bars(20, close=close), ["symbol", "day"], ["close", "volume"])
+    session.commit()
+
+    rows = stored_bars(session)
+    assert len(rows) == 20
+    assert rows[0][1] == 2.0
+
+
+def test_concurrent_sweeps_claim_each_portfolio_once(session, database):
+    user = make_user(session)
+    ids = {make_portfolio(session, user, name=f"p{i}").id for i in range(40)}
+    claimed_before = datetime.now()
+
+    results = run_workers(database, lambda s: claim_portfolios(s, claimed_before, limit=3))
+
+    claimed = [portfolio_id for result in results for portfolio_id in result]
+    assert sorted(claimed) == sorted(ids)
+
+
+def test_claimed_portfolios_are_skipped_until_the_lease_ends(session):
+    user = make_user(session)
+    make_portfolio(session, user)
+
+    assert len(claim_portfolios(session, datetime.now())) == 1
+    assert claim_portfolios(session, datetime.now() - timedelta(minutes=30)) == []
+    # A forced run treats claims made before it started as expired
+    assert len(claim_portfolios(session, datetime.now())) == 1
+
+
+def test_concurrent_digests_claim_each_alert_once(session, database):
+    user = make_user(session)
+    portfolio = make_portfolio(session, user, alert_mode=DAILY_DIGEST)
+    for i in range(60):
+        session.add(PendingAlert(
+            user_id=user.id, portfolio_id=portfolio.id, symbol=f"S{i}", mode=DAILY_DIGEST, payload="{}",
+        ))
+    session.commit()
+
+    # A claim takes everything due, so each worker's second call comes back empty
+    def claim(worker_session):
+        return [alert["id"] for alert in claim_alerts(worker_session, DAILY_DIGEST)]
+
+    results = run_workers(database, claim)
+
+    claimed = [alert_id for result in results for alert_id in result]
+    assert len(claimed) == 60
+    assert len(set(claimed)) == 60
+
+
+def test_events_from_concurrent_writers_page_in_order(session, database):
+    user = make_user(session)
+    portfolio = make_portfolio(session, user)
+    writes_per_worker = 5
+
+    def write(worker):
+        with Session(database) as worker_session:
+            for i in range(writes_per_worker):
+                events = EventBuffer()
+                for n in range(3):
+                    events.add_for(PRICE_OBSERVED, portfolio.id, None, f"W{worker}", seq=i * 3 + n)
+                events.flush(worker_session)
+                worker_session.commit()
+
+    with ThreadPoolExecutor(WORKERS) as pool:
+        list(pool.map(write, range(WORKERS)))
+
+    async def read_all():
+        pages, after = [], 0
+        async with AsyncSession(get_async_engine()) as async_session:
+            while page := await read_events(async_session, after=after, limit=7, portfolio_ids=[portfolio.id]):
+                pages.append(page)
+                after = page[-1]["id"]
+        await get_async_engine().dispose()
+        return [event for page in pages for event in page]
+
+    events = asyncio.run(read_all())
+
+    total = WORKERS * writes_per_worker * 3
+    assert len(events) == total
+    assert [event["id"] for event in events] == sorted(event["id"] for event in events)
+    assert len(session.exec(select(StockEvent.id)).all()) == total
+    # Each worker's events keep their order
+    for worker in range(WORKERS):
+        seqs = [event["payload"]["seq"] for event in events if event["symbol"] == f"W{worker}"]
+        assert seqs == list(range(writes_per_worker * 3))
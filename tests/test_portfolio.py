@@ -0,0 +1,43 @@
+"""Removing holdings and portfolios"""
+from sqlmodel import select
+
+from app.models.models import PendingAlert, Portfolio, Stock, StockEvent
+
+
+def create_portfolio(client, session):
+    client.post("/portfolio/create", data={"name": "Main", "polling_rate": 24}, follow_redirects=False)
+    portfolio = session.exec(select(Portfolio)).one()
+    stocks = [Stock(symbol=symbol, portfolio_id=portfolio.id) for symbol in ("KO", "PEP")]
+    session.add_all(stocks)
+    session.commit()
+    for stock in stocks:
+        session.add(PendingAlert(
+            user_id=portfolio.user_id, portfolio_id=portfolio.id, stock_id=stock.id,
+            symbol=stock.symbol, mode="daily",
+        ))
+    session.commit()
+    return portfolio, stocks
+
+
+def test_removing_a_stock_drops_its_queued_alerts(client, session):
+    portfolio, (ko, pep) = create_portfolio(client, session)
+
+    response = client.post(f"/portfolio/{portfolio.id}/remove-stock/{ko.id}", follow_redirects=False)
+
+    assert response.status_code == 303
+    assert session.exec(select(Stock.symbol)).all() == ["PEP"]
+    assert session.exec(select(PendingAlert.symbol)).all() == ["PEP"]
+
+
+def test_deleting_a_portfolio_drops_its_queued_alerts_but_keeps_its_events(client, session):
+    portfolio, _ = create_portfolio(client, session)
+    session.add(StockEvent(kind="price_observed", portfolio_id=portfolio.id, symbol="KO"))
+    session.commit()
+
+    client.post(f"/portfolio/{portfolio.id}/delete", follow_redirects=False)
+
+    assert session.exec(select(Portfolio)).all() == []
+    assert session.exec(select(PendingAlert)).all() == []
+    # The event log is append-only, but /events no longer serves the deleted portfolio
+    assert session.exec(select(StockEvent.portfolio_id)).all() == [portfolio.id]
+    assert client.get("/events").json()["events"] == []
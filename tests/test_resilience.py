@@ -0,0 +1,46 @@
+"""Circuit breaker state machine"""
+from app.services.resilience import CircuitBreaker
+
+
+def open_breaker(reset_timeout=0.0):
+    breaker = CircuitBreaker("TEST", failure_threshold=2, reset_timeout=reset_timeout)
+    breaker.record_failure()
+    breaker.record_failure()
+    return breaker
+
+
+def test_opens_after_threshold():
+    breaker = open_breaker(reset_timeout=60.0)
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_half_open_lets_one_trial_call_through():
+    breaker = open_breaker(reset_timeout=60.0)
+    breaker.opened_at -= 60.0
+
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert [breaker.allow() for _ in range(10)] == [False] * 10
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert all(breaker.allow() for _ in range(10))
+
+
+def test_failed_trial_reopens():
+    breaker = open_breaker()
+
+    assert breaker.allow()
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_abandoned_trial_is_replaced_after_reset_timeout():
+    # With no reset timeout a trial that never reports back is replaced at once
+    breaker = open_breaker()
+
+    assert breaker.allow()
+    assert breaker.allow()
@@ -0,0 +1,42 @@
+"""Screener page and its filter form"""
+from sqlmodel import select
+
+from app.models.models import Portfolio, Stock, Symbol
+
+DEFAULT_FORM = (
+    "/screener?min_distance=-15&max_distance=0&min_price=&max_price="
+    "&min_days=&max_days=&sort=distance&desc=false"
+)
+
+
+def add_symbols(session, distances):
+    portfolio = session.exec(select(Portfolio)).first()
+    for symbol, distance in distances.items():
+        session.add(Symbol(symbol=symbol, last_price=100.0, ma_200=100.0, distance_to_ma=distance, days_below_ma=1))
+        session.add(Stock(symbol=symbol, portfolio_id=portfolio.id))
+    session.commit()
+
+
+def test_default_form_submits(client, session):
+    client.post("/portfolio/create", data={"name": "Main", "polling_rate": 24}, follow_redirects=False)
+    add_symbols(session, {"NEAR": -5.0, "FAR": -40.0, "UP": 10.0})
+
+    response = client.get(DEFAULT_FORM)
+
+    assert response.status_code == 200
+    assert "NEAR" in response.text
+    assert "FAR" not in response.text and "UP" not in response.text
+
+
+def test_cleared_fields_remove_the_filter(client, session):
+    client.post("/portfolio/create", data={"name": "Main", "polling_rate": 24}, follow_redirects=False)
+    add_symbols(session, {"NEAR": -5.0, "FAR": -40.0, "UP": 10.0})
+
+    response = client.get(DEFAULT_FORM.replace("min_distance=-15&max_distance=0", "min_distance=&max_distance="))
+
+    assert response.status_code == 200
+    assert all(symbol in response.text for symbol in ("NEAR", "FAR", "UP"))
+
+
+def test_unparseable_field_is_rejected(client):
+    assert client.get("/screener?min_days=many").status_code == 400
@@ -0,0 +1,28 @@
+"""Symbol universe lookups"""
+from app.services.symbol_service import SymbolIndex
+
+
+def make_index():
+    index = SymbolIndex()
+    index.restore({
+        "AAPL": {"symbol": "AAPL", "name": "Apple Inc", "exchange": "NASDAQ"},
+        "AAL": {"symbol": "AAL", "name": "American Airlines Group", "exchange": "NASDAQ"},
+        "APP": {"symbol": "APP", "name": "AppLovin Corp", "exchange": "NASDAQ"},
+        "MSFT": {"symbol": "MSFT", "name": "Microsoft Corp", "exchange": "NASDAQ"},
+    })
+    return index
+
+
+def test_ticker_matches_come_before_name_matches():
+    results = make_index().search("ap")
+
+    assert [item["symbol"] for item in results] == ["APP", "AAPL"]
+
+
+def test_search_stops_at_limit():
+    assert [item["symbol"] for item in make_index().search("a", limit=2)] == ["AAL", "AAPL"]
+
+
+def test_name_search_after_the_last_ticker_match():
+    assert [item["symbol"] for item in make_index().search("micro")] == ["MSFT"]
+    assert make_index().search("zzz") == []